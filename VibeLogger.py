@@ -1,19 +1,47 @@
+import argparse
+import contextlib
 import datetime
 import os
 import json
-from openpyxl import Workbook, load_workbook
-from pypinyin import pinyin, Style
+import sys
+
+from log_engine import DEFAULT_MESSAGE, DEFAULT_POWER, DEFAULT_RST, LogEngine, fifo_lines, normalize_record, run_pipe
+from log_export import EXPORT_FORMATS, ExportMarks, export_log, marks_path
+from log_index import RowStore
+from log_import import IMPORT_FORMATS, ExcelImportTarget, SqliteImportTarget, import_logs
+from log_journal import JOURNAL_FILE, LOG_FIELDS, LogJournal
+from log_loader import load_sheet_rows, recover_rows
+from log_shards import LogShards
+from log_sqlite import DB_FILE, open_sqlite_store
+from quick_entry import parse_quick_entry
+from vocab_index import CompletionEngine, build_match_indexes
+from vocab_store import VocabStore, write_json_atomic
 
 # 配置文件与路径
 CONFIG_FILE = "log_config.json"
 EXCEL_FILE = "Ham_Radio_Log_2026.xlsx"
+CSV_FILE = "Ham_Radio_Log_2026.csv"  # GUI 版同步写入的 CSV，启动时用于核对 Excel 是否落后
 
 def get_pinyin_abbr(text):
     """修正后的拼音缩写提取逻辑"""
+    # 已知词汇的缩写来自拼音缓存，只有学到新的中文词汇时才会调用到这里；
+    # pypinyin 导入时要加载很大的词典，因此用到时才导入，纯 ASCII（型号、功率等）不需要它
+    if text.isascii():
+        return text.lower()
+    from pypinyin import pinyin, Style
+
     # pinyin 返回格式如 [['l'], ['g']]，需要提取每个子列表的第一个元素
     abbr_list = pinyin(text, style=Style.FIRST_LETTER)
     return "".join([item[0] for item in abbr_list]).lower()
 
+def get_pinyin_full(text):
+    """全拼（无分隔符），用于全拼前缀匹配"""
+    if text.isascii():
+        return text.lower()
+    from pypinyin import pinyin, Style
+
+    return "".join([item[0] for item in pinyin(text, style=Style.NORMAL)]).lower()
+
 def load_config():
     default_config = {
         "QTH": ["广州", "深圳", "龙岗", "南山", "福田", "宝安"],
@@ -22,8 +50,7 @@ def load_config():
         "Antenna": ["原装天线", "老鹰775拉杆天线", "IOO天线"]
     }
     if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(default_config, f, ensure_ascii=False, indent=4)
+        save_config(default_config)
         return default_config
     try:
         with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
@@ -32,14 +59,14 @@ def load_config():
         return default_config
 
 def save_config(config):
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, ensure_ascii=False, indent=4)
+    write_json_atomic(CONFIG_FILE, config)
 
-def smart_input(prompt, config_key, config_data, default_val=None, is_qth=False):
+def smart_input(prompt, config_key, config_data, completion, engine, default_val=None, is_qth=False):
     options = config_data[config_key]
+    index = completion.indexes[config_key]
     print(f"\n>>> 选择/输入 {prompt}")
     for i, opt in enumerate(options, 1):
-        abbr_hint = f" [{get_pinyin_abbr(opt)}]" if is_qth else ""
+        abbr_hint = f" [{index.abbr(opt)}]" if is_qth else ""
         print(f"  {i}. {opt}{abbr_hint}")
     
     hint = "序号/简拼/关键词/内容: " if is_qth else "序号/关键词/内容: "
@@ -57,13 +84,8 @@ def smart_input(prompt, config_key, config_data, default_val=None, is_qth=False)
             if 0 <= idx < len(options): return options[idx]
         
         # 2. 匹配逻辑
-        matches = []
-        if is_qth:
-            # QTH: 拼音首字母精确匹配 或 字符串包含匹配
-            matches = [opt for opt in options if user_val.lower() == get_pinyin_abbr(opt) or user_val.lower() in opt.lower()]
-        else:
-            # 其他: 字符串包含匹配
-            matches = [opt for opt in options if user_val.lower() in opt.lower()]
+        # 按匹配程度和使用频率排序，最可能的选项排在 1 号
+        matches = completion.complete(config_key, user_val)
         
         # 3. 处理匹配结果
         if len(matches) == 1:
@@ -82,54 +104,276 @@ def smart_input(prompt, config_key, config_data, default_val=None, is_qth=False)
                 if 0 <= s_idx < len(matches): return matches[s_idx]
             if sub_choice: user_val = sub_choice
 
-        # 4. 自学习
-        if user_val not in options:
-            options.append(user_val)
-            config_data[config_key] = options
-            save_config(config_data)
+        # 4. 自学习（整条记录录完后统一写盘）
+        if engine.learn(config_key, user_val):
+            completion.learn(config_key, user_val)
             print(f"  ✨ 已学习新词汇: {user_val}")
         return user_val
 
-def create_log():
+def resolve_paths(config):
+    """启用分片时只读写当前分片，否则沿用单个日志文件；返回 (分片管理, 文件路径)"""
+    shards = LogShards.from_settings(config.get("Settings", {}))
+    if shards is not None:
+        paths = shards.open_active()
+        print(f"📂 当前分片：{paths['name']}")
+    else:
+        paths = {"excel": EXCEL_FILE, "csv": CSV_FILE, "journal": JOURNAL_FILE, "db": DB_FILE}
+    return shards, paths
+
+def import_main(argv):
+    """python VibeLogger.py import 文件...：把 CSV/xlsx/ADIF 日志批量导入当前日志"""
+    parser = argparse.ArgumentParser(prog="VibeLogger.py import", description="批量导入 CSV/xlsx/ADIF 日志")
+    parser.add_argument("files", nargs="+", help="要导入的日志文件")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="文件格式（默认按扩展名判断）")
+    parser.add_argument("--map", action="append", default=[], metavar="字段=列名",
+                        help=f"手工指定列对应关系，字段为 {'/'.join(LOG_FIELDS)}，可重复")
+    parser.add_argument("--no-learn", action="store_true", help="不把新出现的 QTH/设备/功率/天馈加入词汇表")
+    args = parser.parse_args(argv)
+
+    mapping = {}
+    for item in args.map:
+        field, _, column = item.partition("=")
+        if field not in LOG_FIELDS or not column:
+            parser.error(f"无效的 --map：{item}")
+        mapping[field] = column
+
     config = load_config()
-    if os.path.exists(EXCEL_FILE):
-        try:
-            wb = load_workbook(EXCEL_FILE); ws = wb.active
-        except:
-            print("\n❌ 错误：Excel 文件正在打开，请关闭后运行！"); return
+    vocab = None if args.no_learn else VocabStore(config, CONFIG_FILE, save_config)
+    shards, paths = resolve_paths(config)
+    try:
+        if config.get("Settings", {}).get("backend", "excel") == "sqlite":
+            target = SqliteImportTarget(paths["db"], paths["excel"], paths["journal"])
+        else:
+            target = ExcelImportTarget(paths["excel"], paths["journal"])
+        result = import_logs(args.files, target, vocab, fmt=args.format, mapping=mapping)
+    except Exception as e:
+        print(f"❌ 导入失败：{e}")
+        return 1
+    if shards is not None:
+        shards.update_count(target.next_seq - 1)
+    print(f"✅ 导入 {result['imported']} 条，跳过 {result['skipped']} 条无呼号记录，"
+          f"新词汇 {result['learned']} 个，用时 {result['seconds']:.1f} 秒")
+    return 0
+
+def export_main(argv):
+    """python VibeLogger.py export 文件：把日志流式导出为 ADIF/Cabrillo，默认只导出上次之后的新记录"""
+    parser = argparse.ArgumentParser(prog="VibeLogger.py export", description="导出 ADIF/Cabrillo 日志")
+    parser.add_argument("output", help="导出文件（.adi 为 ADIF，.log/.cbr 为 Cabrillo）")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="导出格式（默认按扩展名判断）")
+    parser.add_argument("--all", action="store_true", help="导出全部记录，而不只是上次导出之后的新记录")
+    parser.add_argument("--date", help="记录日期 YYYY-MM-DD（默认按日分片的日期，否则取日志中各记录的写入日期）")
+    config = load_config()
+    settings = config.get("Settings", {})
+    parser.add_argument("--mycall", default=settings.get("my_callsign"), help="本台呼号（Cabrillo 需要）")
+    parser.add_argument("--band", default=settings.get("band"), help="波段，如 2m")
+    parser.add_argument("--mode", default=settings.get("mode"), help="模式，如 FM")
+    parser.add_argument("--frequency", default=settings.get("frequency"), help="Cabrillo 频率/波段，如 144")
+    parser.add_argument("--utc-offset", type=float, default=settings.get("utc_offset"),
+                        help="日志时间所用时区相对 UTC 的小时数，如 8（默认本机时区）；导出时换算为 UTC")
+    args = parser.parse_args(argv)
+
+    shards, paths = resolve_paths(config)
+    if args.date:
+        qso_date = datetime.datetime.strptime(args.date, "%Y-%m-%d").date()
+    else:
+        qso_date = shards.active_date() if shards is not None else None
+    journal = LogJournal(paths["journal"])
+    sqlite_store = None
+    try:
+        if settings.get("backend", "excel") == "sqlite":
+            store = sqlite_store = open_sqlite_store(paths["db"], paths["excel"], journal)
+        else:
+            rows = load_sheet_rows(paths["excel"])
+            recover_rows(rows, journal)
+            store = RowStore(row for row in rows if row[0] is not None)
+        count, last = export_log(
+            store, args.output, fmt=args.format, marks=ExportMarks(marks_path(paths["excel"])),
+            incremental=not args.all, qso_date=qso_date, journal=journal,
+            mycall=args.mycall, band=args.band, mode=args.mode, frequency=args.frequency,
+            utc_offset=args.utc_offset,
+        )
+    except Exception as e:
+        print(f"❌ 导出失败：{e}")
+        if isinstance(e, ValueError):
+            print("   可用 --date YYYY-MM-DD 指定记录日期")
+        return 1
+    finally:
+        journal.close()
+        if sqlite_store is not None:
+            sqlite_store.close()
+    if count:
+        print(f"📤 已导出 {count} 条记录到 {args.output}（至 No.{last}）")
     else:
-        wb = Workbook(); ws = wb.active; ws.title = "点名日志"
-        ws.append(["序号", "时间", "呼号", "QTH", "信号报告", "设备", "功率", "天馈", "留言"])
+        print(f"没有新记录需要导出（上次已导出至 No.{last}）")
+    return 0
+
+def sync_server_main(argv):
+    """python VibeLogger.py serve：运行局域网同步服务器，各录入台的 GUI 版连接到这里"""
+    from log_sync import DEFAULT_SYNC_PORT, SYNC_DATA_FILE, serve_main
+
+    parser = argparse.ArgumentParser(prog="VibeLogger.py serve", description="运行局域网同步服务器")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址（只在本机测试时用 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=DEFAULT_SYNC_PORT, help=f"端口（默认 {DEFAULT_SYNC_PORT}）")
+    parser.add_argument("--data", default=SYNC_DATA_FILE, help=f"服务器数据文件（默认 {SYNC_DATA_FILE}）")
+    args = parser.parse_args(argv)
+    serve_main(args.host, args.port, args.data)
+    return 0
+
+def pipe_main(argv):
+    """python VibeLogger.py pipe：从标准输入或命名管道逐行读取 JSON 记录写入日志，不经过录入界面"""
+    parser = argparse.ArgumentParser(
+        prog="VibeLogger.py pipe",
+        description='逐行读取 JSON 记录写入日志，如 {"callsign": "BG7XXX", "qth": "深圳"}；'
+                    "每条记录在标准输出回报序号，提示信息输出到标准错误",
+    )
+    parser.add_argument("--fifo", help="从命名管道读取（不存在时自动创建），写入端关闭后继续等待，Ctrl+C 退出")
+    parser.add_argument("--quiet", action="store_true", help="只回报出错的行")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    # 标准输出只留给逐条回报；整个运行期间（包括保存词汇、更新分片清单）其余提示都输出到标准错误，
+    # 后台线程的提示经 events 队列同样输出到标准错误
+    acks = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        shards, paths = resolve_paths(config)
+        try:
+            engine = LogEngine(config, paths, CONFIG_FILE, shards, save_config)
+        except Exception as e:
+            print(f"❌ 无法打开日志：{e}")
+            return 1
+        for note in engine.notes:
+            print(note)
+        source = fifo_lines(args.fifo) if args.fifo else sys.stdin
+        try:
+            written, failed = run_pipe(engine, source, acks, sys.stderr, echo=not args.quiet)
+        except KeyboardInterrupt:
+            written, failed = engine.count, None
+        finally:
+            finished = engine.close()
+            for level, message in engine.events():
+                if level == "error":
+                    print(message)
+        summary = f"✅ 已写入 {written} 条"
+        if failed:
+            summary += f"，{failed} 行有误未写入"
+        if not finished:
+            summary += "；⚠️ Excel 未能及时保存，记录已在日志中，下次启动会自动补回"
+        print(summary)
+    return 1 if failed else 0
+
+def create_log():
+    config = load_config()
+    shards, paths = resolve_paths(config)
+    # 打开日志、补回未写入 Excel 的记录、保存记录都由记录引擎完成（与 GUI 版、管道模式相同），
+    # Excel 由后台线程在记录后不久写入
+    try:
+        engine = LogEngine(config, paths, CONFIG_FILE, shards, save_config)
+    except PermissionError:
+        print("\n❌ 错误：Excel 文件正在打开，请关闭后运行！"); return
+    except Exception as e:
+        print(f"\n❌ 错误：无法打开日志：{e}"); return
+    for note in engine.notes:
+        print(note)
+    if engine.recovered:
+        print(f"♻️ 已从日志恢复 {engine.recovered} 条未写入 Excel 的记录")
+    if shards is not None:
+        # 旧分片在后台线程中读取，读完后并入呼号历史，不阻塞录入
+        engine.history.set_archive(shards.iter_rows())
+
+    # 词汇匹配索引（包括上次未合并的新词），并一次扫描历史记录建立词汇使用统计
+    completion = CompletionEngine(build_match_indexes(config, get_pinyin_abbr, full_func=get_pinyin_full))
+    for row in engine.rows:
+        if row[0] is not None:
+            completion.record_row(row)
 
     print("="*55)
     print("   业余无线电台网日志助手 2026 (智能混合匹配版)   ")
     print("="*55)
 
+    try:
+        log_loop(config, completion, engine)
+    finally:
+        if not engine.close():
+            print("\n⚠️ Excel 未能及时保存，记录已在日志中，下次启动会自动补回")
+        for index in completion.indexes.values():
+            index.abbr_cache.save()
+
+def print_events(engine):
+    """显示后台线程的消息（Excel 保存失败、并入其他录入端的记录等）"""
+    for level, message in engine.events():
+        if level == "merged":
+            print(f"🔀 已并入其他录入端的 {len(message)} 条记录")
+        elif level == "error":
+            print(message)
+
+def log_loop(config, completion, engine):
     while True:
-        next_seq = ws.max_row
+        print_events(engine)
         current_time = datetime.datetime.now().strftime("%H:%M")
-        print(f"\n【No.{next_seq} | {current_time}】")
+        print(f"\n【No.{engine.peek_seq()} | {current_time}】")
 
         call_in = input("请输入呼号 (Callsign): ").strip()
         if not call_in: continue
-        callsign = call_in.upper()
+        if call_in.lower() == "n": break
+        quick = len(call_in.split()) > 1
+        if quick:
+            # 一行录入：呼号 QTH RST 设备 功率 天馈 留言，省略的项沿用上次记录或缺省值
+            try:
+                record, new_values = parse_quick_entry(call_in, config, completion, engine.history)
+                row = normalize_record(record, current_time)
+            except ValueError as e:
+                print(f"❌ {e}")
+                continue
+            for key, value in new_values:
+                if engine.learn(key, value):
+                    completion.learn(key, value)
+                    print(f"  ✨ 已学习新词汇: {value}")
+            callsign = row[2]
+        else:
+            callsign = call_in.upper()
+        seen = engine.session_calls.check(callsign)
+        if seen:
+            print(f"⚠️ {callsign} 本场已签到（No.{seen[0]}，{seen[1]}）")
 
-        qth = smart_input("QTH (所在地)", "QTH", config, is_qth=True)
-        rst = input("请输入 RST [默认 59]: ").strip() or "59"
-        rig = smart_input("设备 (Rig)", "Rig", config)
-        pwr = smart_input("功率 (Power)", "Power", config, default_val="5W")
-        ant = smart_input("天馈 (Antenna)", "Antenna", config)
-        msg = input("讨论话题及留言 [默认 73]: ").strip() or "73"
+        if not quick:
+            # 老朋友：回车直接沿用上次的 QTH/设备/功率/天馈
+            last, count = engine.history.lookup(callsign)
+            last = last or {}
+            if last:
+                print(f"📇 {callsign} 第 {count + 1} 次签到，上次 {last['time']}：{last['qth']} | {last['rig']} | {last['power']} | {last['antenna']}")
+
+            row = normalize_record({
+                "time": current_time,
+                "callsign": callsign,
+                "qth": smart_input("QTH (所在地)", "QTH", config, completion, engine, default_val=last.get("qth"), is_qth=True),
+                "rst": input(f"请输入 RST [默认 {DEFAULT_RST}]: "),
+                "rig": smart_input("设备 (Rig)", "Rig", config, completion, engine, default_val=last.get("rig")),
+                "power": smart_input("功率 (Power)", "Power", config, completion, engine, default_val=last.get("power") or DEFAULT_POWER),
+                "antenna": smart_input("天馈 (Antenna)", "Antenna", config, completion, engine, default_val=last.get("antenna")),
+                "message": input(f"讨论话题及留言 [默认 {DEFAULT_MESSAGE}]: "),
+            })
+
+        # 序号在保存时才向共用的分配器申请，多个录入端同时记录也不会重复
+        engine.submit_rows([row])
+        completion.record_row(row)
+        _, _, callsign, qth, rst, rig, pwr, ant, msg = row
 
-        ws.append([next_seq, current_time, callsign, qth, rst, rig, pwr, ant, msg])
-        wb.save(EXCEL_FILE)
-        
         # 回显核对
         print("-" * 35)
         print(f"✅ 已记录：{callsign} | {qth} | {rig} | {pwr} | {ant} | {rst} | {msg}")
         print("-" * 35)
 
+        # 一行录入时直接进入下一位，呼号处输入 n 退出
+        if quick: continue
         if input("\n[回车] 下一位，[n] 退出: ").lower() == 'n': break
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "import":
+        sys.exit(import_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        sys.exit(export_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        sys.exit(sync_server_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "pipe":
+        sys.exit(pipe_main(sys.argv[2:]))
     create_log()
@@ -1,26 +1,72 @@
+import time
+
+# 开始导入本模块的时刻：启动耗时从这里算起，包括导入其余模块的时间
+STARTED_AT = time.perf_counter()
+
+import collections
 import datetime
+import itertools
 import os
 import json
-import csv
+import queue
+import socket
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-from openpyxl import Workbook, load_workbook
-from pypinyin import pinyin, Style
+from log_engine import DEFAULT_MESSAGE, DEFAULT_POWER, DEFAULT_RST, LogEngine, normalize_record
+from log_export import ExportMarks, export_log, marks_path
+from log_index import INDEXED_FIELDS
+from log_journal import JOURNAL_FILE, LogJournal, record_to_row, row_to_record
+from log_shards import LogShards
+from log_sqlite import DB_FILE
+from log_view import PENDING_LABEL, SAVING_LABEL, PendingRows, VirtualLogView
+from perf_trace import PERF, PERF_TRACE_FILE, PROFILE_FILE, PROFILE_SECONDS, SamplingProfiler
+from quick_entry import looks_like_quick_entry, parse_quick_entry
+from terminal_output import DEFAULT_SCROLLBACK, TerminalBuffer
+from vocab_index import SCORE_FUZZY, CompletionEngine, build_match_indexes
+from vocab_store import write_json_atomic
 
 CONFIG_FILE = "log_config.json"
 EXCEL_FILE = "Ham_Radio_Log_2026.xlsx"
 CSV_FILE = "Ham_Radio_Log_2026.csv"
+# 退出时等待后台线程写完的最长时间（秒）
+WRITER_EXIT_TIMEOUT = 10
+# find 命令最多显示的记录数、stats 命令每项列出的个数
+FIND_MAX_ROWS = 20
+STATS_TOP_N = 5
+# 新词汇在最后一次学习后这么久才写盘，一条记录学到的多个词合并成一次写入
+VOCAB_FLUSH_MS = 500
+# 保留最近多少条记录的录入耗时（按下保存到可以录入下一位），供 status 命令统计
+ENTRY_LATENCY_SAMPLES = 100
+# perf profile 结果列出的函数个数
+PROFILE_TOP_N = 10
 
 
 def get_pinyin_abbr(text: str) -> str:
     """拼音首字母缩写"""
     if not text:
         return ""
+    # 已知词汇的缩写来自拼音缓存，只有学到新的中文词汇时才会调用到这里；
+    # pypinyin 导入时要加载很大的词典，因此用到时才导入，纯 ASCII（型号、功率等）不需要它
+    if text.isascii():
+        return text.lower()
+    from pypinyin import pinyin, Style
+
     abbr_list = pinyin(text, style=Style.FIRST_LETTER)
     return "".join([item[0] for item in abbr_list]).lower()
 
 
+def get_pinyin_full(text: str) -> str:
+    """全拼（无分隔符）"""
+    if not text:
+        return ""
+    if text.isascii():
+        return text.lower()
+    from pypinyin import pinyin, Style
+
+    return "".join([item[0] for item in pinyin(text, style=Style.NORMAL)]).lower()
+
+
 def load_config():
     default_config = {
         "QTH": ["广州", "深圳", "龙岗", "南山", "福田", "宝安"],
@@ -29,8 +75,7 @@ def load_config():
         "Antenna": ["原装天线", "老鹰775拉杆天线", "IOO天线"],
     }
     if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(default_config, f, ensure_ascii=False, indent=4)
+        save_config(default_config)
         return default_config
 
     try:
@@ -41,38 +86,12 @@ def load_config():
 
 
 def save_config(config):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(config, f, ensure_ascii=False, indent=4)
+    write_json_atomic(CONFIG_FILE, config)
 
 
-def init_workbook():
-    """打开或创建 Excel 工作簿，结构与命令行版本一致"""
-    if os.path.exists(EXCEL_FILE):
-        try:
-            wb = load_workbook(EXCEL_FILE)
-            ws = wb.active
-        except Exception:
-            messagebox.showerror("错误", "Excel 文件正在打开，请先关闭后再运行！")
-            return None, None
-    else:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "点名日志"
-        ws.append(["序号", "时间", "呼号", "QTH", "信号报告", "设备", "功率", "天馈", "留言"])
-        wb.save(EXCEL_FILE)
-    return wb, ws
-
-
-def export_to_csv(ws):
-    """将当前工作表完整导出为 CSV 文件（含表头）。"""
-    try:
-        with open(CSV_FILE, "w", encoding="utf-8", newline="") as f:
-            writer = csv.writer(f)
-            for row in ws.iter_rows(values_only=True):
-                writer.writerow(list(row))
-    except Exception as e:
-        # 导出失败只在状态栏提示，不中断主流程
-        print("导出 CSV 失败:", e)
+def get_setting(config, name, default):
+    """读取配置文件 "Settings" 段中的可选参数"""
+    return config.get("Settings", {}).get(name, default)
 
 
 class VibeLoggerGUI:
@@ -84,37 +103,146 @@ class VibeLoggerGUI:
         self.root.geometry("1200x700")  # 增大窗口以容纳终端
 
         self.config = load_config()
-        self.wb, self.ws = init_workbook()
-        if self.wb is None:
+        # 可选：把各阶段计时逐条写入本地跟踪文件（"perf_trace": true 或文件名）
+        trace = get_setting(self.config, "perf_trace", False)
+        if trace:
+            try:
+                PERF.start_trace(PERF_TRACE_FILE if trace is True else trace)
+            except OSError as e:
+                print("无法打开性能跟踪文件:", e)
+        self.profiler = None
+        self.engine = None
+        self._vocab_flush_job = None
+        # 启用分片时只读写当前分片（本场/本日/本月），否则沿用单个日志文件
+        self.shards = LogShards.from_settings(self.config.get("Settings", {}))
+        if self.shards is not None:
+            self.paths = self.shards.open_active()
+        else:
+            self.paths = {"name": "", "excel": EXCEL_FILE, "csv": CSV_FILE, "journal": JOURNAL_FILE, "db": DB_FILE}
+        # 打开日志、补回未写入 Excel 的记录、保存记录都由记录引擎完成（与命令行版、管道模式相同）
+        try:
+            self.engine = LogEngine(self.config, self.paths, CONFIG_FILE, self.shards, save_config)
+        except PermissionError:
+            messagebox.showerror("错误", "Excel 文件正在打开，请先关闭后再运行！")
             self.root.destroy()
             return
+        except Exception as e:
+            messagebox.showerror("错误", f"无法打开日志：{e}")
+            self.root.destroy()
+            return
+        # 行存储、呼号历史和本场签到随记录由引擎更新，界面只读取
+        self.row_store = self.engine.row_store
+        self.history = self.engine.history
+        self.session_calls = self.engine.session_calls
+        if self.shards is not None:
+            # 旧分片在后台线程中读取，读完后并入呼号历史，不阻塞录入
+            self.history.set_archive(self.shards.iter_rows())
+        # 词汇匹配索引只在启动时建立一次（包括上次未合并的新词），之后随自学习增量更新
+        with PERF.span("index_build"):
+            self.match_indexes = build_match_indexes(self.config, get_pinyin_abbr, full_func=get_pinyin_full)
+        self.completion = CompletionEngine(self.match_indexes)
+        self._prefilled = {}
+        # 局域网同步：记录先提交给同步服务器，由服务器统一分配序号并广播回各录入台后才写入本地日志
+        self.sync = None
+        # 已提交但尚未被同步服务器确认（不同步时：尚未分配到序号）的记录 {uid: 行}：
+        # 显示在日志表格末尾，已计入呼号历史和本场签到
+        self.pending = {}
+        sync_address = get_setting(self.config, "sync_server", None)
+        if sync_address:
+            from log_sync import SyncClient
+
+            self.sync = SyncClient(
+                sync_address,
+                get_setting(self.config, "station", socket.gethostname()),
+                os.path.splitext(self.paths["excel"])[0] + ".outbox.jsonl",
+                since=lambda: self.engine.next_seq - 1,
+                floor=self.engine.next_seq - 1,
+            )
+        self.pending_label = PENDING_LABEL if self.sync is not None else SAVING_LABEL
 
         self.seq_var = tk.StringVar()
         self.time_var = tk.StringVar()
 
         self.callsign_var = tk.StringVar()
+        self.callsign_info_var = tk.StringVar()
         self.qth_var = tk.StringVar()
-        self.rst_var = tk.StringVar(value="59")
+        self.rst_var = tk.StringVar(value=DEFAULT_RST)
         self.rig_var = tk.StringVar()
-        self.power_var = tk.StringVar(value="5W")
+        self.power_var = tk.StringVar(value=DEFAULT_POWER)
         self.ant_var = tk.StringVar()
         self.msg_text = None
 
         self.status_var = tk.StringVar()
         # 日志表格控件引用
+        self.log_view = None
         self.log_tree = None
         
         # 命令行录入模式状态
         self.cli_log_mode = False
         self.cli_log_step = ""
         self.cli_log_data = {}
+        self.cli_log_defaults = {}  # 该呼号上次的记录，回车即沿用
         self.current_matches = []  # 存储当前匹配的选项
+        # 最近几条记录从按下保存到可以录入下一位的耗时（毫秒）
+        self.entry_latency = collections.deque(maxlen=ENTRY_LATENCY_SAMPLES)
 
         self.build_ui()
         self.refresh_header()
-        self.load_existing_logs_into_view()
+        self.load_existing_logs_into_view(self.engine.rows)
+        if self.sync is not None:
+            # 上次离线时提交、还在发件箱中的记录
+            for uid, record in self.sync.unconfirmed:
+                self.add_pending(uid, record_to_row(record))
+        for note in self.engine.notes:
+            self.print_to_terminal(note)
+        if self.engine.notes:
+            self.status_var.set(self.engine.notes[0])
+        elif self.engine.recovered:
+            self.status_var.set(f"♻️ 已从日志恢复 {self.engine.recovered} 条未写入 Excel 的记录")
+        elif self.shards is not None:
+            self.status_var.set(f"📂 当前分片：{self.paths['name']}（共 {len(self.shards.shards)} 个）")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         # 启动时间更新
         self.update_time()
+        self.poll_writer_events()
+        # 界面处理完第一轮事件即可开始录入，记下启动耗时
+        self.startup_ms = None
+        self.root.after_idle(self.report_startup)
+
+    def report_startup(self):
+        elapsed = time.perf_counter() - STARTED_AT
+        self.startup_ms = elapsed * 1000
+        PERF.record("first_keystroke", elapsed)
+
+    def poll_writer_events(self):
+        """把后台落盘线程的结果显示到状态栏"""
+        for level, message in self.engine.events():
+            if level == "merged":
+                self.show_foreign_rows(message)
+                continue
+            if level == "allocated":
+                self.confirm_pending([token for token, _ in message])
+                self.refresh_header()
+                continue
+            self.status_var.set(message)
+            if level == "error":
+                self.print_to_terminal(message)
+        while self.sync is not None:
+            try:
+                kind, payload = self.sync.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "records":
+                self.apply_synced_rows(payload)
+            elif kind == "acked":
+                self.confirm_pending(payload)
+            elif kind == "vocab":
+                for key, value in payload:
+                    self.learn_new_value(key, value, share=False)
+            else:
+                self.status_var.set(payload)
+                self.print_to_terminal(payload)
+        self.root.after(200, self.poll_writer_events)
 
     def update_time(self):
         """实时更新时间显示，准确到秒"""
@@ -178,6 +306,12 @@ class VibeLoggerGUI:
         terminal_scrollbar = ttk.Scrollbar(terminal_frame, command=self.terminal_output.yview)
         terminal_scrollbar.pack(side="right", fill="y")
         self.terminal_output.configure(yscrollcommand=terminal_scrollbar.set)
+        # 终端输出按事件循环批量写入，并限制保留的行数
+        self.terminal = TerminalBuffer(
+            self.terminal_output,
+            scrollback=get_setting(self.config, "terminal_scrollback", DEFAULT_SCROLLBACK),
+            transcript_path=get_setting(self.config, "terminal_transcript", None),
+        )
 
         # 命令输入框
         terminal_input_frame = tk.Frame(terminal_frame)
@@ -212,9 +346,12 @@ class VibeLoggerGUI:
         tk.Label(form, text="呼号 (Callsign)：", anchor="e", width=16).grid(
             row=row, column=0, sticky="e", pady=4
         )
-        tk.Entry(form, textvariable=self.callsign_var, width=22).grid(
-            row=row, column=1, sticky="w", pady=4
-        )
+        self.callsign_entry = tk.Entry(form, textvariable=self.callsign_var, width=22)
+        self.callsign_entry.grid(row=row, column=1, sticky="w", pady=4)
+        self.callsign_entry.bind("<KeyRelease>", self.on_callsign_typing)
+        self.callsign_entry.bind("<FocusOut>", self.on_callsign_commit)
+        self.callsign_info_label = tk.Label(form, textvariable=self.callsign_info_var, fg="gray")
+        self.callsign_info_label.grid(row=row, column=2, sticky="w")
         row += 1
 
         # QTH：带简拼匹配
@@ -238,9 +375,8 @@ class VibeLoggerGUI:
         tk.Label(form, text="RST：", anchor="e", width=16).grid(
             row=row, column=0, sticky="e", pady=4
         )
-        tk.Entry(form, textvariable=self.rst_var, width=10).grid(
-            row=row, column=1, sticky="w", pady=4
-        )
+        self.rst_entry = tk.Entry(form, textvariable=self.rst_var, width=10)
+        self.rst_entry.grid(row=row, column=1, sticky="w", pady=4)
         tk.Label(form, text="默认 59", fg="gray").grid(row=row, column=2, sticky="w")
         row += 1
 
@@ -255,6 +391,7 @@ class VibeLoggerGUI:
             width=20,
         )
         self.rig_combo.grid(row=row, column=1, sticky="w", pady=4)
+        self.rig_combo.bind("<KeyRelease>", lambda e: self.filter_combo("Rig", self.rig_combo, self.rig_var))
         tk.Label(form, text="支持新内容，自动学习保存", fg="gray").grid(
             row=row, column=2, sticky="w"
         )
@@ -271,6 +408,7 @@ class VibeLoggerGUI:
             width=20,
         )
         self.power_combo.grid(row=row, column=1, sticky="w", pady=4)
+        self.power_combo.bind("<KeyRelease>", lambda e: self.filter_combo("Power", self.power_combo, self.power_var))
         tk.Label(form, text="默认 5W，可自定义", fg="gray").grid(row=row, column=2, sticky="w")
         row += 1
 
@@ -285,6 +423,7 @@ class VibeLoggerGUI:
             width=20,
         )
         self.ant_combo.grid(row=row, column=1, sticky="w", pady=4)
+        self.ant_combo.bind("<KeyRelease>", lambda e: self.filter_combo("Antenna", self.ant_combo, self.ant_var))
         tk.Label(form, text="支持新内容，自动学习保存", fg="gray").grid(
             row=row, column=2, sticky="w"
         )
@@ -296,9 +435,32 @@ class VibeLoggerGUI:
         )
         self.msg_text = tk.Text(form, width=48, height=4)
         self.msg_text.grid(row=row, column=1, columnspan=2, sticky="w", pady=4)
-        self.msg_text.insert("1.0", "73")
+        self.msg_text.insert("1.0", DEFAULT_MESSAGE)
         row += 1
 
+        # 纯键盘录入：回车跳到下一栏，留言栏回车保存（Shift+回车换行），Ctrl+回车随时保存；
+        # 下拉框中 Tab 采用排名第一的补全并跳到下一栏
+        self.entry_fields = [
+            self.callsign_entry, self.qth_combo, self.rst_entry,
+            self.rig_combo, self.power_combo, self.ant_combo, self.msg_text,
+        ]
+        self.combo_vocab = {
+            self.qth_combo: ("QTH", self.qth_var),
+            self.rig_combo: ("Rig", self.rig_var),
+            self.power_combo: ("Power", self.power_var),
+            self.ant_combo: ("Antenna", self.ant_var),
+        }
+        for widget in self.entry_fields[:-1]:
+            widget.bind("<Return>", self.focus_next_field)
+        # 呼号栏也可以一次输入整条记录，如 BG7ABC gz 57 1 3 2 "新天线"
+        self.callsign_entry.bind("<Return>", self.on_callsign_return)
+        for combo in self.combo_vocab:
+            combo.bind("<Tab>", self.accept_completion)
+        self.msg_text.bind("<Return>", lambda e: self.save_record() or "break")
+        self.msg_text.bind("<Shift-Return>", lambda e: None)
+        for widget in self.entry_fields:
+            widget.bind("<Control-Return>", lambda e: self.save_record() or "break")
+
         # 按钮
         btns = tk.Frame(self.root)
         btns.pack(pady=6)
@@ -308,7 +470,7 @@ class VibeLoggerGUI:
         tk.Button(btns, text="清空 / 下一位", width=16, command=self.next_record).pack(
             side="left", padx=10
         )
-        tk.Button(btns, text="退出", width=10, command=self.root.quit).pack(
+        tk.Button(btns, text="退出", width=10, command=self.on_close).pack(
             side="left", padx=10
         )
 
@@ -317,13 +479,8 @@ class VibeLoggerGUI:
         log_frame.pack(fill="both", expand=True, padx=10, pady=(0, 5))
 
         columns = ("seq", "time", "callsign", "qth", "rst", "rig", "power", "ant", "msg")
-        self.log_tree = ttk.Treeview(
-            log_frame,
-            columns=columns,
-            show="headings",
-            height=8,
-        )
-        self.log_tree.pack(side="left", fill="both", expand=True)
+        self.log_view = VirtualLogView(log_frame, PendingRows(self.row_store, self.pending, self.pending_label), columns, height=8)
+        self.log_tree = self.log_view.tree
 
         self.log_tree.heading("seq", text="序号")
         self.log_tree.heading("time", text="时间")
@@ -346,10 +503,6 @@ class VibeLoggerGUI:
         self.log_tree.column("ant", width=120, anchor="w")
         self.log_tree.column("msg", width=200, anchor="w")
 
-        scrollbar = ttk.Scrollbar(log_frame, orient="vertical", command=self.log_tree.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.log_tree.configure(yscrollcommand=scrollbar.set)
-
         status = tk.Label(
             self.root,
             textvariable=self.status_var,
@@ -360,33 +513,113 @@ class VibeLoggerGUI:
         status.pack(side="bottom", fill="x")
 
     def refresh_header(self):
-        if not self.ws:
+        if self.engine is None:
             return
-        next_seq = self.ws.max_row
-        self.seq_var.set(str(next_seq))
+        # 其他录入端可能已经用掉了后面的序号，显示分配器给出的下一个
+        self.seq_var.set(str(self.engine.peek_seq()))
+
+    def show_foreign_rows(self, rows):
+        """显示引擎已并入的其他录入端记录：更新补全统计和日志表格"""
+        for row in rows:
+            self.completion.record_row(row)
+        self.refresh_header()
+        if self.log_view is not None:
+            # 对方的序号比本端已有的小时记录插在中间（行存储按序号重排），末尾的待保存行也会后移：
+            # 已缓存的行位置都变了，需要重新读取
+            appended = self.row_store.tail(len(rows)) == [tuple(row) for row in rows]
+            self.log_view.refresh(reload=not appended or bool(self.pending))
+        self.status_var.set(f"🔀 已并入其他录入端的 {len(rows)} 条记录")
 
     def on_qth_typing(self, event):
-        text = self.qth_var.get().strip()
-        base = self.config.get("QTH", [])
+        self.filter_combo("QTH", self.qth_combo, self.qth_var)
+
+    def filter_combo(self, key: str, combo, var):
+        """下拉框只列出与已输入内容匹配的词汇（按排名），清空时恢复完整列表"""
+        text = var.get().strip()
+        base = self.config.get(key, [])
         if not text:
-            self.qth_combo["values"] = base
+            combo["values"] = base
             return
-        lower = text.lower()
-        matches = []
-        for opt in base:
-            abbr = get_pinyin_abbr(opt)
-            if lower == abbr or lower in opt.lower():
-                matches.append(opt)
-        self.qth_combo["values"] = matches or base
-
-    def learn_new_value(self, key: str, value: str):
-        if not value:
+        with PERF.span("match"):
+            matches = self.completion.complete(key, text)
+            combo["values"] = matches or base
+
+    def focus_next_field(self, event):
+        """回车：跳到下一栏（在呼号栏回车时先带出该台上次的信息）"""
+        widget = event.widget
+        if widget is self.callsign_entry:
+            self.on_callsign_commit(event)
+        position = self.entry_fields.index(widget)
+        self.entry_fields[position + 1].focus_set()
+        if position + 1 < len(self.entry_fields) - 1:
+            self.entry_fields[position + 1].select_range(0, tk.END)
+        return "break"
+
+    def accept_completion(self, event):
+        """Tab：已输入的内容不是现有词汇时，采用排名第一的补全，然后跳到下一栏"""
+        key, var = self.combo_vocab[event.widget]
+        text = var.get().strip()
+        if text and text not in self.config.get(key, []):
+            with PERF.span("match"):
+                matches = self.completion.complete(key, text, k=1)
+            if matches:
+                var.set(matches[0])
+        return self.focus_next_field(event)
+
+    def on_callsign_typing(self, event):
+        """输入呼号时提示该台的签到次数和上次信息（一行录入时取第一项）"""
+        parts = self.callsign_var.get().split()
+        callsign = parts[0] if parts else ""
+        warning = self.duplicate_warning(callsign) if callsign else None
+        self.callsign_info_label.config(fg="red" if warning else "gray")
+        if warning:
+            self.callsign_info_var.set(warning)
+            self.status_var.set(warning)
+            return
+        last, count = self.history.lookup(callsign) if callsign else (None, 0)
+        if last:
+            self.callsign_info_var.set(
+                f"第 {count + 1} 次签到，上次 {last['time']}：{last['qth']} | {last['rig']}"
+            )
+        elif callsign:
+            self.callsign_info_var.set("新呼号")
+        else:
+            self.callsign_info_var.set("")
+
+    def duplicate_warning(self, callsign: str):
+        """该呼号本场（去重窗口内）已签到时返回提示文字"""
+        seen = self.session_calls.check(callsign)
+        if seen is None:
+            return None
+        seq, time = seen
+        seq = self.pending_label if seq is None else f"No.{seq}"
+        return f"⚠️ {callsign.strip().upper()} 本场已签到（{seq}，{time}）"
+
+    def on_callsign_commit(self, event):
+        """呼号输入完成后，用该台最近一次的记录预填 QTH/设备/功率/天馈"""
+        last, _ = self.history.lookup(self.callsign_var.get())
+        if not last:
             return
-        items = self.config.get(key, [])
-        if value not in items:
-            items.append(value)
-            self.config[key] = items
-            save_config(self.config)
+        fields = (
+            (self.qth_var, "qth"),
+            (self.rig_var, "rig"),
+            (self.power_var, "power"),
+            (self.ant_var, "antenna"),
+        )
+        for var, field in fields:
+            current = var.get().strip()
+            # 只覆盖空白、默认或上次自动带出的值，不动操作员手工输入的内容
+            if not current or current == self._prefilled.get(field) or (field == "power" and current == DEFAULT_POWER):
+                value = last.get(field) or ""
+                var.set(value)
+                self._prefilled[field] = value
+
+    def learn_new_value(self, key: str, value: str, share: bool = True):
+        """学习新词汇；share 时同步给其他录入台（从同步服务器收到的词汇不再回传）"""
+        if self.engine.learn(key, value):
+            items = self.config[key]
+            self.schedule_vocab_flush()
+            self.completion.learn(key, value)
             if key == "QTH":
                 self.qth_combo["values"] = items
             elif key == "Rig":
@@ -396,74 +629,224 @@ class VibeLoggerGUI:
             elif key == "Antenna":
                 self.ant_combo["values"] = items
             self.status_var.set(f"✨ 已学习新词汇: {key} -> {value}")
+            if share and self.sync is not None:
+                self.sync.learn(key, value)
+
+    def schedule_vocab_flush(self):
+        """防抖：连续学到的新词在停顿 VOCAB_FLUSH_MS 后一次写盘"""
+        if self._vocab_flush_job is not None:
+            self.root.after_cancel(self._vocab_flush_job)
+        self._vocab_flush_job = self.root.after(VOCAB_FLUSH_MS, self.flush_vocab)
 
-    def load_existing_logs_into_view(self):
-        if not self.ws or not self.log_tree:
+    def flush_vocab(self):
+        self._vocab_flush_job = None
+        self.engine.vocab.flush()
+
+    def load_existing_logs_into_view(self, sheet_rows):
+        if not self.log_view:
             return
-        # 跳过表头，从第二行开始
-        for row in list(self.ws.iter_rows(min_row=2, values_only=True)):
+        # 一次扫描已有记录，建立词汇使用统计（行存储和呼号索引已在启动时建立）
+        for row in sheet_rows:
             if row[0] is not None:  # 确保行不为空
-                seq, t, callsign, qth, rst, rig, power, ant, msg = row
-                self.log_tree.insert("", "end", values=(seq, t, callsign, qth, rst, rig, power, ant, msg))
+                self.completion.record_row(row)
+        # 表格只绘制最后一页
+        self.log_view.scroll_to_end()
+
+    def submit_row(self, row):
+        """交给记录引擎分配序号并保存，追加到日志表格"""
+        if self.sync is not None:
+            # 序号由同步服务器分配：记录随服务器的广播回到本台时才保存（见 apply_synced_rows），
+            # 在此之前（包括离线期间留在发件箱中时）作为待同步行显示
+            self.add_pending(self.sync.submit(row_to_record(row)), row)
+            return
+        # 序号由后台线程分配，界面不等待序号文件的锁；分配好之前作为“保存中”的行显示。
+        # 新词汇已由 learn_new_value 学到，写盘由 schedule_vocab_flush 防抖
+        for token in self.engine.queue_rows([row], flush_vocab=False):
+            self.pending[token] = (None,) + tuple(row[1:])
+        self.completion.record_row(row)
+
+        # 页面下方的日志表格停在末尾时自动滚动到最新一行
+        if self.log_view is not None:
+            self.log_view.refresh()
+
+    def add_pending(self, uid, row):
+        """本台提交同步、尚未得到序号的记录：立即计入呼号历史、本场签到和补全统计，显示在表格末尾"""
+        row = (None,) + tuple(row[1:])
+        self.pending[uid] = row
+        self.history.add(row)
+        self.session_calls.add(row)
+        self.completion.record_row(row)
+        if self.log_view is not None:
+            self.log_view.refresh()
+
+    def confirm_pending(self, uids):
+        """服务器已确认、但广播在本台保存之前就已收到过的记录（如上次退出前已保存），
+        以及后台线程已分配好序号的记录，不再显示为待保存的行"""
+        confirmed = [uid for uid in uids if self.pending.pop(uid, None) is not None]
+        if confirmed and self.log_view is not None:
+            self.log_view.refresh(reload=True)
+
+    def apply_synced_rows(self, records):
+        """保存同步服务器广播的记录 [(uid, 行)]（包括本台提交的），按服务器分配的序号追加到日志和表格。
+
+        本台提交的记录提交时已计入呼号历史和补全统计，这里只去掉待同步行、补上序号。
+        """
+        marked = [(self.pending.pop(uid, None) is not None, row) for uid, row in records]
+        saved = 0
+        for mine, group in itertools.groupby(marked, key=lambda item: item[0]):
+            rows = [row for _, row in group if row[0] >= self.engine.next_seq]  # 重连补发时与已保存部分重叠
+            if not rows:
+                continue
+            self.engine.store_rows(rows, index=not mine)
+            if not mine:
+                for row in rows:
+                    self.completion.record_row(row)
+            saved += len(rows)
+        if self.log_view is not None and (saved or any(mine for mine, _ in marked)):
+            self.log_view.refresh(reload=True)
+        if not saved:
+            return
+        self.refresh_header()
+        if self.log_view is not None:
+            self.log_view.select_last()
+        self.status_var.set(f"📡 已同步 {saved} 条记录（至 No.{self.engine.next_seq - 1}）")
+
+    def on_close(self):
+        """退出前等待后台线程把未落盘的记录写入 Excel"""
+        if self.sync is not None:
+            # 未被服务器确认的记录留在发件箱文件中，下次启动后补发
+            self.sync.close()
+        if self._vocab_flush_job is not None:
+            self.root.after_cancel(self._vocab_flush_job)
+            self._vocab_flush_job = None
+        # 等待后台线程写完，写入未保存的新词汇并合并到配置文件；拼音缩写缓存也在退出时一并保存
+        self.status_var.set("正在保存……")
+        self.root.update_idletasks()
+        self.engine.close(WRITER_EXIT_TIMEOUT)
+        self.terminal.close()
+        PERF.stop_trace()
+        for index in self.match_indexes.values():
+            index.abbr_cache.save()
+        self.root.destroy()
 
     def save_record(self):
-        if not self.ws:
-            messagebox.showerror("错误", "工作表未初始化！")
+        """保存当前记录并立即开始下一位：不弹对话框，结果显示在状态栏和日志表格中"""
+        started = time.perf_counter()
+        if self.engine is None:
+            self.status_var.set("❌ 工作表未初始化！")
             return
         callsign = self.callsign_var.get().strip().upper()
         if not callsign:
-            messagebox.showwarning("提示", "呼号不能为空！")
+            self.status_var.set("⚠️ 呼号不能为空！")
+            self.root.bell()
+            self.callsign_entry.focus_set()
             return
 
-        qth = self.qth_var.get().strip()
-        rst = self.rst_var.get().strip() or "59"
-        rig = self.rig_var.get().strip()
-        power = self.power_var.get().strip() or "5W"
-        ant = self.ant_var.get().strip()
-        msg = self.msg_text.get("1.0", "end").strip() or "73"
+        # 校验和缺省值（RST 59、功率 5W、留言 73）与命令行版、管道模式一致
+        try:
+            row = normalize_record({
+                "callsign": callsign,
+                "qth": self.qth_var.get(),
+                "rst": self.rst_var.get(),
+                "rig": self.rig_var.get(),
+                "power": self.power_var.get(),
+                "antenna": self.ant_var.get(),
+                "message": self.msg_text.get("1.0", "end"),
+            })
+        except ValueError as e:
+            self.status_var.set(f"⚠️ {e}")
+            self.root.bell()
+            self.callsign_entry.focus_set()
+            return
+        _, _, _, qth, rst, rig, power, ant, msg = row
 
         self.learn_new_value("QTH", qth)
         self.learn_new_value("Rig", rig)
         self.learn_new_value("Power", power)
         self.learn_new_value("Antenna", ant)
 
-        next_seq = self.ws.max_row
-        current_time = datetime.datetime.now().strftime("%H:%M")
+        self.submit_row(row)
 
-        self.ws.append([next_seq, current_time, callsign, qth, rst, rig, power, ant, msg])
-        self.wb.save(EXCEL_FILE)
+        done = "📡 已提交同步" if self.sync is not None else "✅ 已记录"
+        summary = f"{done}：{callsign} | {qth} | {rig} | {power} | {ant} | {rst} | {msg}"
+        self.status_var.set(summary)
+        if self.log_view is not None:
+            self.log_view.select_last()
 
-        # 同步导出 CSV
-        export_to_csv(self.ws)
+        self.next_record(auto_from_save=True)
+        PERF.record("save_record", time.perf_counter() - started)
+        # 界面处理完本轮事件（表格、终端刷新）后，才算可以录入下一位
+        self.root.after_idle(self.report_entry_latency, started, summary)
+
+    def quick_entry(self, text: str) -> bool:
+        """一行录入（呼号 QTH RST 设备 功率 天馈 留言）：解析后直接保存，返回是否已保存。
+
+        有歧义或不合法的项显示在终端和状态栏，其余各项不必重填。
+        """
+        if self.engine is None:
+            self.status_var.set("❌ 工作表未初始化！")
+            return False
+        try:
+            with PERF.span("match"):
+                record, _ = parse_quick_entry(text, self.config, self.completion, self.history)
+            row = normalize_record(record)
+        except ValueError as e:
+            self.print_to_terminal(f"❌ {e}")
+            self.status_var.set(f"⚠️ {e}")
+            self.root.bell()
+            return False
+        _, _, callsign, qth, rst, rig, power, ant, msg = row
+        warning = self.duplicate_warning(callsign)
+        if warning:
+            self.print_to_terminal(warning)
 
-        # 在页面下方的日志表格追加一行
-        if self.log_tree is not None:
-            self.log_tree.insert(
-                "",
-                "end",
-                values=(next_seq, current_time, callsign, qth, rst, rig, power, ant, msg),
-            )
-            # 自动滚动到最新一行
-            children = self.log_tree.get_children()
-            if children:
-                self.log_tree.see(children[-1])
+        self.learn_new_value("QTH", qth)
+        self.learn_new_value("Rig", rig)
+        self.learn_new_value("Power", power)
+        self.learn_new_value("Antenna", ant)
 
-        self.status_var.set(
-            f"✅ 已记录：{callsign} | {qth} | {rig} | {power} | {ant} | {rst} | {msg}"
-        )
-        messagebox.showinfo(
-            "已保存",
-            f"已记录：{callsign} | {qth} | {rig} | {power} | {ant} | {rst} | {msg}",
-        )
+        self.submit_row(row)
 
-        self.next_record(auto_from_save=True)
+        done = "📡 已提交同步" if self.sync is not None else "✅ 已记录"
+        summary = f"{done}：{callsign} | {qth} | {rig} | {power} | {ant} | {rst} | {msg}"
+        self.print_to_terminal(summary)
+        self.status_var.set(summary)
+        self.refresh_header()
+        if self.log_view is not None:
+            self.log_view.select_last()
+        return True
+
+    def on_callsign_return(self, event):
+        """呼号栏回车：输入了一整行（呼号后还有内容）时按一行录入直接保存，否则跳到下一栏"""
+        text = self.callsign_var.get().strip()
+        if not looks_like_quick_entry(text):
+            return self.focus_next_field(event)
+        if self.quick_entry(text):
+            self.next_record(auto_from_save=True)
+        return "break"
+
+    def report_entry_latency(self, started: float, summary: str):
+        elapsed = (time.perf_counter() - started) * 1000
+        self.entry_latency.append(elapsed)
+        PERF.record("entry", elapsed / 1000)
+        self.status_var.set(f"{summary}（{elapsed:.0f} ms）")
 
     def next_record(self, auto_from_save: bool = False):
+        # 上一位留下的 QTH/设备等视为可覆盖，下一位的呼号会自动带出自己的信息
+        self._prefilled = {
+            "qth": self.qth_var.get().strip(),
+            "rig": self.rig_var.get().strip(),
+            "power": self.power_var.get().strip(),
+            "antenna": self.ant_var.get().strip(),
+        }
+        self.callsign_info_var.set("")
+        self.callsign_info_label.config(fg="gray")
         self.callsign_var.set("")
-        self.rst_var.set("59")
+        self.rst_var.set(DEFAULT_RST)
         self.msg_text.delete("1.0", "end")
-        self.msg_text.insert("1.0", "73")
+        self.msg_text.insert("1.0", DEFAULT_MESSAGE)
         self.refresh_header()
+        self.callsign_entry.focus_set()
         if not auto_from_save:
             self.status_var.set("已清空输入，可以录入下一位。")    # ===== 终端相关方法 =====
 
@@ -488,15 +871,13 @@ class VibeLoggerGUI:
 
     def print_to_terminal(self, message):
         """在终端输出区域打印消息"""
-        self.terminal_output.config(state="normal")
-        self.terminal_output.insert(tk.END, f"{message}\n")
-        self.terminal_output.config(state="disabled")
-        self.terminal_output.see(tk.END)
+        self.terminal.write(message)
 
     def execute_command(self, event):
         """执行命令行输入的命令"""
         command = self.terminal_input.get().strip()
-        if not command:
+        # 录入模式下空输入表示采用默认值
+        if not command and not self.cli_log_mode:
             return
 
         # 清空输入框
@@ -526,10 +907,18 @@ class VibeLoggerGUI:
             self.print_to_terminal("  status      - 显示当前状态")
             self.print_to_terminal("  count       - 显示记录总数")
             self.print_to_terminal("  list [n]    - 显示最近n条记录（默认5条）")
+            self.print_to_terminal("  find <内容> - 按呼号/QTH/设备查找记录（可写 find qth 深圳 限定列）")
+            self.print_to_terminal("  stats       - 统计签到次数、常见 QTH 和设备")
+            self.print_to_terminal("  export <文件> [all] [YYYY-MM-DD] - 导出 ADIF(.adi)/Cabrillo(.log)，默认只导出上次之后的新记录")
             self.print_to_terminal("  clear       - 清空终端")
             self.print_to_terminal("  save        - 保存当前记录")
+            self.print_to_terminal("  flush       - 立即写入 Excel")
+            self.print_to_terminal("  shards      - 列出日志分片")
+            self.print_to_terminal("  perf [reset|trace on/off|profile 秒数] - 各环节耗时统计、跟踪文件、采样分析")
             self.print_to_terminal("  reset       - 重置输入表单")
             self.print_to_terminal("  log         - 进入命令行录入模式")
+            self.print_to_terminal("  <呼号> [QTH] [RST] [设备] [功率] [天馈] [留言] - 一行录入，如 BG7ABC gz 57 1 3 2 \"新天线\"")
+            self.print_to_terminal("              词汇可写序号或简拼，- 跳过，q= r= d= p= a= m= t= 指定字段，=原文 不做匹配")
             self.print_to_terminal("")
             self.print_to_terminal("快捷键:")
             self.print_to_terminal("  Ctrl+C      - 退出录入模式或清空输入")
@@ -537,11 +926,32 @@ class VibeLoggerGUI:
         elif cmd_lower == "status":
             self.print_to_terminal(f"当前序号: {self.seq_var.get()}")
             self.print_to_terminal(f"时间: {self.time_var.get()}")
-            self.print_to_terminal(f"已录入记录数: {max(0, int(self.seq_var.get()) - 1)}")
+            self.print_to_terminal(f"已录入记录数: {len(self.row_store)}")
+            if self.startup_ms is not None:
+                self.print_to_terminal(f"启动到可以录入: {self.startup_ms:.0f} ms")
+            if self.engine.backend == "sqlite":
+                self.print_to_terminal(f"存储: SQLite ({self.paths['db']})，Excel/CSV 为导出")
+            else:
+                self.print_to_terminal(f"存储: Excel ({self.paths['excel']})")
+            if self.sync is not None:
+                state = "已连接" if self.sync.online else "离线"
+                self.print_to_terminal(
+                    f"同步: {state} {self.sync.host}:{self.sync.port}（本台 {self.sync.station}），"
+                    f"待发送 {len(self.sync.outbox)} 条"
+                )
+            if self.entry_latency:
+                samples = self.entry_latency
+                self.print_to_terminal(
+                    f"表单录入耗时: 最近 {samples[-1]:.0f} ms，平均 {sum(samples) / len(samples):.0f} ms，"
+                    f"最长 {max(samples):.0f} ms（最近 {len(samples)} 条）"
+                )
             
+        elif cmd_lower.startswith("perf"):
+            self.perf_command(command.split()[1:])
+
         elif cmd_lower == "count":
-            if self.ws:
-                count = self.ws.max_row - 1  # 减去表头
+            if self.engine is not None:
+                count = len(self.row_store)  # 不含空行
                 self.print_to_terminal(f"总记录数: {count}")
             else:
                 self.print_to_terminal("工作表未初始化")
@@ -555,52 +965,221 @@ class VibeLoggerGUI:
                 except:
                     n = 5
             self.show_recent_records(n)
-            
+
+        elif cmd_lower.startswith("find"):
+            self.find_records(command.split()[1:])
+
+        elif cmd_lower == "stats":
+            self.show_stats()
+
+        elif cmd_lower.startswith("export"):
+            self.export_records(command.split()[1:])
+
         elif cmd_lower == "clear":
-            self.terminal_output.config(state="normal")
-            self.terminal_output.delete(1.0, tk.END)
-            self.terminal_output.config(state="disabled")
+            self.terminal.clear()
             self.print_to_terminal("终端已清空")
             
         elif cmd_lower == "save":
             self.save_record()
             self.print_to_terminal("已执行保存操作")
             
+        elif cmd_lower == "flush":
+            self.engine.writer.flush()
+            self.print_to_terminal("已请求写入 Excel，结果见状态栏")
+
+        elif cmd_lower == "shards":
+            self.show_shards()
+
         elif cmd_lower == "reset":
             self.next_record()
             self.print_to_terminal("已重置输入表单")
             
         elif cmd_lower == "log":
             self.start_cli_log_mode()
+
+        elif looks_like_quick_entry(command):
+            self.quick_entry(command)
             
         else:
             self.print_to_terminal(f"未知命令: {command}")
             self.print_to_terminal("输入 'help' 查看可用命令")
 
+    def show_shards(self):
+        """列出所有日志分片及记录数"""
+        if self.shards is None:
+            self.print_to_terminal(f"未启用分片，日志文件: {self.paths['excel']}")
+            return
+        self.print_to_terminal(f"分片方式: {self.shards.mode}，共 {len(self.shards.shards)} 个分片")
+        for shard in self.shards.shards:
+            if shard["name"] == self.shards.active:
+                count = len(self.row_store)
+                mark = " ← 当前"
+            else:
+                count = shard.get("count", 0)
+                mark = ""
+            self.print_to_terminal(f"  {shard['name']:16} | {count:5} 条 | 创建于 {shard.get('created', '')}{mark}")
+
     def show_recent_records(self, n):
         """显示最近n条记录"""
-        if not self.ws:
+        if self.engine is None:
             self.print_to_terminal("工作表未初始化")
             return
             
-        rows = list(self.ws.iter_rows(min_row=2, values_only=True))
+        # 行存储只读取最后 n 行
+        rows = self.row_store.tail(n)
         if not rows:
             self.print_to_terminal("暂无记录")
             return
-            
-        recent_rows = rows[-n:] if len(rows) > n else rows
-        self.print_to_terminal(f"最近 {len(recent_rows)} 条记录:")
+
+        self.print_to_terminal(f"最近 {len(rows)} 条记录:")
+        self.print_rows(rows)
+
+    def print_rows(self, rows):
         self.print_to_terminal("-" * 60)
-        for row in recent_rows:
-            if row[0] is not None:
-                seq, time, callsign, qth, rst, rig, power, ant, msg = row
-                self.print_to_terminal(f"{seq:2} | {time} | {callsign:8} | {qth:6} | {rst:2} | {rig}")
+        for row in rows:
+            seq, time, callsign, qth, rst, rig, power, ant, msg = ("" if v is None else v for v in row)
+            self.print_to_terminal(f"{seq:2} | {time} | {callsign:8} | {qth:6} | {rst:2} | {rig}")
+
+    def find_records(self, args):
+        """find <内容> 或 find <callsign|qth|rig> <内容>，直接查询行存储的列索引"""
+        if self.engine is None:
+            self.print_to_terminal("工作表未初始化")
+            return
+        fields = INDEXED_FIELDS
+        if len(args) > 1 and args[0].lower() in INDEXED_FIELDS:
+            fields = (args[0].lower(),)
+            args = args[1:]
+        value = " ".join(args)
+        if not value:
+            self.print_to_terminal("用法: find <呼号/QTH/设备> 或 find qth <QTH>")
+            return
+        rows = self.row_store.find(value, fields)
+        if not rows:
+            self.print_to_terminal(f"未找到: {value}")
+            return
+        shown = rows[-FIND_MAX_ROWS:]
+        self.print_to_terminal(f"找到 {len(rows)} 条记录" + (f"，显示最近 {len(shown)} 条" if len(shown) < len(rows) else "") + ":")
+        self.print_rows(shown)
+
+    def export_records(self, args):
+        """export <文件> [all] [日期]：从行存储流式导出 ADIF/Cabrillo，默认增量"""
+        if self.engine is None:
+            self.print_to_terminal("工作表未初始化")
+            return
+        if not args:
+            self.print_to_terminal("用法: export <文件.adi|文件.log> [all] [YYYY-MM-DD]")
+            return
+        out_path = args[0]
+        options = [arg.lower() for arg in args[1:]]
+        incremental = "all" not in options
+        # 记录日期：指定的日期、按日分片的日期，否则取日志中各记录的写入日期
+        qso_date = self.shards.active_date() if self.shards is not None else None
+        for arg in options:
+            if arg != "all":
+                try:
+                    qso_date = datetime.datetime.strptime(arg, "%Y-%m-%d").date()
+                except ValueError:
+                    self.print_to_terminal(f"日期格式应为 YYYY-MM-DD：{arg}")
+                    return
+        try:
+            count, last = export_log(
+                self.row_store,
+                out_path,
+                marks=ExportMarks(marks_path(self.paths["excel"])),
+                incremental=incremental,
+                qso_date=qso_date,
+                journal=LogJournal(self.paths["journal"]),
+                mycall=get_setting(self.config, "my_callsign", None),
+                band=get_setting(self.config, "band", None),
+                mode=get_setting(self.config, "mode", None),
+                frequency=get_setting(self.config, "frequency", None),
+                utc_offset=get_setting(self.config, "utc_offset", None),
+            )
+        except Exception as e:
+            self.print_to_terminal(f"❌ 导出失败：{e}")
+            return
+        if count:
+            self.print_to_terminal(f"📤 已导出 {count} 条记录到 {out_path}（至 No.{last}）")
+        else:
+            self.print_to_terminal(f"没有新记录需要导出（上次已导出至 No.{last}）")
+
+    def show_stats(self):
+        """签到统计，全部来自行存储的索引"""
+        if self.engine is None:
+            self.print_to_terminal("工作表未初始化")
+            return
+        self.print_to_terminal(f"记录总数: {len(self.row_store)}，不同呼号: {self.row_store.distinct('callsign')}")
+        for field, title in (("callsign", "签到最多的呼号"), ("qth", "常见 QTH"), ("rig", "常见设备")):
+            top = self.row_store.top(field, STATS_TOP_N)
+            if top:
+                self.print_to_terminal(f"{title}: " + "，".join(f"{value}×{count}" for value, count in top))
+
+    def perf_command(self, args):
+        """perf：各环节耗时；perf reset 清零；perf trace on/off/<文件> 跟踪文件；perf profile [秒数] 采样分析界面线程"""
+        # 关键字不分大小写，文件名保留原样
+        action = args[0].lower() if args else ""
+        if action == "reset":
+            PERF.reset()
+            self.print_to_terminal("耗时统计已清零")
+        elif action == "trace":
+            target = args[1] if len(args) > 1 else "on"
+            if target.lower() == "off":
+                PERF.stop_trace()
+                self.print_to_terminal("已停止写入性能跟踪文件")
+                return
+            path = PERF_TRACE_FILE if target.lower() == "on" else target
+            try:
+                PERF.start_trace(path)
+            except OSError as e:
+                self.print_to_terminal(f"❌ 无法打开 {path}：{e}")
+                return
+            self.print_to_terminal(f"每次计时都会追加写入 {path}（perf trace off 停止）")
+        elif action == "profile":
+            if self.profiler is not None:
+                self.print_to_terminal("采样分析正在进行中")
+                return
+            try:
+                seconds = float(args[1]) if len(args) > 1 else PROFILE_SECONDS
+            except ValueError:
+                self.print_to_terminal("用法: perf profile [秒数]")
+                return
+            self.profiler = SamplingProfiler()
+            self.profiler.start(seconds)
+            self.print_to_terminal(f"🔬 开始采样界面线程 {seconds:g} 秒，期间请照常操作")
+            self.root.after(int(seconds * 1000), self.finish_profile)
+        elif action:
+            self.print_to_terminal("用法: perf [reset | trace on/off/<文件> | profile [秒数]]")
+        else:
+            stats = PERF.stats()
+            if not stats:
+                self.print_to_terminal("尚无耗时记录")
+                return
+            self.print_to_terminal(f"{'环节':<16}{'次数':>8}{'p50 ms':>10}{'p95 ms':>10}{'最长 ms':>10}{'累计 ms':>12}")
+            for stage, count, p50, p95, longest, total in stats:
+                self.print_to_terminal(f"{stage:<16}{count:>8}{p50:>10.2f}{p95:>10.2f}{longest:>10.1f}{total:>12.0f}")
+            if PERF.trace_path:
+                self.print_to_terminal(f"跟踪文件: {PERF.trace_path}")
+
+    def finish_profile(self):
+        # 采样线程可能还差最后一次采样，稍后再看
+        if not self.profiler.done.is_set():
+            self.root.after(50, self.finish_profile)
+            return
+        profiler, self.profiler = self.profiler, None
+        try:
+            profiler.write(PROFILE_FILE)
+        except OSError as e:
+            self.print_to_terminal(f"❌ 无法写入 {PROFILE_FILE}：{e}")
+        self.print_to_terminal(f"🔬 采样完成（{profiler.samples} 次），界面线程耗时最多的函数（自身 / 含子调用）:")
+        for name, own, inclusive in profiler.top(PROFILE_TOP_N):
+            self.print_to_terminal(f"  {own:>6.1%} {inclusive:>7.1%}  {name}")
+        self.print_to_terminal(f"完整调用栈已写入 {PROFILE_FILE}（折叠栈格式，可用 flamegraph.pl/speedscope 查看）")
 
     # ===== 命令行录入模式 =====
 
     def start_cli_log_mode(self):
         """启动命令行录入模式"""
-        if not self.ws:
+        if self.engine is None:
             self.print_to_terminal("❌ 错误：工作表未初始化")
             return
             
@@ -613,10 +1192,10 @@ class VibeLoggerGUI:
         self.cli_log_mode = True
         self.cli_log_step = "callsign"
         self.cli_log_data = {}
+        self.cli_log_defaults = {}
         
-        next_seq = self.ws.max_row
         current_time = datetime.datetime.now().strftime("%H:%M")
-        self.print_to_terminal(f"【No.{next_seq} | {current_time}】")
+        self.print_to_terminal(f"【No.{self.engine.peek_seq()} | {current_time}】")
         self.print_to_terminal("请输入呼号 (Callsign):")
 
     def smart_match_input(self, user_input, config_key, is_qth=False):
@@ -637,21 +1216,20 @@ class VibeLoggerGUI:
                 return result
         
         # 2. 匹配逻辑
-        matches = []
-        if is_qth:
-            # QTH: 拼音首字母精确匹配 或 字符串包含匹配
-            matches = [opt for opt in options if user_val.lower() == get_pinyin_abbr(opt) or user_val.lower() in opt.lower()]
-        else:
-            # 其他: 字符串包含匹配
-            matches = [opt for opt in options if user_val.lower() in opt.lower()]
+        # 按匹配程度和使用频率排序的补全结果
+        with PERF.span("match"):
+            ranked = self.completion.rank(config_key, user_val)
+        matches = [opt for opt, _ in ranked]
+        # 仅靠编辑距离容错得到的结果不自动采用，交给用户确认
+        fuzzy = bool(ranked) and ranked[0][1] == SCORE_FUZZY
         
         # 3. 处理匹配结果
-        if len(matches) == 1:
+        if len(matches) == 1 and not fuzzy:
             result = matches[0]
             self.print_to_terminal(f"   ∟ 匹配到 【{result}】")
             return result
-        elif len(matches) > 1:
-            self.print_to_terminal("   ⚠️ 匹配到多个选项:")
+        elif matches:
+            self.print_to_terminal("   ⚠️ 可能是以下选项:" if fuzzy else "   ⚠️ 匹配到多个选项:")
             for m_idx, m_opt in enumerate(matches, 1):
                 self.print_to_terminal(f"      {m_idx}. {m_opt}")
             self.print_to_terminal("请输入序号选择，或输入新内容")
@@ -662,15 +1240,18 @@ class VibeLoggerGUI:
         # 4. 无匹配，使用用户输入
         return user_val
 
-    def show_options_for_input(self, config_key, prompt_text, is_qth=False):
+    def show_options_for_input(self, config_key, prompt_text, is_qth=False, default=None):
         """显示选项列表"""
         options = self.config.get(config_key, [])
+        index = self.match_indexes[config_key]
         self.print_to_terminal(f"\n>>> {prompt_text}")
         for i, opt in enumerate(options, 1):
-            abbr_hint = f" [{get_pinyin_abbr(opt)}]" if is_qth else ""
+            abbr_hint = f" [{index.abbr(opt)}]" if is_qth else ""
             self.print_to_terminal(f"  {i}. {opt}{abbr_hint}")
         
         hint = "序号/简拼/关键词/内容" if is_qth else "序号/关键词/内容"
+        if default:
+            hint = f"{hint}（回车沿用上次：{default}）"
         self.print_to_terminal(f"请输入 {hint}:")
 
     def process_cli_log_input(self, user_input):
@@ -683,15 +1264,42 @@ class VibeLoggerGUI:
         step = self.cli_log_step
         
         if step == "callsign":
-            if user_input.strip():
-                self.cli_log_data["callsign"] = user_input.strip().upper()
+            if any(ch.isspace() for ch in user_input.strip()):
+                # 呼号后接着写了其余各项：按一行录入保存，出错时留在本步重新输入
+                if self.quick_entry(user_input):
+                    self.cli_log_mode = False
+                    self.cli_log_step = ""
+                    self.print_to_terminal("录入完成！输入 'log' 可继续录入下一条记录")
+                else:
+                    self.print_to_terminal("请重新输入:")
+            elif user_input.strip():
+                callsign = user_input.strip().upper()
+                self.cli_log_data["callsign"] = callsign
+                warning = self.duplicate_warning(callsign)
+                if warning:
+                    self.print_to_terminal(warning)
+                    self.status_var.set(warning)
+                last, count = self.history.lookup(callsign)
+                self.cli_log_defaults = last or {}
+                if last:
+                    self.print_to_terminal(
+                        f"📇 {callsign} 第 {count + 1} 次签到，上次 {last['time']}："
+                        f"{last['qth']} | {last['rig']} | {last['power']} | {last['antenna']}"
+                    )
                 self.cli_log_step = "qth"
-                self.show_options_for_input("QTH", "选择/输入 QTH (所在地)", is_qth=True)
+                self.show_options_for_input(
+                    "QTH", "选择/输入 QTH (所在地)", is_qth=True, default=self.cli_log_defaults.get("qth")
+                )
             else:
                 self.print_to_terminal("呼号不能为空，请重新输入:")
                 
         elif step == "qth":
             if not user_input.strip():  # 空输入处理
+                if self.cli_log_defaults.get("qth"):
+                    self.cli_log_data["qth"] = self.cli_log_defaults["qth"]
+                    self.cli_log_step = "rst"
+                    self.print_to_terminal("请输入 RST [默认 59]:")
+                    return
                 self.print_to_terminal("QTH不能为空，请重新输入:")
                 return
                 
@@ -720,12 +1328,19 @@ class VibeLoggerGUI:
                 self.print_to_terminal("请输入 RST [默认 59]:")
                 
         elif step == "rst":
-            self.cli_log_data["rst"] = user_input.strip() or "59"
+            self.cli_log_data["rst"] = user_input.strip() or DEFAULT_RST
             self.cli_log_step = "rig"
-            self.show_options_for_input("Rig", "选择/输入设备 (Rig)")
+            self.show_options_for_input("Rig", "选择/输入设备 (Rig)", default=self.cli_log_defaults.get("rig"))
             
         elif step == "rig":
             if not user_input.strip():  # 空输入处理
+                if self.cli_log_defaults.get("rig"):
+                    self.cli_log_data["rig"] = self.cli_log_defaults["rig"]
+                    self.cli_log_step = "power"
+                    self.show_options_for_input(
+                        "Power", "选择/输入功率 (Power)", default=self.cli_log_defaults.get("power")
+                    )
+                    return
                 self.print_to_terminal("设备不能为空，请重新输入:")
                 return
                 
@@ -735,36 +1350,43 @@ class VibeLoggerGUI:
             elif result:
                 self.cli_log_data["rig"] = result
                 self.cli_log_step = "power"
-                self.show_options_for_input("Power", "选择/输入功率 (Power)")
+                self.show_options_for_input(
+                    "Power", "选择/输入功率 (Power)", default=self.cli_log_defaults.get("power")
+                )
                 
         elif step == "rig_select":
             self._handle_select("rig", user_input, "power", "Power")
                 
         elif step == "power":
-            # power允许空输入，使用默认值5W
+            # power允许空输入，沿用上次的功率或默认值5W
             if not user_input.strip():
-                self.cli_log_data["power"] = "5W"
+                self.cli_log_data["power"] = self.cli_log_defaults.get("power") or DEFAULT_POWER
                 self.cli_log_step = "antenna"
-                self.show_options_for_input("Antenna", "选择/输入天馈 (Antenna)")
+                self.show_options_for_input(
+                    "Antenna", "选择/输入天馈 (Antenna)", default=self.cli_log_defaults.get("antenna")
+                )
                 return
                 
             result = self.smart_match_input(user_input, "Power")
             if result == "MULTIPLE_MATCHES":
                 self.cli_log_step = "power_select"
-            elif result:
-                self.cli_log_data["power"] = result
-                self.cli_log_step = "antenna"
-                self.show_options_for_input("Antenna", "选择/输入天馈 (Antenna)")
             else:
-                self.cli_log_data["power"] = user_input or "5W"
+                self.cli_log_data["power"] = result or user_input or DEFAULT_POWER
                 self.cli_log_step = "antenna"
-                self.show_options_for_input("Antenna", "选择/输入天馈 (Antenna)")
+                self.show_options_for_input(
+                    "Antenna", "选择/输入天馈 (Antenna)", default=self.cli_log_defaults.get("antenna")
+                )
                 
         elif step == "power_select":
-            self._handle_select("power", user_input, "antenna", "Antenna", default="5W")
+            self._handle_select("power", user_input, "antenna", "Antenna", default=DEFAULT_POWER)
                 
         elif step == "antenna":
             if not user_input.strip():  # 空输入处理
+                if self.cli_log_defaults.get("antenna"):
+                    self.cli_log_data["antenna"] = self.cli_log_defaults["antenna"]
+                    self.cli_log_step = "message"
+                    self.print_to_terminal("请输入讨论话题及留言 [默认 73]:")
+                    return
                 self.print_to_terminal("天馈不能为空，请重新输入:")
                 return
                 
@@ -780,7 +1402,7 @@ class VibeLoggerGUI:
             self._handle_select("antenna", user_input, "message", "")
                 
         elif step == "message":
-            self.cli_log_data["message"] = user_input.strip() or "73"
+            self.cli_log_data["message"] = user_input.strip() or DEFAULT_MESSAGE
             self.save_cli_log_record()
 
     def _handle_select(self, field_name, user_input, next_step, next_config_key, default=""):
@@ -793,7 +1415,11 @@ class VibeLoggerGUI:
                 if next_step == "message":
                     self.print_to_terminal("请输入讨论话题及留言 [默认 73]:")
                 else:
-                    self.show_options_for_input(next_config_key, f"选择/输入{next_config_key} ({next_config_key})")
+                    self.show_options_for_input(
+                        next_config_key,
+                        f"选择/输入{next_config_key} ({next_config_key})",
+                        default=self.cli_log_defaults.get(next_step),
+                    )
             else:
                 self.print_to_terminal("序号无效，请重新选择:")
         else:
@@ -802,53 +1428,29 @@ class VibeLoggerGUI:
             if next_step == "message":
                 self.print_to_terminal("请输入讨论话题及留言 [默认 73]:")
             else:
-                self.show_options_for_input(next_config_key, f"选择/输入{next_config_key} ({next_config_key})")
+                self.show_options_for_input(
+                    next_config_key,
+                    f"选择/输入{next_config_key} ({next_config_key})",
+                    default=self.cli_log_defaults.get(next_step),
+                )
 
     def save_cli_log_record(self):
         """保存命令行录入的记录"""
-        data = self.cli_log_data
+        row = normalize_record(self.cli_log_data)
+        _, _, callsign, qth, rst, rig, power, ant, msg = row
         
         # 学习新词汇
-        self.learn_new_value("QTH", data.get("qth", ""))
-        self.learn_new_value("Rig", data.get("rig", ""))
-        self.learn_new_value("Power", data.get("power", ""))
-        self.learn_new_value("Antenna", data.get("antenna", ""))
-        
-        # 保存到Excel
-        next_seq = self.ws.max_row
-        current_time = datetime.datetime.now().strftime("%H:%M")
-        
-        self.ws.append([
-            next_seq, 
-            current_time, 
-            data.get("callsign", ""), 
-            data.get("qth", ""), 
-            data.get("rst", "59"), 
-            data.get("rig", ""), 
-            data.get("power", "5W"), 
-            data.get("antenna", ""), 
-            data.get("message", "73")
-        ])
-        self.wb.save(EXCEL_FILE)
-        
-        # 同步导出CSV
-        export_to_csv(self.ws)
+        self.learn_new_value("QTH", qth)
+        self.learn_new_value("Rig", rig)
+        self.learn_new_value("Power", power)
+        self.learn_new_value("Antenna", ant)
         
-        # 更新日志表格视图
-        if self.log_tree is not None:
-            self.log_tree.insert("", "end", values=(
-                next_seq, current_time, data.get("callsign", ""), 
-                data.get("qth", ""), data.get("rst", "59"), 
-                data.get("rig", ""), data.get("power", "5W"), 
-                data.get("antenna", ""), data.get("message", "73")
-            ))
-            children = self.log_tree.get_children()
-            if children:
-                self.log_tree.see(children[-1])
+        # 交给后台线程保存，并更新日志表格视图
+        self.submit_row(row)
         
         # 显示确认信息
         self.print_to_terminal("-" * 35)
-        self.print_to_terminal(f"✅ 已记录：{data.get('callsign', '')} | {data.get('qth', '')} | {data.get('rig', '')} | {data.get('power', '5W')} | {data.get('antenna', '')} | {data.get('rst', '59')} | {data.get('message', '73')}")
+        self.print_to_terminal(f"✅ 已记录：{callsign} | {qth} | {rig} | {power} | {ant} | {rst} | {msg}")
         self.print_to_terminal("-" * 35)
         
         # 重置状态
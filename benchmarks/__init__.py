@@ -0,0 +1 @@
+"""性能测试：合成日志生成器与各关键路径的计时脚本"""
@@ -0,0 +1,84 @@
+"""启动到可以录入的耗时（time-to-first-keystroke）
+
+命令行版：在临时目录中放一份合成日志（含行缓存和拼音缓存，即日常启动的情形），
+从启动进程计时到出现第一个“请输入呼号”提示；GUI 版需要显示器，这里计时导入模块
+并检查启动时是否加载了 openpyxl/pypinyin。每项取多次运行的中位数。
+
+用法：python benchmarks/bench_first_keystroke.py [行数，默认 10000] [次数，默认 5]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import SyntheticNet, write_log  # noqa: E402
+from log_loader import write_rows_cache  # noqa: E402
+from vocab_store import write_json_atomic  # noqa: E402
+
+PROMPT = "Callsign".encode("utf-8")
+IMPORT_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import VibeLogger_gui\n"
+    "print((time.perf_counter() - start) * 1000, 'openpyxl' in sys.modules, 'pypinyin' in sys.modules)\n"
+)
+
+
+def cli_first_prompt(workdir: str) -> float:
+    """启动命令行版，返回出现呼号提示所用的毫秒数"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "VibeLogger.py")],
+        cwd=workdir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    while PROMPT not in output:
+        chunk = proc.stdout.read1(4096)
+        if not chunk:
+            raise RuntimeError("命令行版没有出现录入提示：" + output.decode("utf-8", "replace"))
+        output += chunk
+    elapsed = (time.perf_counter() - start) * 1000
+    proc.stdin.close()  # 输入结束即退出，日志没有变化，不会写 Excel
+    proc.wait()
+    return elapsed
+
+
+def gui_import(workdir: str):
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=workdir, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+    )
+    ms, openpyxl_loaded, pypinyin_loaded = out.stdout.split()
+    return float(ms), openpyxl_loaded == "True", pypinyin_loaded == "True"
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        net = SyntheticNet()
+        excel = os.path.join(tmp, "Ham_Radio_Log_2026.xlsx")
+        data = net.rows(rows)
+        write_log(excel, data)
+        write_rows_cache(excel, data)
+        write_json_atomic(os.path.join(tmp, "log_config.json"), net.config())
+        # 第一次启动建立拼音缓存，不计入
+        first = cli_first_prompt(tmp)
+        print(f"{rows} 行日志，{len(net.qths)} 个 QTH 词汇")
+        print(f"命令行版首次启动（建立拼音缓存）：{first:.1f} ms")
+        cli = statistics.median(cli_first_prompt(tmp) for _ in range(runs))
+        print(f"命令行版启动到呼号提示：{cli:.1f} ms")
+        results = [gui_import(tmp) for _ in range(runs)]
+        ms = statistics.median(result[0] for result in results)
+        _, openpyxl_loaded, pypinyin_loaded = results[-1]
+        print(f"GUI 版导入模块：{ms:.1f} ms"
+              f"（openpyxl {'已' if openpyxl_loaded else '未'}加载，pypinyin {'已' if pypinyin_loaded else '未'}加载）")
+
+
+if __name__ == "__main__":
+    main()
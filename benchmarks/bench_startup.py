@@ -0,0 +1,46 @@
+"""启动耗时对比：完整加载工作簿 vs 只读流式读取 vs 行缓存
+
+用法：python benchmarks/bench_startup.py [行数，默认 50000]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import load_workbook  # noqa: E402
+
+from benchmarks.synthetic import SyntheticNet, write_log  # noqa: E402
+from log_loader import cache_path, load_sheet_rows, write_rows_cache  # noqa: E402
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{elapsed * 1000:>10.1f} ms")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.xlsx")
+        print(f"生成 {rows} 行测试日志……")
+        write_log(path, SyntheticNet().rows(rows))
+
+        def full_load():
+            wb = load_workbook(path)
+            return wb.active.max_row
+
+        timed("完整加载 load_workbook", full_load)
+        data = timed("只读流式读取", lambda: load_sheet_rows(path))
+        write_rows_cache(path, data)
+        cached = timed("行缓存读取", lambda: load_sheet_rows(path))
+        assert cached == data
+        os.remove(cache_path(path))
+
+
+if __name__ == "__main__":
+    main()
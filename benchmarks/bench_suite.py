@@ -0,0 +1,269 @@
+"""性能基准测试：用合成日志对程序的关键路径计时，结果写成 JSON，便于在不同版本之间对比
+
+用法：
+    python benchmarks/bench_suite.py                                # 默认 1000、10000、100000 行
+    python benchmarks/bench_suite.py --rows 1000 10000 -o bench_results.json
+    python benchmarks/bench_suite.py --compare bench_results.json  # 与之前保存的结果对比
+
+各项与程序中的路径对应（均为毫秒）：
+- startup_cold / startup_cached：启动时读取日志并做完整性检查（解析 Excel / 读取行缓存）
+- view_build：建立行存储、呼号索引、本场签到和词汇使用统计（load_existing_logs_into_view）
+- save_submit：界面线程保存一条记录的耗时（save_record 只投递给后台线程）
+- save_persist：后台线程把一批记录写入日志、追加 CSV 并保存 Excel 的总耗时
+- csv_rebuild：整体重新导出 CSV（export_to_csv）
+- sqlite_append：以 SQLite 为准时保存一条记录
+- callsign_lookup：录入呼号时带出该台上次的信息
+- index_build_cold / index_build_cached：建立词汇匹配索引（计算拼音 / 读取拼音缓存）
+- match：QTH 输入补全（smart_match_input / on_qth_typing），查询混合了全称、前缀、缩写、全拼和错字
+- vocab_learn：学到一个新词后追加到增量文件
+- config_save：完整重写配置文件（save_config）
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from VibeLogger import get_pinyin_abbr, get_pinyin_full  # noqa: E402
+from benchmarks.synthetic import SyntheticNet, write_log  # noqa: E402
+from log_csv import CsvSink  # noqa: E402
+from log_index import CallsignHistory, RowStore, SessionCallsigns  # noqa: E402
+from log_integrity import load_rows_checked  # noqa: E402
+from log_journal import LogJournal  # noqa: E402
+from log_loader import cache_path, write_rows_cache  # noqa: E402
+from log_sqlite import SqliteLogStore  # noqa: E402
+from log_writer import WRITER_LATENCY_MS, PersistenceWorker  # noqa: E402
+from vocab_index import CompletionEngine, build_match_indexes  # noqa: E402
+from vocab_store import VocabStore, write_json_atomic  # noqa: E402
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+# 每轮保存测试提交的记录数（约一场点名中连续录入的几台）
+SAVE_BATCH = 20
+MATCH_QUERIES = 300
+LOOKUPS = 1000
+LEARN_WORDS = 40
+# 对比时变化超过这个比例才标出
+COMPARE_THRESHOLD = 0.10
+
+
+def summarize(samples) -> dict:
+    """一组耗时（秒）的统计，单位毫秒"""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "max_ms": round(ms[-1], 4),
+    }
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def git_version() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def match_queries(net: SyntheticNet, rnd: random.Random) -> list:
+    """从 QTH 词汇中抽样构造输入：全称、首字、拼音缩写前缀、全拼前缀、区县名和错一个字母的缩写"""
+    queries = []
+    for name in rnd.sample(net.qths, min(len(net.qths), MATCH_QUERIES // 6 + 1)):
+        abbr = get_pinyin_abbr(name)
+        typo = abbr[:-1] + ("z" if abbr[-1] != "z" else "a")
+        queries += [name, name[0], abbr[:2], get_pinyin_full(name)[:4], name[-2:], typo]
+    return queries[:MATCH_QUERIES]
+
+
+def bench_size(count: int, args, tmp: str) -> dict:
+    net = SyntheticNet(args.callsigns, args.vocab, args.zipf, args.seed)
+    rnd = random.Random(args.seed)
+    excel = os.path.join(tmp, f"log_{count}.xlsx")
+    csv_file = os.path.join(tmp, f"log_{count}.csv")
+    config_file = os.path.join(tmp, f"config_{count}.json")
+    abbr_cache = os.path.join(tmp, f"abbr_{count}.json")
+    rows = net.rows(count)
+    write_log(excel, rows)
+    CsvSink(csv_file).rebuild(rows)
+    config = net.config()
+    write_json_atomic(config_file, config)
+    result = {"rows": count, "excel_bytes": os.path.getsize(excel)}
+
+    # 启动读取
+    cold = []
+    for _ in range(args.repeat):
+        if os.path.exists(cache_path(excel)):
+            os.remove(cache_path(excel))
+        elapsed, (loaded, _, _) = timed(lambda: load_rows_checked(excel, csv_file))
+        cold.append(elapsed)
+    result["startup_cold"] = summarize(cold)
+    write_rows_cache(excel, loaded)
+    result["startup_cached"] = summarize(
+        [timed(lambda: load_rows_checked(excel, csv_file))[0] for _ in range(args.repeat)]
+    )
+
+    # 词汇匹配索引
+    cold = []
+    for _ in range(args.repeat):
+        if os.path.exists(abbr_cache):
+            os.remove(abbr_cache)
+        cold.append(timed(lambda: build_match_indexes(config, get_pinyin_abbr, abbr_cache, get_pinyin_full))[0])
+    result["index_build_cold"] = summarize(cold)
+    result["index_build_cached"] = summarize(
+        [timed(lambda: build_match_indexes(config, get_pinyin_abbr, abbr_cache, get_pinyin_full))[0]
+         for _ in range(args.repeat)]
+    )
+
+    # 建立界面所需的内存结构
+    def build_view():
+        store = RowStore(row for row in loaded if row[0] is not None)
+        history = CallsignHistory()
+        history.load_rows(loaded)
+        session = SessionCallsigns(0)
+        session.load_tail(loaded)
+        engine = CompletionEngine(build_match_indexes(config, get_pinyin_abbr, abbr_cache, get_pinyin_full))
+        for row in loaded:
+            if row[0] is not None:
+                engine.record_row(row)
+        return store, history, engine
+
+    samples = []
+    for _ in range(args.repeat):
+        elapsed, (store, history, engine) = timed(build_view)
+        samples.append(elapsed)
+    result["view_build"] = summarize(samples)
+
+    # 录入呼号带出上次信息、QTH 补全
+    calls = rnd.choices(net.callsigns, k=LOOKUPS)
+    result["callsign_lookup"] = summarize([timed(lambda: history.lookup(call))[0] for call in calls])
+    queries = match_queries(net, rnd)
+    result["match"] = summarize([timed(lambda: engine.complete("QTH", q))[0] for q in queries])
+
+    # 保存记录：界面线程投递，后台线程写日志/CSV/Excel
+    journal_file = os.path.join(tmp, f"log_{count}.journal")
+    sheet_rows = list(loaded)
+    submit, persist = [], []
+    for _ in range(args.repeat):
+        csv_sink = CsvSink(csv_file)
+        csv_sink.sync(sheet_rows)
+        worker = PersistenceWorker(sheet_rows, LogJournal(journal_file), csv_sink, excel, WRITER_LATENCY_MS)
+        batch = net.rows(SAVE_BATCH, start_seq=sheet_rows[-1][0] + 1)
+        start = time.perf_counter()
+        for row in batch:
+            elapsed, _ = timed(lambda: worker.submit(row))
+            submit.append(elapsed)
+        worker.close()
+        persist.append(time.perf_counter() - start)
+        sheet_rows = worker.rows
+    result["save_submit"] = summarize(submit)
+    result["save_persist"] = summarize(persist)
+    result["csv_rebuild"] = summarize(
+        [timed(lambda: CsvSink(csv_file).rebuild(sheet_rows))[0] for _ in range(args.repeat)]
+    )
+
+    # 以 SQLite 为准时的保存
+    db = SqliteLogStore(os.path.join(tmp, f"log_{count}.db"))
+    try:
+        db.append_many(sheet_rows)
+        extra = net.rows(SAVE_BATCH * args.repeat, start_seq=sheet_rows[-1][0] + 1)
+        result["sqlite_append"] = summarize([timed(lambda: db.append(row))[0] for row in extra])
+    finally:
+        db.close()
+
+    # 自学习新词与重写配置文件
+    vocab = VocabStore(config, config_file)
+    learn = []
+    for i in range(LEARN_WORDS):
+        word = f"新地点{count}_{i}"
+        config["QTH"].append(word)
+        learn.append(timed(lambda: (vocab.add("QTH", word), vocab.flush()))[0])
+    result["vocab_learn"] = summarize(learn)
+    result["config_save"] = summarize([timed(vocab.compact)[0] for _ in range(args.repeat)])
+    return result
+
+
+def compare(current: dict, baseline: dict):
+    """按中位数逐项对比两次结果，变化超过 COMPARE_THRESHOLD 的标出"""
+    print(f"\n与 {baseline.get('version') or '之前的结果'} 对比（中位数）：")
+    for size, items in current["results"].items():
+        old_items = baseline.get("results", {}).get(size)
+        if not old_items:
+            continue
+        print(f"  {size} 行")
+        for name, stats in items.items():
+            old = old_items.get(name)
+            if not isinstance(stats, dict) or not isinstance(old, dict) or not old.get("median_ms"):
+                continue
+            ratio = stats["median_ms"] / old["median_ms"]
+            mark = ""
+            if ratio > 1 + COMPARE_THRESHOLD:
+                mark = "  ⚠️ 变慢"
+            elif ratio < 1 - COMPARE_THRESHOLD:
+                mark = "  ✅ 变快"
+            print(f"    {name:<22}{old['median_ms']:>12.3f} → {stats['median_ms']:>12.3f} ms  ×{ratio:.2f}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用合成日志对关键路径计时，结果写成 JSON")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="日志行数（可多个）")
+    parser.add_argument("--callsigns", type=int, default=2000, help="不同呼号的数量")
+    parser.add_argument("--vocab", type=int, default=500, help="QTH 词汇量")
+    parser.add_argument("--zipf", type=float, default=1.1, help="呼号签到频率的 Zipf 指数（越大越集中于常客）")
+    parser.add_argument("--seed", type=int, default=2026, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="整体操作的重复次数")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="结果文件")
+    parser.add_argument("--compare", help="与之前保存的结果文件对比")
+    args = parser.parse_args()
+
+    report = {
+        "version": git_version(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "callsigns": args.callsigns,
+            "vocab": args.vocab,
+            "zipf": args.zipf,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "save_batch": SAVE_BATCH,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.rows:
+            print(f"⏱️ {count} 行……")
+            result = bench_size(count, args, tmp)
+            report["results"][str(count)] = result
+            for name, stats in result.items():
+                if isinstance(stats, dict):
+                    print(f"  {name:<22}{stats['median_ms']:>12.3f} ms（p95 {stats['p95_ms']:.3f}）")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已写入 {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""合成点名日志生成器：按给定行数、呼号分布和词汇量生成接近真实台网的日志和配置
+
+常客按 Zipf 分布反复签到（少数呼号占大部分记录），每个呼号有固定的 QTH/设备/功率/天馈，
+偶尔更换；QTH 为中文地名（城市 + 区县 + 方位）。同样的参数和种子总是生成同样的数据。
+"""
+import random
+
+from log_integrity import write_workbook_rows
+
+CITIES = [
+    "广州", "深圳", "佛山", "东莞", "惠州", "珠海", "中山", "江门", "肇庆", "清远",
+    "韶关", "汕头", "潮州", "揭阳", "湛江", "茂名", "阳江", "云浮", "河源", "梅州",
+    "长沙", "武汉", "南昌", "福州", "厦门", "南宁", "桂林", "昆明", "贵阳", "成都",
+    "重庆", "西安", "郑州", "济南", "杭州", "南京", "合肥", "上海", "北京", "天津",
+]
+DISTRICTS = [
+    "天河", "越秀", "海珠", "白云", "番禺", "花都", "南沙", "从化", "增城", "黄埔",
+    "福田", "罗湖", "南山", "宝安", "龙岗", "龙华", "坪山", "光明", "盐田", "大鹏",
+    "禅城", "南海", "顺德", "高明", "三水", "莞城", "石龙", "虎门", "长安", "塘厦",
+]
+DIRECTIONS = ["", "东", "西", "南", "北", "新区", "城区"]
+RIGS = [
+    "UV-K5", "UV-K6", "UV-5R", "森海克斯8800", "八重洲FT-65R", "八重洲FT-991A",
+    "建伍TH-D74", "建伍TM-V71", "艾可慕IC-705", "艾可慕IC-9700", "摩托罗拉GP328", "泉盛TG-UV2",
+]
+POWERS = ["0.5W", "1W", "5W", "10W", "25W", "50W", "100W"]
+ANTENNAS = [
+    "原装天线", "老鹰775拉杆天线", "IOO天线", "钻石X50", "钻石X200", "八木天线",
+    "GP天线", "J型天线", "吸盘天线", "自制双频天线",
+]
+MESSAGES = ["73", "73！", "信号很好", "首次签到", "移动中", "家里固定台", "感谢主控", ""]
+PREFIXES = ["BA", "BD", "BG", "BH", "BI", "BV", "BY"]
+REPORTS = ["59", "59", "59", "58", "57", "55", "599"]
+
+
+def qth_names(count: int) -> list:
+    """count 个互不相同的中文地名，前面是城市名，之后依次组合区县与方位"""
+    names = list(CITIES)
+    for direction in DIRECTIONS:
+        for city in CITIES:
+            for district in DISTRICTS:
+                if len(names) >= count:
+                    return names[:count]
+                names.append(city + district + direction)
+    if len(names) < count:
+        raise ValueError(f"QTH 词汇量最多 {len(names)} 个")
+    return names[:count]
+
+
+class SyntheticNet:
+    """合成台网：callsigns 个呼号按 1/名次^zipf 的频率签到，QTH 词汇量为 vocab"""
+
+    def __init__(self, callsigns: int = 2000, vocab: int = 500, zipf: float = 1.1, seed: int = 2026):
+        self.rnd = random.Random(seed)
+        self.qths = qth_names(vocab)
+        calls = set()
+        while len(calls) < callsigns:
+            calls.add(
+                f"{self.rnd.choice(PREFIXES)}{self.rnd.randint(1, 9)}"
+                f"{''.join(self.rnd.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=self.rnd.choice((2, 3))))}"
+            )
+        self.callsigns = sorted(calls)
+        self.rnd.shuffle(self.callsigns)
+        total = 0.0
+        self.cum_weights = []
+        for rank in range(1, callsigns + 1):
+            total += 1.0 / rank ** zipf
+            self.cum_weights.append(total)
+        self.stations = {
+            call: [
+                self.rnd.choice(self.qths),
+                self.rnd.choice(RIGS),
+                self.rnd.choice(POWERS),
+                self.rnd.choice(ANTENNAS),
+            ]
+            for call in self.callsigns
+        }
+
+    def config(self) -> dict:
+        """与 log_config.json 结构相同的配置"""
+        return {
+            "QTH": list(self.qths),
+            "Rig": list(RIGS),
+            "Power": list(POWERS),
+            "Antenna": list(ANTENNAS),
+            "Settings": {},
+        }
+
+    def rows(self, count: int, start_seq: int = 1) -> list:
+        """count 行日志（9 列），序号从 start_seq 起；每场点名 20:00 开始，每分钟签到若干台"""
+        rnd = self.rnd
+        calls = rnd.choices(self.callsigns, cum_weights=self.cum_weights, k=count)
+        rows = []
+        minute = 0
+        for i, call in enumerate(calls):
+            if i % 120 == 0:
+                minute = 0  # 新的一场
+            elif rnd.random() < 0.5:
+                minute += 1
+            station = self.stations[call]
+            if rnd.random() < 0.05:
+                # 偶尔换地方或换设备，呼号带出的上次信息随之变化
+                field = rnd.randrange(4)
+                station[field] = rnd.choice((self.qths, RIGS, POWERS, ANTENNAS)[field])
+            hour, mm = divmod(20 * 60 + min(minute, 239), 60)
+            rows.append((
+                start_seq + i,
+                f"{hour:02d}:{mm:02d}",
+                call,
+                station[0],
+                rnd.choice(REPORTS),
+                station[1],
+                station[2],
+                station[3],
+                rnd.choice(MESSAGES),
+            ))
+        return rows
+
+
+def write_log(excel_file: str, rows):
+    """把合成的日志写成与程序相同格式的 Excel"""
+    write_workbook_rows(excel_file, rows)
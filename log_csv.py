@@ -0,0 +1,87 @@
+import csv
+import os
+
+from log_journal import LOG_HEADERS
+
+
+def _cells_to_strings(row) -> list:
+    return ["" if v is None else str(v) for v in row]
+
+
+class CsvSink:
+    """增量写 CSV：平时每条记录只追加一行，与日志数据不一致时才整体重建。
+
+    通过文件大小和行数判断 CSV 是否被外部修改、截断或落后于日志数据。
+    下面的 rows 均指不含表头的全部数据行。导出失败只通过 report 提示（默认打印）。
+    """
+
+    def __init__(self, path: str, header=LOG_HEADERS, report=print):
+        self.path = path
+        self.header = list(header)
+        self.report = report
+        self._rows = 0  # 文件中的行数（含表头）
+        self._size = -1  # 上次写入后的文件字节数，-1 表示尚未校验
+
+    def sync(self, rows) -> bool:
+        """校验 CSV 与日志数据一致，不一致则重建；返回是否发生了重建"""
+        if self._matches(rows):
+            return False
+        try:
+            self.rebuild(rows)
+        except Exception as e:
+            self._size = -1
+            self.report(f"导出 CSV 失败: {e}")
+        return True
+
+    def _matches(self, rows) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                count = 1 + sum(1 for _ in reader)
+        except (OSError, UnicodeDecodeError, csv.Error):
+            return False
+        if header != _cells_to_strings(self.header) or count != len(rows) + 1:
+            return False
+        self._rows = count
+        self._size = os.path.getsize(self.path)
+        return True
+
+    def rebuild(self, rows):
+        """将全部数据完整导出为 CSV 文件（含表头）"""
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.header)
+            for row in rows:
+                writer.writerow(list(row))
+        self._rows = len(rows) + 1
+        self._size = os.path.getsize(self.path)
+
+    def append(self, row, rows):
+        """追加刚加入 rows 的一行；文件被改动或行数对不上时改为整体重建"""
+        self.append_many([row], rows)
+
+    def append_many(self, new_rows, rows):
+        """追加刚加入 rows 的若干行"""
+        try:
+            if (
+                self._size < 0
+                or not os.path.exists(self.path)
+                or os.path.getsize(self.path) != self._size
+                or self._rows + len(new_rows) != len(rows) + 1
+            ):
+                self.rebuild(rows)
+                return
+            with open(self.path, "a", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                for row in new_rows:
+                    writer.writerow(list(row))
+                f.flush()
+                self._size = os.fstat(f.fileno()).st_size
+            self._rows += len(new_rows)
+        except Exception as e:
+            # 导出失败只提示，不中断主流程；下次追加时会因大小不符而重建
+            self._size = -1
+            self.report(f"导出 CSV 失败: {e}")
@@ -0,0 +1,358 @@
+import datetime
+import itertools
+import json
+import os
+import queue
+import threading
+
+from log_csv import CsvSink
+from log_index import CallsignHistory, RowStore, SessionCallsigns
+from log_integrity import SNAPSHOT_COUNT, load_rows_checked
+from log_journal import LOG_FIELDS, LOG_HEADERS, MISSING_VALUE, LogJournal
+from log_loader import last_seq, recover_rows
+from log_lock import LogLocks
+from log_shards import idle_minutes
+from log_sqlite import SqliteCallsignIndex, excel_export_current, open_sqlite_store
+from log_writer import WRITER_LATENCY_MS, PersistenceWorker
+from perf_trace import PERF
+from vocab_index import VOCAB_COLUMNS
+from vocab_store import VocabStore
+
+# 记录的缺省值，与命令行版、GUI 版的表单一致
+DEFAULT_RST = "59"
+DEFAULT_POWER = "5W"
+DEFAULT_MESSAGE = "73"
+# 记录中也可以用 Excel 表头（中文列名）作为字段名
+HEADER_FIELDS = dict(zip(LOG_HEADERS, LOG_FIELDS))
+# 退出时等待后台线程写完的最长时间（秒）
+ENGINE_EXIT_TIMEOUT = 30
+# 管道模式：一次最多合并写入的记录数，以及没有输入时检查后台线程消息的间隔（秒）
+PIPE_BATCH = 500
+PIPE_QUEUE_SIZE = 4096
+PIPE_POLL_S = 0.5
+
+
+def normalize_record(record: dict, now: str = None) -> list:
+    """记录字典（字段名同 LOG_FIELDS，也可用 Excel 表头）转换为待分配序号的 9 列行。
+
+    呼号去掉首尾空格并转大写，不能为空或含空格；RST、功率、留言缺省为 59、5W、73，
+    时间缺省为当前时刻（HH:MM）。不合法时抛出 ValueError。
+    """
+    if not isinstance(record, dict):
+        raise ValueError("记录应为 JSON 对象")
+    values = {HEADER_FIELDS.get(key, key): value for key, value in record.items()}
+
+    def text(field):
+        value = values.get(field)
+        return "" if value is None else str(value).strip()
+
+    callsign = text("callsign").upper()
+    if not callsign:
+        raise ValueError("呼号不能为空")
+    if any(ch.isspace() for ch in callsign):
+        raise ValueError(f"呼号 {callsign} 中不能有空格")
+    return [
+        None,
+        text("time") or now or datetime.datetime.now().strftime("%H:%M"),
+        callsign,
+        text("qth"),
+        text("rst") or DEFAULT_RST,
+        text("rig"),
+        text("power") or DEFAULT_POWER,
+        text("antenna"),
+        text("message") or DEFAULT_MESSAGE,
+    ]
+
+
+def parse_line(line: str) -> dict:
+    """管道中的一行：JSON 对象，如 {"callsign": "BG7XXX", "qth": "深圳"}"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise ValueError("不是合法的 JSON") from None
+    if not isinstance(record, dict):
+        raise ValueError("记录应为 JSON 对象")
+    return record
+
+
+class LogEngine:
+    """不依赖界面的记录引擎：按配置打开当前日志（分片、存储后端、多录入端共用锁），
+    校验记录、补缺省值、分配序号、学习新词汇，再交给后台线程落盘。
+
+    GUI 版、命令行版和管道模式都通过它打开日志和保存记录，界面只负责显示和补全统计；
+    行存储、呼号历史和本场签到由这里随记录一起更新。可与其他录入端同时写同一份日志。用法：
+
+        with LogEngine(config, paths, "log_config.json") as engine:
+            engine.log({"callsign": "BG7XXX", "qth": "深圳"})
+
+    打开失败时抛出异常（Excel 被其他程序占用时为 PermissionError）。
+    """
+
+    def __init__(self, config: dict, paths: dict, config_file: str, shards=None, save_config=None):
+        settings = config.get("Settings", {})
+        self.config = config
+        self.paths = paths
+        self.shards = shards
+        self.backend = settings.get("backend", "excel")
+        # 本场签到按上次写入日志的时间判断，须在本次打开（补写 Excel 等）之前取得
+        idle = idle_minutes(paths)
+        # 自学习的新词先记入增量文件，退出时才重写配置文件
+        self.vocab = VocabStore(config, config_file, save_config)
+        # 与其他录入端（另一台电脑上的命令行/GUI 版）共用日志时的文件锁和序号分配器
+        self.locks = LogLocks(paths["excel"])
+        self.notes = []
+        self.recovered = 0  # 启动时从追加写日志补回的条数
+        snapshots = int(settings.get("snapshots", SNAPSHOT_COUNT))
+        if self.backend == "sqlite":
+            # 以 SQLite 为准：记录、计数和呼号查询都走数据库，Excel/CSV 由后台线程导出
+            store = open_sqlite_store(paths["db"], paths["excel"], LogJournal(paths["journal"]))
+            rows = store.rows()
+            journal = None
+            self.row_store = store
+            self.history = SqliteCallsignIndex(store)
+            exported = excel_export_current(paths["excel"], store.last_seq())
+            shared = False
+        else:
+            # Excel 损坏时从行缓存/快照/CSV 恢复，Excel 落后于 CSV 时从 CSV 补回
+            with PERF.span("startup_load"):
+                rows, added, self.notes = load_rows_checked(paths["excel"], paths["csv"], snapshots)
+            # 重放日志，补回上次未写入 Excel 的记录
+            journal = LogJournal(paths["journal"])
+            recovered, at_end = recover_rows(rows, journal)
+            self.recovered = len(recovered)
+            # 日志表格和 find/stats 命令从内存行存储按需读取
+            self.row_store = RowStore(row for row in rows if row[0] is not None)
+            # 呼号索引：录入呼号时自动带出该台上次的 QTH/设备/功率/天馈
+            self.history = CallsignHistory()
+            self.history.load_rows(rows)
+            exported = not (self.recovered or added) and os.path.exists(paths["excel"])
+            # 补回的记录插在中间时（其他录入端已保存了更大的序号），第一次保存需整体重写 Excel
+            shared = not at_end
+        # 启动时读到的全部数据行；之后由后台线程维护，界面只在启动时读取（建立补全统计等）
+        self.rows = rows
+        self.next_seq = last_seq(rows) + 1
+        self.count = 0  # 本次写入的记录数
+        # 已交给后台线程、还在等待分配序号的记录 {编号: 行}（见 queue_rows）
+        self.queued = {}
+        self._tokens = itertools.count(1)
+        self._backlog = []  # 退出时先行取出的后台线程消息
+        # 本场已签到的呼号，录入呼号时提示重复签到
+        self.session_calls = SessionCallsigns(settings.get("dedupe_window_minutes", 0))
+        self.session_calls.load_tail(rows, idle_minutes=idle)
+        # CSV 只在缺失、被截断或与日志数据不一致时整体重建
+        csv_sink = CsvSink(paths["csv"])
+        csv_sink.sync(rows)
+        self.writer = PersistenceWorker(
+            rows,
+            journal,
+            csv_sink,
+            paths["excel"],
+            latency_ms=settings.get("writer_latency_ms", WRITER_LATENCY_MS),
+            saved=exported,
+            snapshots=snapshots,
+            locks=self.locks,
+            shared=shared,
+        )
+        if not exported:
+            self.writer.flush()
+
+    def peek_seq(self) -> int:
+        """下一条记录将要分配的序号（其他录入端可能已经用掉了后面的序号，仅供显示）"""
+        return max(self.locks.allocator.peek(self.next_seq - 1), self.next_seq + len(self.queued))
+
+    def learn(self, key: str, value: str) -> bool:
+        """把新词汇加入 config[key]，等待下次写盘；返回是否是新词（未填写的 N/A 不算）"""
+        if not value or value == MISSING_VALUE:
+            return False
+        items = self.config.setdefault(key, [])
+        if value in items:
+            return False
+        items.append(value)
+        self.vocab.add(key, value)
+        return True
+
+    def log(self, record: dict) -> list:
+        """写入一条记录，返回分配了序号的行"""
+        return self.log_many([record])[0]
+
+    def log_many(self, records) -> list:
+        """写入一批记录（先全部校验，有不合法的则一条也不写），返回分配了序号的行"""
+        return self.submit_rows([normalize_record(record) for record in records])
+
+    def submit_rows(self, rows, flush_vocab: bool = True) -> list:
+        """写入已经过 normalize_record 的行：一次申请连续的序号，新词汇一次写盘
+        （flush_vocab 为 False 时由调用方自行防抖写盘，如 GUI 版）"""
+        if not rows:
+            return []
+        # 序号由各录入端共用的分配器加锁分配，不会与其他录入端重复
+        try:
+            first = self.locks.allocator.allocate(self.next_seq - 1, len(rows))
+        except OSError as e:
+            first = self.next_seq
+            self.writer.events.put(("error", f"⚠️ 序号分配失败（{e}），使用本机序号 No.{first}"))
+        for offset, row in enumerate(rows):
+            row[0] = first + offset
+            for key, col in VOCAB_COLUMNS.items():
+                self.learn(key, row[col])
+        if flush_vocab:
+            self.vocab.flush()
+        self.store_rows(rows)
+        return rows
+
+    def queue_rows(self, rows, flush_vocab: bool = True) -> list:
+        """写入已经过 normalize_record 的行，序号由后台线程分配，界面线程不等待序号文件的锁和写盘。
+        新词汇的写盘同 submit_rows。
+
+        行立即计入呼号历史和本场签到；返回各行的编号，分配好序号后 events() 存入行存储，
+        并以 ("allocated", [(编号, 行)]) 返回。在此之前记录在 queued 中。
+        """
+        tokens = []
+        for row in rows:
+            for key, col in VOCAB_COLUMNS.items():
+                self.learn(key, row[col])
+            row = (None,) + tuple(row[1:])
+            self.history.add(row)
+            self.session_calls.add(row)
+            token = next(self._tokens)
+            self.queued[token] = row
+            self.writer.allocate(token, row)
+            tokens.append(token)
+        if flush_vocab:
+            self.vocab.flush()
+        return tokens
+
+    def store_rows(self, rows, index: bool = True):
+        """保存已有序号的行（本端分配的或同步服务器分配的）；
+        index 为 False 时不再计入呼号历史（本台提交同步时已计入）"""
+        self._keep(rows, index)
+        for row in rows:
+            self.writer.submit(row)
+
+    def _keep(self, rows, index: bool):
+        """把行存入行存储，计入呼号历史和本场签到（落盘由后台线程负责）"""
+        if self.backend == "sqlite":
+            # 以 SQLite 为准时这里就是一次数据库事务，Excel/CSV 导出交给后台线程
+            self.row_store.append_many(rows)
+        else:
+            for row in rows:
+                self.row_store.append(row)
+        for row in rows:
+            if index:
+                self.history.add(row)
+            self.session_calls.add(row)
+        self.next_seq = max(self.next_seq, rows[-1][0] + 1)
+        self.count += len(rows)
+
+    def merge_foreign(self, rows):
+        """并入其他录入端的记录（已按序号排列）：更新行存储、呼号历史和本场签到"""
+        if self.backend != "sqlite":
+            # 以 SQLite 为准时对方的记录已经在数据库中
+            self.row_store.merge(rows)
+            for row in rows:
+                self.history.add(row)
+        for row in rows:
+            self.session_calls.add(row)
+        self.next_seq = max(self.next_seq, rows[-1][0] + 1)
+
+    def events(self) -> list:
+        """取出后台线程的消息 [(级别, 内容)]；其他录入端的记录 ("merged", 行列表) 先并入、
+        queue_rows 的记录分配好序号 ("allocated", [(编号, 行)]) 先存入行存储，再返回"""
+        messages, self._backlog = self._backlog, []
+        while True:
+            try:
+                level, message = self.writer.events.get_nowait()
+            except queue.Empty:
+                return messages
+            if level == "merged":
+                self.merge_foreign(message)
+            elif level == "allocated":
+                for token, _ in message:
+                    self.queued.pop(token, None)
+                self._keep([row for _, row in message], index=False)
+            messages.append((level, message))
+
+    def close(self, timeout: float = ENGINE_EXIT_TIMEOUT) -> bool:
+        """写完全部记录并保存 Excel，返回是否在超时前完成"""
+        finished = self.writer.close(timeout)
+        if self.queued:
+            # 退出前才分配好序号的记录也要存入行存储（以 SQLite 为准时即写入数据库），消息留给调用方取
+            self._backlog = self.events()
+        count = len(self.row_store)
+        if self.backend == "sqlite":
+            self.row_store.close()
+        self.vocab.close()
+        if self.shards is not None:
+            self.shards.update_count(count)
+        return finished
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def fifo_lines(path: str):
+    """逐行读出命名管道；写入端关闭后重新打开，等待下一个写入端（不存在时先创建）"""
+    if not os.path.exists(path):
+        os.mkfifo(path)
+    while True:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+
+
+def _pump(lines, pending: queue.Queue):
+    try:
+        for line in lines:
+            pending.put(line)
+    finally:
+        pending.put(None)
+
+
+def run_pipe(engine: LogEngine, lines, out, errors, echo: bool = True):
+    """管道模式：从 lines（标准输入或 fifo_lines）逐行读取 JSON 记录写入日志，返回 (写入条数, 出错行数)。
+
+    读取在单独的线程中进行，已到达的多行合并为一批写入（一次分配序号、一次写日志）。
+    每写入一条向 out 输出 {"line", "seq", "callsign"}，出错的行输出 {"line", "error"}；
+    空行和以 # 开头的行忽略。
+    """
+    pending = queue.Queue(maxsize=PIPE_QUEUE_SIZE)
+    threading.Thread(target=_pump, args=(lines, pending), name="PipeReader", daemon=True).start()
+    written = failed = lineno = 0
+    done = False
+    while not done:
+        try:
+            batch = [pending.get(timeout=PIPE_POLL_S)]
+        except queue.Empty:
+            batch = []
+        while batch and batch[-1] is not None and len(batch) < PIPE_BATCH:
+            try:
+                batch.append(pending.get_nowait())
+            except queue.Empty:
+                break
+        rows, numbers = [], []
+        for line in batch:
+            if line is None:
+                done = True
+                break
+            lineno += 1
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                rows.append(normalize_record(parse_line(line)))
+                numbers.append(lineno)
+            except ValueError as e:
+                failed += 1
+                out.write(json.dumps({"line": lineno, "error": str(e)}, ensure_ascii=False) + "\n")
+        engine.submit_rows(rows)
+        written += len(rows)
+        if echo:
+            for number, row in zip(numbers, rows):
+                out.write(json.dumps({"line": number, "seq": row[0], "callsign": row[2]}, ensure_ascii=False) + "\n")
+        if batch:
+            out.flush()
+        for level, message in engine.events():
+            if level != "merged":
+                print(message, file=errors)
+    return written, failed
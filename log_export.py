@@ -0,0 +1,228 @@
+import datetime
+import itertools
+import json
+import os
+import re
+
+from log_journal import LOG_FIELDS, MISSING_VALUE
+from log_lock import temp_path
+
+EXPORT_FORMATS = ("adif", "cabrillo")
+PROGRAM_ID = "VibeLogger"
+ADIF_VERSION = "3.1.4"
+ANTENNA_FIELD = f"APP_{PROGRAM_ID.upper()}_ANTENNA"
+
+_COL = {field: i for i, field in enumerate(LOG_FIELDS)}
+_HANZI = re.compile(r"([\u3400-\u9fff]+)")
+
+
+def detect_export_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return "cabrillo" if ext in (".log", ".cbr") else "adif"
+
+
+def marks_path(excel_file: str) -> str:
+    """与日志放在一起的导出进度文件：{导出文件路径: 已导出的最大序号}"""
+    return os.path.splitext(excel_file)[0] + ".export.json"
+
+
+class ExportMarks:
+    """增量导出的高水位：记录每个导出文件已经导出到的序号"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._marks = json.load(f)
+        except Exception:
+            self._marks = {}
+
+    @staticmethod
+    def _key(out_path: str) -> str:
+        return os.path.abspath(out_path)
+
+    def get(self, out_path: str) -> int:
+        return self._marks.get(self._key(out_path), 0)
+
+    def set(self, out_path: str, seq: int):
+        self._marks[self._key(out_path)] = seq
+        tmp = temp_path(self.path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._marks, f, ensure_ascii=False, indent=4)
+        os.replace(tmp, self.path)
+
+
+def journal_dates(journal, since: int = 0) -> dict:
+    """追加写日志中序号大于 since 的记录的写入时刻 {序号: datetime}，用来确定只有时分的记录是哪一天"""
+    stamps = {}
+    for record in journal.replay():
+        seq = record.get("seq")
+        if isinstance(seq, int) and seq > since:
+            try:
+                stamps[seq] = datetime.datetime.fromisoformat(record["ts"])
+            except (KeyError, TypeError, ValueError):
+                continue
+    return stamps
+
+
+def _dated(rows, qso_date: datetime.date = None, stamps: dict = None, tz: datetime.tzinfo = None):
+    """给只有时分的记录配上日期：时间比上一条早 12 小时以上视为跨过了午夜。
+
+    没有指定 qso_date 时按 stamps（journal_dates）中记录的写入时刻取日期；
+    两者都没有时无法确定日期，抛出 ValueError。
+    日志中的日期和时分都是本地时间，产出的 (日期, "HHMM") 换算为 ADIF/Cabrillo 要求的 UTC；
+    tz 为本地时区，默认取本机时区。
+    """
+    date = qso_date
+    previous = None
+    for row in rows:
+        m = re.match(r"(\d{1,2}):(\d{2})", str(row[_COL["time"]] or ""))
+        minutes = int(m.group(1)) * 60 + int(m.group(2)) if m else None
+        stamp = (stamps or {}).get(row[_COL["seq"]]) if qso_date is None else None
+        if stamp is not None:
+            date = stamp.date()
+            # 写入时刻比记录时间早 12 小时以上：前一天的记录过了午夜才保存
+            if minutes is not None and minutes > stamp.hour * 60 + stamp.minute + 12 * 60:
+                date -= datetime.timedelta(days=1)
+        elif date is not None and minutes is not None and previous is not None and minutes < previous - 12 * 60:
+            date += datetime.timedelta(days=1)
+        if minutes is not None:
+            previous = minutes
+        if date is None:
+            raise ValueError(f"无法确定 No.{row[_COL['seq']]} 的日期（日志中没有它的写入时间），请指定记录日期")
+        if m is None:
+            yield row, date, ""
+            continue
+        local = datetime.datetime.combine(date, datetime.time(int(m.group(1)) % 24, int(m.group(2)) % 60))
+        local = local.replace(tzinfo=tz) if tz is not None else local.astimezone()
+        utc = local.astimezone(datetime.timezone.utc)
+        yield row, utc.date(), utc.strftime("%H%M")
+
+
+def _value(row, field) -> str:
+    value = row[_COL[field]]
+    if value is None or value == MISSING_VALUE:
+        return ""
+    return str(value).strip()
+
+
+def _ascii(value: str) -> str:
+    """ADI 和 Cabrillo 只能写 ASCII：汉字转为拼音（深圳 -> Shenzhen），其余非 ASCII 字符去掉"""
+    if value.isascii():
+        return value
+    try:
+        from pypinyin import lazy_pinyin
+    except ImportError:
+        lazy_pinyin = None
+    words = []
+    for i, part in enumerate(_HANZI.split(value)):
+        if i % 2:
+            word = "".join(lazy_pinyin(part)).capitalize() if lazy_pinyin else ""
+        else:
+            word = part.encode("ascii", "ignore").decode().strip()
+        if word:
+            words.append(word)
+    return " ".join(words)
+
+
+def _adif_field(name: str, value: str) -> str:
+    # ADI 的字符串字段为 ASCII，长度即字节数
+    value = _ascii(value)
+    return f"<{name}:{len(value)}>{value} " if value else ""
+
+
+def iter_adif(rows, qso_date: datetime.date = None, band: str = None, mode: str = None, stamps: dict = None,
+              tz: datetime.tzinfo = None):
+    """逐条产出 ADIF 文本（含文件头），不在内存中构建整个文件；日期时间为 UTC，中文转为拼音"""
+    created = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d %H%M%S")
+    yield (
+        f"{PROGRAM_ID} ADIF export\n"
+        + _adif_field("ADIF_VER", ADIF_VERSION)
+        + _adif_field("PROGRAMID", PROGRAM_ID)
+        + _adif_field("CREATED_TIMESTAMP", created)
+        + "<EOH>\n"
+    )
+    for row, date, hhmm in _dated(rows, qso_date, stamps, tz):
+        power = re.sub(r"\s*[Ww]$", "", _value(row, "power"))
+        yield (
+            _adif_field("CALL", _value(row, "callsign").upper())
+            + _adif_field("QSO_DATE", date.strftime("%Y%m%d"))
+            + _adif_field("TIME_ON", hhmm)
+            + _adif_field("BAND", band or "")
+            + _adif_field("MODE", mode or "")
+            + _adif_field("RST_SENT", _value(row, "rst"))
+            + _adif_field("QTH", _value(row, "qth"))
+            + _adif_field("RIG", _value(row, "rig"))
+            + _adif_field("RX_PWR", power if re.fullmatch(r"\d+(\.\d+)?", power) else "")
+            # ADIF 没有对方天馈的字段，按应用自定义字段导出
+            + _adif_field(ANTENNA_FIELD, _value(row, "antenna"))
+            + _adif_field("COMMENT", _value(row, "message"))
+            + "<EOR>\n"
+        )
+
+
+def iter_cabrillo(rows, qso_date: datetime.date, mycall: str, frequency: str = "144", mode: str = "FM",
+                  stamps: dict = None, tz: datetime.tzinfo = None):
+    """逐行产出 Cabrillo 3.0 文本；交换信息为 RST + 序号（发出）和 RST + QTH（收到）"""
+    cabrillo_mode = {"SSB": "PH", "USB": "PH", "LSB": "PH", "AM": "PH", "CW": "CW"}.get((mode or "").upper(), "FM")
+    yield "START-OF-LOG: 3.0\n"
+    yield f"CREATED-BY: {PROGRAM_ID}\n"
+    yield f"CALLSIGN: {mycall.upper()}\n"
+    for row, date, hhmm in _dated(rows, qso_date, stamps, tz):
+        qth = _ascii(_value(row, "qth")).replace(" ", "_") or "-"
+        yield (
+            f"QSO: {frequency:>5} {cabrillo_mode} {date.strftime('%Y-%m-%d')} {hhmm or '0000'} "
+            f"{mycall.upper():<13} {_value(row, 'rst') or '59':<3} {row[_COL['seq']]:<6} "
+            f"{_value(row, 'callsign').upper():<13} {_value(row, 'rst') or '59':<3} {qth}\n"
+        )
+    yield "END-OF-LOG:\n"
+
+
+def export_log(store, out_path: str, fmt: str = None, marks: ExportMarks = None, incremental: bool = True,
+               qso_date: datetime.date = None, journal=None, **options):
+    """把 store 中的记录流式写入 out_path；incremental 时只导出上次导出之后新增的记录。
+
+    store 需提供 rows_after(seq) 按序号逐条产出记录。先写临时文件，完成后替换并更新高水位；
+    没有新记录时不改动 out_path（上次导出的文件可能还没上传）。返回 (导出条数, 最后序号)。
+    记录日期取 qso_date，未指定时取 journal（LogJournal）中各记录的写入时刻；
+    有记录无法确定日期时抛出 ValueError，不改动 out_path。
+    日期时间按本机时区换算为 UTC；options 中的 utc_offset（小时，如 8）可指定日志所用的时区。
+    """
+    fmt = fmt or detect_export_format(out_path)
+    since = marks.get(out_path) if (marks is not None and incremental) else 0
+    source = iter(store.rows_after(since))
+    first = next(source, None)
+    if first is None:
+        return 0, since
+    exported = [0, since]
+
+    def rows():
+        for row in itertools.chain((first,), source):
+            exported[0] += 1
+            exported[1] = row[_COL["seq"]]
+            yield row
+
+    stamps = journal_dates(journal, since) if (qso_date is None and journal is not None) else None
+    offset = options.get("utc_offset")
+    tz = None if offset in (None, "") else datetime.timezone(datetime.timedelta(hours=float(offset)))
+    if fmt == "cabrillo":
+        lines = iter_cabrillo(
+            rows(), qso_date, options.get("mycall") or "N0CALL",
+            options.get("frequency") or "144", options.get("mode") or "FM", stamps, tz,
+        )
+    else:
+        lines = iter_adif(rows(), qso_date, options.get("band"), options.get("mode"), stamps, tz)
+
+    tmp = temp_path(out_path)
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.writelines(lines)
+    except Exception:
+        # 无法确定日期等：不留下写了一半的临时文件
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, out_path)
+    if marks is not None and exported[0]:
+        marks.set(out_path, exported[1])
+    return exported[0], exported[1]
@@ -0,0 +1,332 @@
+import csv
+import datetime
+import json
+import os
+import re
+import tempfile
+import time
+
+from log_integrity import save_workbook_atomic, take_snapshot, write_workbook_rows
+from log_journal import LOG_FIELDS, LOG_HEADERS, MISSING_VALUE, LogJournal
+from log_loader import SHEET_TITLE, iter_sheet_rows, journal_rows, load_sheet_rows, sheet_last_seq, write_rows_cache
+from log_lock import LogLocks, file_signature, merge_rows
+from log_sqlite import open_sqlite_store
+from vocab_index import VOCAB_COLUMNS
+
+# 每批写入的记录数：读取、转换和写盘都按批进行，内存占用与文件大小无关
+IMPORT_CHUNK_ROWS = 5000
+ADIF_READ_SIZE = 1 << 16
+
+# 各字段可识别的列名（不区分大小写），依次尝试；包括本程序的中文表头和 ADIF 字段名
+FIELD_ALIASES = {
+    "seq": ("序号", "seq", "no", "nr"),
+    "time": ("时间", "time", "time_on", "qso_time"),
+    "callsign": ("呼号", "callsign", "call"),
+    "qth": ("qth", "所在地", "地点"),
+    "rst": ("信号报告", "rst", "rst_rcvd", "rst_sent"),
+    "rig": ("设备", "rig", "my_rig"),
+    "power": ("功率", "power", "rx_pwr", "tx_pwr", "pwr"),
+    "antenna": ("天馈", "天线", "antenna", "ant", "app_vibelogger_antenna", "my_antenna"),
+    "message": ("留言", "message", "comment", "notes", "remarks"),
+}
+# 缺失字段的默认值，与录入时一致
+FIELD_DEFAULTS = {"rst": "59", "message": "73"}
+IMPORT_FORMATS = ("csv", "xlsx", "adif")
+
+_ADIF_TAG = re.compile(r"<([A-Za-z0-9_]+)(?::(\d+)(?::[A-Za-z])?)?>")
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".adi", ".adif"):
+        return "adif"
+    if ext in (".xlsx", ".xlsm"):
+        return "xlsx"
+    return "csv"
+
+
+def read_csv(path: str):
+    """逐行读出 CSV 记录：{列名: 值}"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_xlsx(path: str):
+    """以只读流式方式逐行读出工作表记录，首行为表头"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = ["" if name is None else str(name) for name in header]
+        for row in rows:
+            if any(value is not None for value in row):
+                yield dict(zip(header, row))
+    finally:
+        wb.close()
+
+
+def read_adif(path: str):
+    """流式解析 ADIF：按块读取文件，每遇到 <EOR> 产出一条 {字段名: 值}"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        buf = ""
+        pos = 0
+        record = {}
+        eof = False
+        while True:
+            m = _ADIF_TAG.search(buf, pos)
+            length = int(m.group(2)) if m and m.group(2) else 0
+            if m is None or m.end() + length > len(buf):
+                # 标签或字段值被块边界截断，读入下一块
+                if eof:
+                    break
+                chunk = f.read(ADIF_READ_SIZE)
+                eof = not chunk
+                start = buf.rfind("<", pos) if m is None else m.start()
+                buf = buf[start:] if start >= 0 else ""
+                buf += chunk
+                pos = 0
+                continue
+            name = m.group(1).lower()
+            if name == "eoh":
+                record = {}
+            elif name == "eor":
+                if record:
+                    yield record
+                record = {}
+            else:
+                record[name] = buf[m.end():m.end() + length]
+            pos = m.end() + length
+
+
+READERS = {"csv": read_csv, "xlsx": read_xlsx, "adif": read_adif}
+
+
+def resolve_columns(columns, mapping=None) -> dict:
+    """按列名确定各字段取自哪一列：{字段: 列名}；mapping 可手工指定 {字段: 列名}"""
+    by_lower = {str(name).strip().lower(): name for name in columns if name is not None}
+    resolved = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias.lower() in by_lower:
+                resolved[field] = by_lower[alias.lower()]
+                break
+    for field, column in (mapping or {}).items():
+        resolved[field] = by_lower.get(column.strip().lower(), column)
+    return resolved
+
+
+def normalize_time(value) -> str:
+    """各种时间写法统一为录入时使用的 "HH:MM" """
+    if value is None or value == "":
+        return MISSING_VALUE
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        return value.strftime("%H:%M")
+    text = str(value).strip()
+    m = re.search(r"(\d{1,2}):(\d{2})", text)
+    if m:
+        return f"{int(m.group(1)):02d}:{m.group(2)}"
+    if text.isdigit() and len(text) in (3, 4, 6):
+        # ADIF 的 TIME_ON：HHMM 或 HHMMSS
+        text = text.zfill(4) if len(text) == 3 else text
+        return f"{text[:2]}:{text[2:4]}"
+    return text
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def record_to_import_row(record: dict, columns: dict, seq: int):
+    """把一条外部记录转换为 9 列日志行；没有呼号的记录返回 None"""
+    values = {field: _text(record.get(column)) for field, column in columns.items()}
+    callsign = values.get("callsign", "").upper()
+    if not callsign:
+        return None
+    row = []
+    for field in LOG_FIELDS:
+        if field == "seq":
+            row.append(seq)
+        elif field == "callsign":
+            row.append(callsign)
+        elif field == "time":
+            row.append(normalize_time(record.get(columns["time"])) if "time" in columns else MISSING_VALUE)
+        else:
+            value = values.get(field) or FIELD_DEFAULTS.get(field, MISSING_VALUE)
+            if field == "power" and re.fullmatch(r"\d+(\.\d+)?", value):
+                value += "W"
+            row.append(value)
+    return row
+
+
+def _interleave(sheet_rows, recovered):
+    """按序号把 recovered（已排序）中工作表还没有的记录插入流式读出的工作表记录中"""
+    pending = iter(recovered)
+    extra = next(pending, None)
+    for row in sheet_rows:
+        if row and isinstance(row[0], int):
+            while extra is not None and extra[0] <= row[0]:
+                if extra[0] < row[0]:
+                    yield extra
+                extra = next(pending, None)
+        yield row
+    while extra is not None:
+        yield extra
+        extra = next(pending, None)
+
+
+class ExcelImportTarget:
+    """导入到 Excel 后端：已有记录和导入的记录按批流式写入新的只写工作簿，
+    同时写入临时的行缓存，完成后原子地替换原文件。中途失败时原文件不变，重新导入即可。
+    内存中只保留当前一批记录，占用与日志大小无关。
+
+    序号按批向共用的分配器申请；替换 Excel 时若其他录入端在导入期间保存过，
+    才从行缓存读回全部记录，并入其中的记录后整体重写。
+    """
+
+    def __init__(self, excel_file: str, journal_file: str):
+        from openpyxl import Workbook
+
+        self.excel_file = excel_file
+        self.locks = LogLocks(excel_file)
+        self.signature = file_signature(excel_file)
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(SHEET_TITLE)
+        self.ws.append(LOG_HEADERS)
+        # 行缓存的正文（不含首行的 Excel 签名），完成后与新 Excel 一起生效
+        self.cache = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.count = 0
+        self.last = 0  # 已写入的最后一个整数序号
+        # 上次未写入 Excel 的记录（可能插在中间）按序号一并写入
+        journal = LogJournal(journal_file)
+        recovered = journal_rows(journal, sheet_last_seq(excel_file))
+        journal.close()
+        self.write(_interleave(iter_sheet_rows(excel_file), recovered))
+        self.next_seq = (self.last or self.count) + 1
+
+    def allocate(self, count: int) -> int:
+        first = self.locks.allocator.allocate(self.next_seq - 1, count)
+        self.next_seq = first + count
+        return first
+
+    def write(self, rows):
+        for row in rows:
+            self.ws.append(list(row))
+            self.cache.write(json.dumps(list(row), ensure_ascii=False, default=str) + "\n")
+            self.count += 1
+            if isinstance(row[0], int):
+                self.last = row[0]
+
+    def _cached_rows(self):
+        self.cache.seek(0)
+        for line in self.cache:
+            yield tuple(json.loads(line))
+
+    def finish(self):
+        try:
+            with self.locks.workbook:
+                take_snapshot(self.excel_file)
+                if file_signature(self.excel_file) != self.signature and os.path.exists(self.excel_file):
+                    # 导入期间其他录入端保存过 Excel：已流式写好的工作簿作废，合并后整体重写
+                    self.ws.close()
+                    rows = list(self._cached_rows())
+                    merge_rows(rows, load_sheet_rows(self.excel_file))
+                    write_workbook_rows(self.excel_file, rows)
+                    write_rows_cache(self.excel_file, rows)
+                else:
+                    save_workbook_atomic(self.wb, self.excel_file)
+                    write_rows_cache(self.excel_file, self._cached_rows())
+        finally:
+            self.cache.close()
+
+
+class SqliteImportTarget:
+    """导入到 SQLite 后端：每批一个事务；Excel/CSV 导出在程序下次启动时完成"""
+
+    def __init__(self, db_file: str, excel_file: str, journal_file: str):
+        journal = LogJournal(journal_file)
+        self.store = open_sqlite_store(db_file, excel_file, journal)
+        journal.close()
+        self.next_seq = self.store.last_seq() + 1
+        self.allocator = LogLocks(excel_file).allocator
+
+    def allocate(self, count: int) -> int:
+        first = self.allocator.allocate(max(self.next_seq - 1, self.store.last_seq()), count)
+        self.next_seq = first + count
+        return first
+
+    def write(self, rows):
+        self.store.append_many(rows)
+
+    def finish(self):
+        self.store.close()
+
+
+def _write_chunk(target, chunk):
+    first = target.allocate(len(chunk))
+    for offset, row in enumerate(chunk):
+        row[0] = first + offset
+    target.write(chunk)
+
+
+def import_logs(files, target, vocab=None, fmt=None, mapping=None, report=print) -> dict:
+    """把若干日志文件按批导入 target，并把新出现的 QTH/设备/功率/天馈一次性加入词汇表。
+
+    返回 {"imported": 条数, "skipped": 无呼号而跳过的条数, "learned": 新词数, "seconds": 耗时}
+    """
+    started = time.perf_counter()
+    imported = skipped = 0
+    known = {key: set(vocab.config.get(key, [])) for key in VOCAB_COLUMNS} if vocab else {}
+    learned = []
+    for path in files:
+        file_format = fmt or detect_format(path)
+        columns = None
+        chunk = []
+        for record in READERS[file_format](path):
+            if file_format == "adif":
+                # ADIF 每条记录的字段各不相同，逐条对应
+                columns = resolve_columns(record.keys(), mapping)
+            elif columns is None:
+                columns = resolve_columns(record.keys(), mapping)
+                if "callsign" not in columns:
+                    raise ValueError(f"{path}: 找不到呼号列，请用 --map callsign=<列名> 指定")
+            # 序号在写入每批时才分配（与同时在录入的其他录入端不重复）
+            row = record_to_import_row(record, columns, None)
+            if row is None:
+                skipped += 1
+                continue
+            chunk.append(row)
+            for key, col in VOCAB_COLUMNS.items():
+                value = row[col]
+                if key in known and value != MISSING_VALUE and value not in known[key]:
+                    known[key].add(value)
+                    learned.append((key, value))
+            if len(chunk) >= IMPORT_CHUNK_ROWS:
+                _write_chunk(target, chunk)
+                imported += len(chunk)
+                chunk = []
+                report(f"  …已导入 {imported} 条")
+        if chunk:
+            _write_chunk(target, chunk)
+            imported += len(chunk)
+        report(f"📥 {path}：完成")
+    target.finish()
+    if vocab is not None:
+        # 新词汇一次写入增量文件，并合并回配置文件
+        for key, value in learned:
+            vocab.config.setdefault(key, []).append(value)
+            vocab.add(key, value)
+        vocab.close()
+    return {
+        "imported": imported,
+        "skipped": skipped,
+        "learned": len(learned),
+        "seconds": time.perf_counter() - started,
+    }
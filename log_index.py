@@ -0,0 +1,234 @@
+import datetime
+import threading
+
+from log_journal import LOG_FIELDS, row_to_record
+
+CALLSIGN_COL = LOG_FIELDS.index("callsign")
+TIME_COL = LOG_FIELDS.index("time")
+# 相邻两条记录间隔超过这么久，视为上一场台网已经结束
+SESSION_GAP_MINUTES = 60
+# RowStore 为这些列建立 值 -> 行位置 的索引，供 find/stats 命令查询
+INDEXED_FIELDS = ("callsign", "qth", "rig")
+_INDEXED_COLS = {field: LOG_FIELDS.index(field) for field in INDEXED_FIELDS}
+
+
+def index_key(field: str, value) -> str:
+    """索引键：呼号不区分大小写，其余列去掉首尾空白后原样比较"""
+    if value is None:
+        return ""
+    value = str(value).strip()
+    return value.upper() if field == "callsign" else value
+
+
+class CallsignHistory:
+    """呼号索引：每个呼号最近一次的记录和签到次数，查询为 O(1)"""
+
+    def __init__(self):
+        self._last = {}
+        self._count = {}
+        self._archive = None  # 后台线程读完的旧分片索引 (最近记录, 次数)，等待并入
+
+    def __len__(self):
+        return len(self._last)
+
+    def set_archive(self, shard_rows):
+        """登记旧分片的记录来源：一个按从新到旧产出 (分片, 行列表) 的迭代器。
+
+        旧分片在后台线程中读取，不阻塞录入；读完之前的查询只包含当前分片，读完后在下一次查询时并入。
+        """
+        threading.Thread(target=self._load_archive, args=(shard_rows,), name="ArchiveLoader", daemon=True).start()
+
+    def _load_archive(self, shard_rows):
+        # 在后台线程中建立单独的索引，不改动界面线程正在查询的字典
+        last, count = {}, {}
+        try:
+            for _, rows in shard_rows:
+                for row in reversed(rows):
+                    if not row or row[0] is None or not row[CALLSIGN_COL]:
+                        continue
+                    callsign = str(row[CALLSIGN_COL]).strip().upper()
+                    last.setdefault(callsign, row)
+                    count[callsign] = count.get(callsign, 0) + 1
+        except Exception:
+            pass  # 与读不出的分片一样：已读到的部分照常并入
+        self._archive = (last, count)
+
+    def _merge_archive(self):
+        (last, count), self._archive = self._archive, None
+        # 旧分片比已索引的记录都早：只累计次数，最近记录以已有的为准
+        for callsign, row in last.items():
+            self._last.setdefault(callsign, row)
+        for callsign, n in count.items():
+            self._count[callsign] = self._count.get(callsign, 0) + n
+
+    def add(self, row):
+        """按一条日志记录（9 列）更新索引"""
+        callsign = row[CALLSIGN_COL]
+        if not callsign:
+            return
+        callsign = str(callsign).strip().upper()
+        self._last[callsign] = row
+        self._count[callsign] = self._count.get(callsign, 0) + 1
+
+    def load_rows(self, rows):
+        for row in rows:
+            if row and row[0] is not None:
+                self.add(row)
+
+    def lookup(self, callsign: str):
+        """返回 (最近一次记录的字段字典, 签到次数)；未记录过的呼号返回 (None, 0)"""
+        if self._archive is not None:
+            self._merge_archive()
+        callsign = callsign.strip().upper()
+        row = self._last.get(callsign)
+        if row is None:
+            return None, 0
+        return row_to_record(row), self._count[callsign]
+
+
+def _minutes(value):
+    """"HH:MM" 转换为当天的分钟数，无法解析时返回 None"""
+    try:
+        hour, minute = str(value).split(":")[:2]
+        return int(hour) * 60 + int(minute)
+    except (TypeError, ValueError):
+        return None
+
+
+def _now_minutes() -> int:
+    now = datetime.datetime.now()
+    return now.hour * 60 + now.minute
+
+
+def _elapsed(since: int, now: int) -> int:
+    """从 since 到 now 经过的分钟数（跨午夜按次日计）"""
+    return (now - since) % (24 * 60)
+
+
+class SessionCallsigns:
+    """本场台网已签到的呼号集合，判断重复签到为 O(1)。
+
+    window_minutes 为 0 时本场内任何重复都提示；大于 0 时只提示该时间内的重复。
+    日志只记录时分，因此“本场”指末尾相邻间隔不超过 SESSION_GAP_MINUTES 的一段记录；
+    日志文件最后一次写入距今已超过 SESSION_GAP_MINUTES 时（例如昨天的台网），本场为空。
+    """
+
+    def __init__(self, window_minutes: int = 0):
+        self.window = max(0, int(window_minutes or 0))
+        self._seen = {}  # 呼号 -> (序号, 时间)
+
+    def __len__(self):
+        return len(self._seen)
+
+    def load_tail(self, rows, now: int = None, idle_minutes: float = None):
+        """从已有记录的末尾向前，取出仍属于本场的记录。
+
+        idle_minutes 为日志文件最后一次写入距今的实际分钟数（按文件修改时间计）；
+        时分只能按一天之内比较，超过 SESSION_GAP_MINUTES 时不取任何记录。
+        """
+        if idle_minutes is not None and idle_minutes > SESSION_GAP_MINUTES:
+            return
+        now = _now_minutes() if now is None else now
+        newer = now
+        session = []
+        for row in reversed(rows):
+            if not row or row[0] is None:
+                continue
+            minutes = _minutes(row[TIME_COL])
+            if minutes is None or _elapsed(minutes, newer) > SESSION_GAP_MINUTES:
+                break
+            session.append(row)
+            newer = minutes
+        for row in reversed(session):
+            self.add(row)
+
+    def add(self, row):
+        callsign = row[CALLSIGN_COL]
+        if callsign:
+            self._seen[str(callsign).strip().upper()] = (row[0], row[TIME_COL])
+
+    def check(self, callsign: str, now: int = None):
+        """已在本场（去重窗口内）签到过则返回 (序号, 时间)，否则返回 None"""
+        seen = self._seen.get(callsign.strip().upper())
+        if seen is None or not self.window:
+            return seen
+        minutes = _minutes(seen[1])
+        now = _now_minutes() if now is None else now
+        if minutes is None or _elapsed(minutes, now) <= self.window:
+            return seen
+        return None
+
+
+class RowStore:
+    """内存中的日志行（不含表头），供日志表格按位置分页读取；
+    呼号/QTH/设备列另有索引，查找和统计不必扫描全部记录"""
+
+    def __init__(self, rows=()):
+        self._rows = []
+        self._index = {field: {} for field in INDEXED_FIELDS}
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def append(self, row):
+        row = tuple(row)
+        pos = len(self._rows)
+        self._rows.append(row)
+        for field, index in self._index.items():
+            key = index_key(field, row[_INDEXED_COLS[field]])
+            if key:
+                index.setdefault(key, []).append(pos)
+
+    def merge(self, rows):
+        """并入其他录入端的记录：序号都比已有的大时直接追加，否则按序号重排并重建索引"""
+        rows = sorted((tuple(row) for row in rows), key=lambda row: row[0])
+        if not rows:
+            return
+        if not self._rows or rows[0][0] > self._rows[-1][0]:
+            for row in rows:
+                self.append(row)
+            return
+        combined = sorted(self._rows + rows, key=lambda row: row[0])
+        self._rows = []
+        self._index = {field: {} for field in INDEXED_FIELDS}
+        for row in combined:
+            self.append(row)
+
+    def slice(self, start: int, stop: int) -> list:
+        """第 start 到 stop-1 行"""
+        return self._rows[max(0, start):max(0, stop)]
+
+    def tail(self, n: int) -> list:
+        """最后 n 行"""
+        return self._rows[-n:] if n > 0 else []
+
+    def rows_after(self, seq: int):
+        """逐条产出序号大于 seq 的行（行按序号递增排列，二分查找起点）"""
+        lo, hi = 0, len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._rows[mid][0] <= seq:
+                lo = mid + 1
+            else:
+                hi = mid
+        for pos in range(lo, len(self._rows)):
+            yield self._rows[pos]
+
+    def find(self, value: str, fields=INDEXED_FIELDS) -> list:
+        """在指定列中精确查找 value，按记录顺序返回匹配的行"""
+        positions = set()
+        for field in fields:
+            positions.update(self._index[field].get(index_key(field, value), ()))
+        return [self._rows[pos] for pos in sorted(positions)]
+
+    def distinct(self, field: str) -> int:
+        """该列不同取值的个数"""
+        return len(self._index[field])
+
+    def top(self, field: str, n: int) -> list:
+        """该列出现次数最多的 n 个取值：[(值, 次数)]"""
+        col = _INDEXED_COLS[field]
+        ranked = sorted(self._index[field].items(), key=lambda item: len(item[1]), reverse=True)[:n]
+        return [(self._rows[positions[-1]][col], len(positions)) for _, positions in ranked]
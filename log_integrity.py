@@ -0,0 +1,170 @@
+import csv
+import os
+import shutil
+
+from log_journal import LOG_HEADERS
+from log_loader import SHEET_TITLE, last_seq, load_sheet_rows, read_cache_rows, write_rows_cache
+from log_lock import temp_path
+
+# 默认保留的 Excel 快照份数（每次运行第一次写 Excel 前滚动一次）
+SNAPSHOT_COUNT = 3
+
+
+def snapshot_path(excel_file: str, n: int) -> str:
+    return f"{os.path.splitext(excel_file)[0]}.snapshot{n}.xlsx"
+
+
+def corrupt_path(excel_file: str) -> str:
+    return f"{os.path.splitext(excel_file)[0]}.corrupt.xlsx"
+
+
+def take_snapshot(excel_file: str, count: int = SNAPSHOT_COUNT, report=print):
+    """滚动保留最近 count 份 Excel 副本：snapshot1 为最新"""
+    if count <= 0 or not os.path.exists(excel_file):
+        return
+    try:
+        for n in range(count - 1, 0, -1):
+            if os.path.exists(snapshot_path(excel_file, n)):
+                os.replace(snapshot_path(excel_file, n), snapshot_path(excel_file, n + 1))
+        shutil.copy2(excel_file, snapshot_path(excel_file, 1))
+    except OSError as e:
+        report(f"保存 Excel 快照失败: {e}")
+
+
+def save_workbook_atomic(wb, excel_file: str):
+    """先保存到临时文件并落盘，再原子替换：保存中途被中断时原文件保持完好"""
+    tmp = temp_path(excel_file)
+    wb.save(tmp)
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, excel_file)
+
+
+def write_workbook_rows(excel_file: str, rows):
+    """用全部数据行重新生成 Excel（只写模式流式写入），原子替换原文件"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(SHEET_TITLE)
+    ws.append(LOG_HEADERS)
+    for row in rows:
+        ws.append(list(row))
+    save_workbook_atomic(wb, excel_file)
+
+
+def read_csv_rows(csv_file: str) -> list:
+    """读取 CSV 导出中的数据行，序号转换为整数"""
+    rows = []
+    with open(csv_file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            try:
+                seq = int(row[0])
+            except ValueError:
+                continue
+            rows.append(tuple([seq] + [value if value != "" else None for value in row[1:]]))
+    return rows
+
+
+def csv_last_seq(csv_file: str) -> int:
+    """只读 CSV 的最后一行，取出最后一条记录的序号（读不到时为 0）"""
+    try:
+        with open(csv_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    except OSError:
+        return 0
+    for line in reversed(lines):
+        fields = next(csv.reader([line]), [])
+        if fields and fields[0].strip().isdigit():
+            return int(fields[0])
+    return 0
+
+
+def _backup_sources(excel_file: str, csv_file: str, snapshots: int):
+    """可用于恢复的备份：(名称, 读取函数)，读取失败的跳过"""
+    yield "行缓存", lambda: read_cache_rows(excel_file, verify=False)
+    for n in range(1, snapshots + 1):
+        path = snapshot_path(excel_file, n)
+        if os.path.exists(path):
+            yield f"快照 {os.path.basename(path)}", lambda path=path: load_sheet_rows(path)
+    if csv_file and os.path.exists(csv_file):
+        yield "CSV 导出", lambda: read_csv_rows(csv_file)
+
+
+def _newest_backup(excel_file: str, csv_file: str, snapshots: int):
+    best, best_name = None, None
+    for name, read in _backup_sources(excel_file, csv_file, snapshots):
+        try:
+            rows = read()
+        except Exception:
+            continue
+        if rows is not None and (best is None or last_seq(rows) > last_seq(best)):
+            best, best_name = rows, name
+    return best or [], best_name
+
+
+def check_sequence(rows) -> list:
+    """检查序号是否递增，返回发现的问题（最多列出前几处）"""
+    problems = []
+    previous = 0
+    blanks = 0  # 空行也占用序号（序号与 Excel 行号对应）
+    for row in rows:
+        seq = row[0]
+        if seq is None:
+            blanks += 1
+            continue
+        if not isinstance(seq, int) or not previous < seq <= previous + 1 + blanks:
+            problems.append(f"No.{previous} 之后是 No.{seq}")
+            if len(problems) >= 3:
+                break
+        if isinstance(seq, int):
+            previous = seq
+        blanks = 0
+    return problems
+
+
+def load_rows_checked(excel_file: str, csv_file: str = None, snapshots: int = SNAPSHOT_COUNT):
+    """读取日志数据行并做完整性检查，返回 (rows, 补回条数, 提示列表)。
+
+    Excel 无法解析时（如保存时被强行退出），从行缓存、快照和 CSV 中记录最新的一份恢复并重写 Excel，
+    损坏的文件另存为 .corrupt.xlsx；Excel 比 CSV 旧时从 CSV 补回缺少的记录。
+    文件被其他程序占用（PermissionError）时原样抛出，不做修复。
+    """
+    notes = []
+    try:
+        rows = load_sheet_rows(excel_file)
+    except PermissionError:
+        raise
+    except Exception:
+        rows, source = _newest_backup(excel_file, csv_file, snapshots)
+        os.replace(excel_file, corrupt_path(excel_file))
+        write_workbook_rows(excel_file, rows)
+        write_rows_cache(excel_file, rows)
+        if source:
+            notes.append(f"⚠️ Excel 文件已损坏，已从{source}恢复 {len(rows)} 条记录"
+                         f"（原文件另存为 {os.path.basename(corrupt_path(excel_file))}）")
+        else:
+            notes.append(f"⚠️ Excel 文件已损坏且没有可用的备份，已新建空日志"
+                         f"（原文件另存为 {os.path.basename(corrupt_path(excel_file))}）")
+        return rows, 0, notes
+
+    added = 0
+    seq = last_seq(rows)
+    if csv_file and os.path.exists(csv_file) and csv_last_seq(csv_file) > seq:
+        try:
+            extra = [row for row in read_csv_rows(csv_file) if row[0] > seq]
+        except Exception:
+            extra = []
+        if extra:
+            rows.extend(extra)
+            added = len(extra)
+            notes.append(f"♻️ Excel 比 CSV 旧，已从 CSV 补回 {added} 条记录")
+    problems = check_sequence(rows)
+    if problems:
+        notes.append("⚠️ 序号不连续：" + "；".join(problems))
+    return rows, added, notes
@@ -0,0 +1,143 @@
+import datetime
+import json
+import os
+
+from log_lock import temp_path
+
+JOURNAL_FILE = "Ham_Radio_Log_2026.journal"
+
+# 与 Excel 表头一一对应的记录字段名
+LOG_HEADERS = ["序号", "时间", "呼号", "QTH", "信号报告", "设备", "功率", "天馈", "留言"]
+LOG_FIELDS = ["seq", "time", "callsign", "qth", "rst", "rig", "power", "antenna", "message"]
+# 未填写的字段（命令行版留空、导入时缺失）记为 N/A，不算词汇
+MISSING_VALUE = "N/A"
+
+
+def row_to_record(row) -> dict:
+    """Excel 行（9 列）转换为记录字典"""
+    return dict(zip(LOG_FIELDS, row))
+
+
+def record_to_row(record: dict) -> list:
+    """记录字典转换为 Excel 行（9 列）"""
+    return [record.get(field) for field in LOG_FIELDS]
+
+
+class LogJournal:
+    """追加写日志：每条记录一行 JSON，写入后立即 fsync。
+
+    日志是记录的第一落点，Excel/CSV 都可以由它重建，
+    因此保存一条记录只需要一次小的追加写，而不是重写整个工作簿。
+    每次 Excel 保存完成后记下检查点，启动时只重放检查点之后的记录。
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE):
+        self.path = path
+        self.checkpoint_path = os.path.splitext(path)[0] + ".checkpoint.json"
+        self._fh = None
+
+    def append(self, record: dict):
+        """追加一条记录并落盘"""
+        self.append_many([record])
+
+    def append_many(self, records):
+        """追加一批记录，只做一次 fsync"""
+        if self._fh is None:
+            self._open()
+        ts = datetime.datetime.now().isoformat(timespec="seconds")
+        for record in records:
+            if "ts" not in record:
+                record = dict(record, ts=ts)
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def _open(self):
+        # 上次若在写一半时断电，先补一个换行，避免新记录接在残缺行后面
+        torn = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self._fh = open(self.path, "a", encoding="utf-8")
+        if torn:
+            self._fh.write("\n")
+
+    def replay(self, offset: int = 0):
+        """从字节位置 offset 起按写入顺序逐条读出日志中的记录（跳过断电时写了一半的行）"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def checkpoint(self):
+        """上次的检查点 (字节位置, 当时 Excel 的最后序号)；没有检查点或日志已被截断时为 (0, 0)"""
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            offset, seq = int(data["offset"]), int(data["seq"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, 0
+        if offset > self.size():
+            return 0, 0
+        return offset, seq
+
+    def set_checkpoint(self, offset: int, seq: int):
+        """记下检查点：日志中 offset 之前的记录都已保存到 Excel，Excel 的最后序号为 seq。
+
+        在 workbook 锁内、Excel 落盘之后调用；检查点丢失或落后只会让启动时多重放一些记录。
+        """
+        tmp = temp_path(self.checkpoint_path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"offset": offset, "seq": seq}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_from(self, offset: int):
+        """读出从字节位置 offset 开始的完整记录行，返回 (记录列表, 新的位置)。
+
+        多个录入端共用一份日志时，用来取得其他录入端新追加的记录；末尾写了一半的行留到下次再读。
+        """
+        records = []
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return records, offset
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records, offset + end
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def last_seq_in_sheet(ws) -> int:
+    """工作表中最后一条记录的序号（无记录时为 0）"""
+    if ws.max_row < 2:
+        return 0
+    value = ws.cell(row=ws.max_row, column=1).value
+    if isinstance(value, int):
+        return value
+    return ws.max_row - 1
+
@@ -0,0 +1,185 @@
+import json
+import os
+
+from log_journal import LOG_HEADERS, last_seq_in_sheet, record_to_row
+from log_lock import merge_rows, temp_path
+
+SHEET_TITLE = "点名日志"
+# sheet_last_seq 只读行缓存末尾的字节数、工作表末尾的行数
+TAIL_BYTES = 64 * 1024
+TAIL_ROWS = 20
+
+
+def cache_path(excel_file: str) -> str:
+    """与 Excel 文件放在一起的行缓存：首行为 Excel 的大小和修改时间，其后每行一条记录"""
+    return os.path.splitext(excel_file)[0] + ".rows.jsonl"
+
+
+def _signature(excel_file: str):
+    st = os.stat(excel_file)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def rows_cache_current(excel_file: str) -> bool:
+    """行缓存是否与当前 Excel 文件一致（只读首行）"""
+    try:
+        with open(cache_path(excel_file), "r", encoding="utf-8") as f:
+            return json.loads(f.readline()) == _signature(excel_file)
+    except Exception:
+        return False
+
+
+def read_cache_rows(excel_file: str, verify: bool = True):
+    """读取行缓存；verify 为 False 时不核对 Excel（用于 Excel 损坏后从缓存恢复）"""
+    if verify and not rows_cache_current(excel_file):
+        return None
+    try:
+        with open(cache_path(excel_file), "r", encoding="utf-8") as f:
+            f.readline()
+            return [tuple(json.loads(line)) for line in f]
+    except Exception:
+        return None
+
+
+def write_rows_cache(excel_file: str, rows, report=print):
+    """Excel 保存后写入行缓存，下次启动若 Excel 未被改动则直接读取缓存"""
+    path = cache_path(excel_file)
+    tmp = temp_path(path)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(_signature(excel_file)) + "\n")
+            for row in rows:
+                f.write(json.dumps(list(row), ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp, path)
+    except Exception as e:
+        report(f"写入行缓存失败: {e}")
+
+
+def load_sheet_rows(excel_file: str) -> list:
+    """读取日志中的全部数据行（不含表头，保留空行以与 Excel 行号对应）。
+
+    优先使用行缓存；否则以只读流式方式解析 Excel，不构建完整的单元格对象模型。
+    文件不存在时返回空列表；文件损坏或被占用时抛出异常。
+    """
+    if not os.path.exists(excel_file):
+        return []
+    rows = read_cache_rows(excel_file)
+    if rows is not None:
+        return rows
+    return list(_iter_workbook_rows(excel_file))
+
+
+def iter_sheet_rows(excel_file: str):
+    """与 load_sheet_rows 相同，但逐行产出，不在内存中保留全部记录（用于导入大批记录）"""
+    if not os.path.exists(excel_file):
+        return
+    if rows_cache_current(excel_file):
+        with open(cache_path(excel_file), "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                yield tuple(json.loads(line))
+        return
+    yield from _iter_workbook_rows(excel_file)
+
+
+def _iter_workbook_rows(excel_file: str):
+    # openpyxl 导入较慢，行缓存可用时不必加载
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_file, read_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            yield tuple(row)
+    finally:
+        wb.close()
+
+
+def last_seq(rows) -> int:
+    """最后一条记录的序号（无记录时为 0）"""
+    for row in reversed(rows):
+        if row and isinstance(row[0], int):
+            return row[0]
+    return len(rows)
+
+
+def recover_rows(rows: list, journal):
+    """把日志中 rows 还没有的记录按序号并入 rows，返回 (补回的行, 是否都追加在末尾)"""
+    return merge_rows(rows, journal_rows(journal, last_seq(rows)))
+
+
+def journal_rows(journal, seq: int) -> list:
+    """检查点之后日志中的全部记录，按序号排列；由调用方按序号并入 Excel 中没有的。
+
+    多个录入端共用日志时序号到达日志的顺序不一定递增（如 A 分配了 5，B 分配并保存了 6，
+    A 在保存前中断），因此不能只取比 Excel 最后序号大的记录。
+    检查点之前的记录都已在 Excel 中；Excel 的最后序号 seq 比检查点旧（如从快照恢复）时从头重放。
+    """
+    offset, saved_seq = journal.checkpoint()
+    rows = {}
+    for record in journal.replay(offset if seq >= saved_seq else 0):
+        record_seq = record.get("seq")
+        if isinstance(record_seq, int):
+            rows[record_seq] = tuple(record_to_row(record))
+    return [rows[record_seq] for record_seq in sorted(rows)]
+
+
+def sheet_last_seq(excel_file: str) -> int:
+    """Excel 中最后一条记录的序号，不读出全部记录：行缓存可用时只读缓存末尾，否则只取工作表的最后几行"""
+    if not os.path.exists(excel_file):
+        return 0
+    if rows_cache_current(excel_file):
+        with open(cache_path(excel_file), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - TAIL_BYTES))
+            lines = f.read().splitlines()[1:]
+        for line in reversed(lines):
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row and isinstance(row[0], int):
+                return row[0]
+    else:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(excel_file, read_only=True)
+        try:
+            ws = wb.active
+            if ws.max_row:
+                tail = [tuple(row) for row in ws.iter_rows(min_row=max(2, ws.max_row - TAIL_ROWS), values_only=True)]
+                for row in reversed(tail):
+                    if row and isinstance(row[0], int):
+                        return row[0]
+        finally:
+            wb.close()
+    # 末尾没有带序号的行（或工作表未记录尺寸）：读出全部记录
+    return last_seq(load_sheet_rows(excel_file))
+
+
+def open_writable_workbook(excel_file: str):
+    """打开（或新建）可写的工作簿，只在真正需要写 Excel 时调用"""
+    from openpyxl import Workbook, load_workbook
+
+    if os.path.exists(excel_file):
+        wb = load_workbook(excel_file)
+        ws = wb.active
+    else:
+        wb = Workbook()
+        ws = wb.active
+        ws.title = SHEET_TITLE
+        ws.append(LOG_HEADERS)
+    return wb, ws
+
+
+def append_missing_rows(ws, rows) -> int:
+    """把 rows 中序号比工作表最后一条更大的行追加进去，返回追加条数"""
+    done = last_seq_in_sheet(ws)
+    missing = []
+    for row in reversed(rows):
+        if isinstance(row[0], int) and row[0] <= done:
+            break
+        if row[0] is not None:
+            missing.append(row)
+    for row in reversed(missing):
+        ws.append(list(row))
+    return len(missing)
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 等待其他录入端释放锁的最长时间（秒）及轮询间隔
+LOCK_TIMEOUT = 30.0
+LOCK_POLL = 0.05
+
+
+def temp_path(path: str) -> str:
+    """原子替换用的临时文件名：带上进程号和线程号，多个录入端同时写同一文件时互不覆盖"""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class FileLock:
+    """跨进程互斥锁：对锁文件加操作系统级的排他锁，进程退出（包括崩溃）时自动释放。
+
+    同一进程内的多个线程先经过线程锁，再竞争文件锁；不可重入。
+    """
+
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.Lock()
+        self._fh = None
+
+    def acquire(self):
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"等待 {os.path.basename(self.path)} 超时")
+        try:
+            fh = open(self.path, "a+b")
+        except OSError:
+            self._thread_lock.release()
+            raise
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    fh.close()
+                    self._thread_lock.release()
+                    raise TimeoutError(f"{os.path.basename(self.path)} 被其他录入端长时间占用")
+                time.sleep(LOCK_POLL)
+        self._fh = fh
+
+    def release(self):
+        fh, self._fh = self._fh, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            fh.close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SeqAllocator:
+    """多个录入端共用的序号分配器：序号文件中记录已分配的最大序号，加锁后读出、加一、写回。
+
+    floor 为调用方已知的最大序号（序号文件丢失或落后时以它为准），保证分配的序号单调递增。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+
+    def _read(self) -> int:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def peek(self, floor: int = 0) -> int:
+        """下一个将要分配的序号（不加锁，仅供显示）"""
+        return max(self._read(), floor) + 1
+
+    def allocate(self, floor: int = 0, count: int = 1) -> int:
+        """分配 count 个连续的序号，返回第一个"""
+        with self.lock:
+            first = max(self._read(), floor) + 1
+            tmp = temp_path(self.path)
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(str(first + count - 1))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        return first
+
+
+class LogLocks:
+    """同一份日志的协调文件，与 Excel 放在一起：
+
+    - journal：追加写日志和 CSV 的锁（每批记录持有很短时间）
+    - workbook：保存 Excel 的锁（保存期间其他录入端的记录仍可写入日志）
+    - allocator：序号分配器
+    """
+
+    def __init__(self, excel_file: str):
+        base = os.path.splitext(excel_file)[0]
+        self.journal = FileLock(base + ".journal.lock")
+        self.workbook = FileLock(base + ".xlsx.lock")
+        self.allocator = SeqAllocator(base + ".seq")
+
+
+def file_signature(path: str):
+    """文件的 (大小, 修改时间)，不存在时为 None；用于判断文件是否被其他录入端改写"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def merge_rows(rows: list, extra, seqs: set = None):
+    """把 extra 中 rows 还没有的记录按序号并入 rows（原地修改），rows 保持按序号排列。
+
+    seqs 为 rows 中已有序号的集合（调用方可长期维护以免每次重建），会同步更新。
+    返回 (新并入的行, 是否全部追加在末尾)；插入到中间时 rows 中的空行会被去掉。
+    """
+    if seqs is None:
+        seqs = {row[0] for row in rows if row and row[0] is not None}
+    new = {}
+    for row in extra:
+        if row and isinstance(row[0], int) and row[0] not in seqs:
+            new[row[0]] = tuple(row)
+    if not new:
+        return [], True
+    new_rows = [new[seq] for seq in sorted(new)]
+    seqs.update(new)
+    last = next((row[0] for row in reversed(rows) if row and isinstance(row[0], int)), 0)
+    if new_rows[0][0] > last:
+        rows.extend(new_rows)
+        return new_rows, True
+    kept = [row for row in rows if row and isinstance(row[0], int)]
+    rows[:] = sorted(kept + new_rows, key=lambda row: row[0])
+    return new_rows, False
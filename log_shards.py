@@ -0,0 +1,136 @@
+import datetime
+import json
+import os
+import time
+
+from log_loader import load_sheet_rows
+from log_lock import temp_path
+
+# 分片方式：none 为单文件（默认，与旧版一致），day/month 按日期，session 按每次台网
+SHARD_MODES = ("none", "day", "month", "session")
+DEFAULT_LOG_DIR = "logs"
+SHARD_PREFIX = "Ham_Radio_Log"
+MANIFEST_FILE = "manifest.json"
+# session 模式下，距上一场最后一次写入不超过这么久则视为同一场（程序重启后接着记）
+SESSION_RESUME_MINUTES = 60
+
+
+def idle_minutes(paths: dict, now: float = None):
+    """日志文件（追加写日志、Excel、数据库）最后一次写入距今的分钟数；都不存在时返回 None"""
+    mtimes = []
+    for path in (paths["journal"], paths["excel"], paths["db"], paths["db"] + "-wal"):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            pass
+    if not mtimes:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, (now - max(mtimes)) / 60)
+
+
+class LogShards:
+    """按台网场次或日期/月份分片存储日志。
+
+    每个分片是一组独立的 .xlsx/.csv/.journal（或 .db）文件，只有当前分片会被写入，
+    因此每次保存的开销只与本场记录数有关。manifest.json 记录所有分片，
+    跨分片查询（如呼号历史）按需逐个读取旧分片。
+    """
+
+    def __init__(self, mode: str, log_dir: str = DEFAULT_LOG_DIR, prefix: str = SHARD_PREFIX):
+        if mode not in SHARD_MODES or mode == "none":
+            raise ValueError(f"不支持的分片方式: {mode}")
+        self.mode = mode
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.manifest_path = os.path.join(log_dir, MANIFEST_FILE)
+        self.active = None
+        self.shards = self._load_manifest()
+
+    @classmethod
+    def from_settings(cls, settings: dict):
+        """按配置 "Settings" 段创建；未启用分片时返回 None"""
+        mode = settings.get("shard", "none")
+        if mode == "none":
+            return None
+        return cls(mode, settings.get("log_dir", DEFAULT_LOG_DIR))
+
+    def _load_manifest(self) -> list:
+        if not os.path.exists(self.manifest_path):
+            return []
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("shards", [])
+        except Exception:
+            return []
+
+    def _save_manifest(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        tmp = temp_path(self.manifest_path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "shards": self.shards}, f, ensure_ascii=False, indent=4)
+        os.replace(tmp, self.manifest_path)
+
+    def _shard_name(self, now: datetime.datetime) -> str:
+        if self.mode == "day":
+            return now.strftime("%Y-%m-%d")
+        if self.mode == "month":
+            return now.strftime("%Y-%m")
+        # session：上一场刚结束不久则继续使用（按分片中任一文件最后一次写入的时间，以 SQLite 为准时没有 .journal）
+        if self.shards:
+            last = self.shards[-1]
+            idle = idle_minutes(self.paths(last["name"]), now.timestamp())
+            if idle is not None and idle <= SESSION_RESUME_MINUTES:
+                return last["name"]
+        return now.strftime("%Y-%m-%d_%H%M")
+
+    def _path(self, name: str, ext: str) -> str:
+        return os.path.join(self.log_dir, f"{self.prefix}_{name}{ext}")
+
+    def paths(self, name: str) -> dict:
+        return {
+            "name": name,
+            "excel": self._path(name, ".xlsx"),
+            "csv": self._path(name, ".csv"),
+            "journal": self._path(name, ".journal"),
+            "db": self._path(name, ".db"),
+        }
+
+    def open_active(self, now: datetime.datetime = None) -> dict:
+        """确定当前分片（不存在则登记到 manifest），返回其文件路径"""
+        name = self._shard_name(now or datetime.datetime.now())
+        if not any(s["name"] == name for s in self.shards):
+            self.shards.append({"name": name, "created": (now or datetime.datetime.now()).isoformat(timespec="seconds"), "count": 0})
+            self._save_manifest()
+        self.active = name
+        return self.paths(name)
+
+    def active_date(self):
+        """按日/按场分片时当前分片对应的日期（导出 ADIF 等需要日期时使用），否则为 None"""
+        try:
+            return datetime.datetime.strptime(self.active[:10], "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return None
+
+    def older(self) -> list:
+        """除当前分片外的所有分片，新的在前"""
+        return [s for s in reversed(self.shards) if s["name"] != self.active]
+
+    def iter_rows(self, shards=None):
+        """逐个分片惰性读取记录（默认从新到旧，不含当前分片）"""
+        for shard in self.older() if shards is None else shards:
+            try:
+                rows = load_sheet_rows(self.paths(shard["name"])["excel"])
+            except Exception:
+                continue
+            yield shard, rows
+
+    def update_count(self, count: int):
+        """退出时记录当前分片的记录数"""
+        for shard in self.shards:
+            if shard["name"] == self.active:
+                shard["count"] = count
+        try:
+            self._save_manifest()
+        except Exception as e:
+            print("保存分片清单失败:", e)
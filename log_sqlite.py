@@ -0,0 +1,201 @@
+import os
+import sqlite3
+
+from log_index import CALLSIGN_COL, INDEXED_FIELDS, CallsignHistory, index_key
+from log_journal import LOG_FIELDS, row_to_record
+from log_loader import load_sheet_rows, recover_rows, rows_cache_current, sheet_last_seq
+
+DB_FILE = "Ham_Radio_Log_2026.db"
+
+# 可选的存储后端：excel 以 Excel + 追加写日志为准（默认），sqlite 以数据库为准
+BACKENDS = ("excel", "sqlite")
+
+_COLUMNS = ", ".join(LOG_FIELDS)
+_PLACEHOLDERS = ", ".join("?" for _ in LOG_FIELDS)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS qso (
+    seq INTEGER PRIMARY KEY,
+    time TEXT,
+    callsign TEXT,
+    qth TEXT,
+    rst TEXT,
+    rig TEXT,
+    power TEXT,
+    antenna TEXT,
+    message TEXT,
+    callsign_key TEXT
+);
+CREATE INDEX IF NOT EXISTS qso_callsign ON qso (callsign_key, seq);
+CREATE INDEX IF NOT EXISTS qso_time ON qso (time);
+CREATE INDEX IF NOT EXISTS qso_qth ON qso (qth);
+CREATE INDEX IF NOT EXISTS qso_rig ON qso (rig);
+"""
+
+
+def _callsign_key(callsign) -> str:
+    return str(callsign).strip().upper() if callsign else ""
+
+
+class SqliteLogStore:
+    """以本地 SQLite 数据库（WAL 模式）为准的日志存储，Excel/CSV 只作为导出。
+
+    与 RowStore 接口一致（按位置分页读取），计数、最近记录和呼号查询都走索引，
+    每保存一条记录只是一个小事务。连接只在创建它的线程中使用。
+    其他录入端也可以写同一个数据库：记录条数按 PRAGMA data_version 判断是否需要重新统计。
+    """
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 已保证断电后数据库一致，且每次提交不必 fsync
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._version = None
+        self._count = 0
+
+    def _data_version(self) -> int:
+        # 其他连接（其他录入端）提交后改变，本连接自己的提交不改变
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def __len__(self):
+        version = self._data_version()
+        if version != self._version:
+            self._count = self.conn.execute("SELECT COUNT(*) FROM qso").fetchone()[0]
+            self._version = version
+        return self._count
+
+    def append(self, row):
+        """写入一条记录（一个事务）"""
+        self.append_many([row])
+
+    def append_many(self, rows):
+        """在一个事务中写入一批记录，空行忽略"""
+        values = [
+            tuple(row) + (_callsign_key(row[CALLSIGN_COL]),)
+            for row in rows
+            if row and row[0] is not None
+        ]
+        if not values:
+            return
+        before = self.conn.total_changes
+        with self.conn:
+            # 序号已存在的记录（如重复导入）保持不变
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO qso ({_COLUMNS}, callsign_key) VALUES ({_PLACEHOLDERS}, ?)",
+                values,
+            )
+        self._count += self.conn.total_changes - before
+
+    def slice(self, start: int, stop: int) -> list:
+        """按序号排列的第 start 到 stop-1 条记录"""
+        start = max(0, start)
+        limit = max(0, stop - start)
+        cur = self.conn.execute(f"SELECT {_COLUMNS} FROM qso ORDER BY seq LIMIT ? OFFSET ?", (limit, start))
+        return [tuple(row) for row in cur]
+
+    def tail(self, n: int) -> list:
+        """最后 n 条记录"""
+        if n <= 0:
+            return []
+        cur = self.conn.execute(f"SELECT {_COLUMNS} FROM qso ORDER BY seq DESC LIMIT ?", (n,))
+        return [tuple(row) for row in reversed(cur.fetchall())]
+
+    def rows(self) -> list:
+        """全部记录（导出 Excel/CSV 时使用）"""
+        return [tuple(row) for row in self.conn.execute(f"SELECT {_COLUMNS} FROM qso ORDER BY seq")]
+
+    def rows_after(self, seq: int):
+        """逐条产出序号大于 seq 的记录（游标流式读取，不一次取出全部）"""
+        cur = self.conn.execute(f"SELECT {_COLUMNS} FROM qso WHERE seq > ? ORDER BY seq", (seq,))
+        for row in cur:
+            yield tuple(row)
+
+    def last_seq(self) -> int:
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM qso").fetchone()[0]
+
+    def lookup(self, callsign: str):
+        """返回 (该呼号最近一次记录的字段字典, 签到次数)，未记录过返回 (None, 0)"""
+        key = _callsign_key(callsign)
+        row = self.conn.execute(
+            f"SELECT {_COLUMNS} FROM qso WHERE callsign_key = ? ORDER BY seq DESC LIMIT 1", (key,)
+        ).fetchone()
+        if row is None:
+            return None, 0
+        count = self.conn.execute("SELECT COUNT(*) FROM qso WHERE callsign_key = ?", (key,)).fetchone()[0]
+        return row_to_record(row), count
+
+    def find(self, value: str, fields=INDEXED_FIELDS) -> list:
+        """在指定列中精确查找 value，按序号返回匹配的记录（与 RowStore.find 一致）"""
+        columns = {"callsign": "callsign_key"}
+        where = " OR ".join(f"{columns.get(field, field)} = ?" for field in fields)
+        params = [index_key(field, value) for field in fields]
+        cur = self.conn.execute(f"SELECT {_COLUMNS} FROM qso WHERE {where} ORDER BY seq", params)
+        return [tuple(row) for row in cur]
+
+    def distinct(self, field: str) -> int:
+        column = "callsign_key" if field == "callsign" else field
+        return self.conn.execute(
+            f"SELECT COUNT(DISTINCT {column}) FROM qso WHERE {column} IS NOT NULL AND {column} != ''"
+        ).fetchone()[0]
+
+    def top(self, field: str, n: int) -> list:
+        """该列出现次数最多的 n 个取值：[(值, 次数)]"""
+        column = "callsign_key" if field == "callsign" else field
+        cur = self.conn.execute(
+            f"SELECT MAX({column}), COUNT(*) AS n FROM qso WHERE {column} IS NOT NULL AND {column} != '' "
+            f"GROUP BY {column} ORDER BY n DESC LIMIT ?",
+            (n,),
+        )
+        return [tuple(row) for row in cur]
+
+    def close(self):
+        self.conn.close()
+
+
+class SqliteCallsignIndex:
+    """CallsignHistory 的 SQLite 版本：查询直接走数据库索引。
+
+    记录由 SqliteLogStore.append 写入，add 无需再做任何事；
+    启用分片时，旧分片仍按 CallsignHistory 的方式在后台线程中读取。
+    """
+
+    def __init__(self, store: SqliteLogStore):
+        self.store = store
+        self._archive = None
+
+    def add(self, row):
+        pass
+
+    def load_rows(self, rows):
+        pass
+
+    def set_archive(self, shard_rows):
+        self._archive = CallsignHistory()
+        self._archive.set_archive(shard_rows)
+
+    def lookup(self, callsign: str):
+        record, count = self.store.lookup(callsign)
+        if self._archive is None:
+            return record, count
+        old_record, old_count = self._archive.lookup(callsign)
+        return record or old_record, count + old_count
+
+
+def open_sqlite_store(path: str, excel_file: str, journal) -> SqliteLogStore:
+    """打开数据库；新建（为空）时从已有的 Excel 和追加写日志导入全部记录"""
+    store = SqliteLogStore(path)
+    if not len(store):
+        rows = load_sheet_rows(excel_file)
+        recover_rows(rows, journal)
+        store.append_many(rows)
+    return store
+
+
+def excel_export_current(excel_file: str, seq: int) -> bool:
+    """Excel 导出是否已包含到序号 seq 为止的记录（只在行缓存有效时判断，否则视为过期）；
+    只读行缓存的末尾，不读出全部记录"""
+    if not os.path.exists(excel_file) or not rows_cache_current(excel_file):
+        return False
+    return sheet_last_seq(excel_file) == seq
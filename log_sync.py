@@ -0,0 +1,363 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+import uuid
+
+from log_journal import LOG_FIELDS, record_to_row
+
+DEFAULT_SYNC_PORT = 7373
+SYNC_DATA_FILE = "sync_server.jsonl"
+# 客户端合并发送的等待时间：这段时间内提交的记录和新词汇放在一条消息里发出
+SYNC_BATCH_MS = 100
+# 服务器补发历史记录时每条消息最多包含的记录数
+SYNC_CHUNK = 500
+# 断线后重连的等待时间（秒），逐次加倍到上限
+RECONNECT_MIN_S = 1.0
+RECONNECT_MAX_S = 30.0
+# 单条消息的最大长度（补发历史记录时一条消息可能较长）
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+def parse_address(address: str, default_port: int = DEFAULT_SYNC_PORT):
+    """"host:port" 或 "host" 转换为 (host, port)"""
+    host, _, port = str(address).strip().rpartition(":")
+    if not host:
+        return port or "127.0.0.1", default_port
+    return host, int(port)
+
+
+async def _send(writer, message: dict):
+    writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+class SyncServer:
+    """局域网同步服务器：多个录入台的记录汇总到这里，由服务器统一分配序号。
+
+    协议为每行一条 JSON 消息的 TCP 连接：
+    - 客户端 hello {station, since, floor}：服务器回复 welcome，并补发序号大于 since 的全部记录和词汇表
+    - 客户端 push {records, vocab}：每条带 uid，服务器按 uid 去重（断线重发不会重复记录），
+      新记录依次分配序号、落盘后以 records 消息广播给所有客户端（包括发送者），再回复 ack
+    全部记录和词汇追加写入 data_path，服务器重启后从中恢复。
+    """
+
+    def __init__(self, data_path: str = SYNC_DATA_FILE):
+        self.data_path = data_path
+        self.records = []
+        self.uids = {}  # uid -> 序号
+        self.vocab = {}  # 键 -> 词汇列表
+        self.last_seq = 0
+        self._clients = {}  # writer -> 发送队列
+        self._load()
+        self._fh = open(data_path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.data_path):
+            return
+        with open(self.data_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "record" in entry:
+                    record = entry["record"]
+                    self.records.append(record)
+                    self.uids[record.get("uid")] = record["seq"]
+                    self.last_seq = max(self.last_seq, record["seq"])
+                elif "vocab" in entry:
+                    key, value = entry["vocab"]
+                    self.vocab.setdefault(key, []).append(value)
+                elif "floor" in entry:
+                    self.last_seq = max(self.last_seq, entry["floor"])
+
+    def _persist(self, entries):
+        if not entries:
+            return
+        for entry in entries:
+            self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def accept(self, records, vocab=()):
+        """并入一批记录和新词汇，返回 (新记录, 新词汇)；已见过的 uid 和词汇跳过"""
+        new_records, new_vocab = [], []
+        for record in records:
+            uid = record.get("uid")
+            if uid in self.uids:
+                continue
+            self.last_seq += 1
+            record = dict(record, seq=self.last_seq)
+            self.uids[uid] = self.last_seq
+            self.records.append(record)
+            new_records.append(record)
+        for key, value in vocab:
+            if value and value not in self.vocab.get(key, []):
+                self.vocab.setdefault(key, []).append(value)
+                new_vocab.append([key, value])
+        self._persist([{"record": r} for r in new_records] + [{"vocab": v} for v in new_vocab])
+        return new_records, new_vocab
+
+    def raise_floor(self, floor: int):
+        """新序号不小于加入的录入台本地日志中已有的序号"""
+        if isinstance(floor, int) and floor > self.last_seq:
+            self.last_seq = floor
+            self._persist([{"floor": floor}])
+
+    def records_after(self, seq: int) -> list:
+        # 记录按序号递增排列
+        lo, hi = 0, len(self.records)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.records[mid]["seq"] <= seq:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.records[lo:]
+
+    def broadcast(self, message: dict):
+        for outbox in self._clients.values():
+            outbox.put_nowait(message)
+
+    async def handle(self, reader, writer):
+        outbox = asyncio.Queue()
+        sender = asyncio.ensure_future(self._sender(writer, outbox))
+        station = "?"
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                kind = message.get("type")
+                if kind == "hello":
+                    station = message.get("station") or station
+                    self.raise_floor(message.get("floor", 0))
+                    outbox.put_nowait({"type": "welcome", "last_seq": self.last_seq, "stations": len(self._clients) + 1})
+                    backlog = self.records_after(message.get("since", 0))
+                    for start in range(0, len(backlog), SYNC_CHUNK):
+                        outbox.put_nowait({"type": "records", "records": backlog[start:start + SYNC_CHUNK]})
+                    outbox.put_nowait({"type": "vocab", "vocab": [[k, v] for k, values in self.vocab.items() for v in values]})
+                    # 补发完成后才开始接收广播，保证客户端收到的记录按序号递增
+                    self._clients[writer] = outbox
+                    print(f"📡 {station} 已连接（共 {len(self._clients)} 台）")
+                elif kind == "push":
+                    records, vocab = self.accept(message.get("records", []), message.get("vocab", []))
+                    if records:
+                        self.broadcast({"type": "records", "records": records})
+                    if vocab:
+                        self.broadcast({"type": "vocab", "vocab": vocab})
+                    outbox.put_nowait({"type": "ack", "uids": message.get("uids", [])})
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            if self._clients.pop(writer, None) is not None:
+                print(f"📴 {station} 已断开（剩 {len(self._clients)} 台）")
+            sender.cancel()
+            writer.close()
+
+    async def _sender(self, writer, outbox):
+        # 每个客户端一个发送队列，慢的客户端不会拖住其他客户端
+        try:
+            while True:
+                await _send(writer, await outbox.get())
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def serve(self, host: str = "0.0.0.0", port: int = DEFAULT_SYNC_PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._fh.close()
+
+
+class SyncOutbox:
+    """客户端的离线发件箱：尚未被服务器确认的记录和新词汇，每次加入都落盘，重连后重发"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.items = {}  # uid -> 条目（{"record": ...} 或 {"vocab": [键, 值]}）
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    if item.get("done"):
+                        self.items.pop(item["done"], None)
+                    else:
+                        self.items[item["uid"]] = item
+
+    def __len__(self):
+        return len(self.items)
+
+    def _append(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add(self, item: dict):
+        self.items[item["uid"]] = item
+        self._append([item])
+
+    def remove(self, uids):
+        done = [uid for uid in uids if self.items.pop(uid, None) is not None]
+        if not self.items:
+            # 全部确认后清空文件，避免越来越大
+            open(self.path, "w").close()
+        elif done:
+            self._append([{"done": uid} for uid in done])
+
+
+class SyncClient:
+    """GUI 使用的同步客户端：asyncio 事件循环运行在后台线程中。
+
+    submit/learn 可在任意线程调用：条目先写入离线发件箱，再在 SYNC_BATCH_MS 内合并发送；
+    断线期间条目留在发件箱中，重连后按顺序重发。服务器广播的记录（序号由服务器分配，
+    包括本台提交的）和词汇放入 events 队列：("records", [(uid, 行)])、("vocab", [(键, 值)])、
+    ("acked", uid 列表)、("status", 文字)。
+    since() 返回本地已保存的最大序号，重连时服务器从其后补发。
+    unconfirmed 为启动时发件箱中尚未被确认的记录 [(uid, 记录)]（上次离线时提交的）。
+    """
+
+    def __init__(self, address: str, station: str, outbox_path: str, since, floor: int = 0):
+        self.host, self.port = parse_address(address)
+        self.station = station
+        self.outbox = SyncOutbox(outbox_path)
+        self.unconfirmed = [(uid, item["record"]) for uid, item in self.outbox.items.items() if "record" in item]
+        self.since = since
+        self.floor = floor
+        self.online = False
+        self.events = queue.Queue()
+        self._loop = asyncio.new_event_loop()
+        self._wake = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="SyncClient", daemon=True)
+        self._thread.start()
+
+    # ===== 供界面线程调用 =====
+
+    def submit(self, record: dict) -> str:
+        """提交一条本台记录（不含序号），返回其 uid"""
+        uid = uuid.uuid4().hex
+        fields = {field: record.get(field) for field in LOG_FIELDS if field != "seq"}
+        self._loop.call_soon_threadsafe(self._enqueue, {"uid": uid, "record": dict(fields, uid=uid, station=self.station)})
+        return uid
+
+    def learn(self, key: str, value: str):
+        """把本台学到的新词汇同步给其他录入台"""
+        self._loop.call_soon_threadsafe(self._enqueue, {"uid": uuid.uuid4().hex, "vocab": [key, value]})
+
+    def close(self, timeout: float = 2.0):
+        self._stopping = True
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        self._thread.join(timeout)
+
+    # ===== 后台线程 =====
+
+    async def _shutdown(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
+
+    def _enqueue(self, item):
+        self.outbox.add(item)
+        self._wake.set()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._wake = asyncio.Event()
+        self._loop.create_task(self._connect_forever())
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _connect_forever(self):
+        delay = RECONNECT_MIN_S
+        while not self._stopping:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_S)
+                continue
+            delay = RECONNECT_MIN_S
+            await _send(writer, {"type": "hello", "station": self.station, "since": self.since(), "floor": self.floor})
+            sender = asyncio.ensure_future(self._sender(writer))
+            try:
+                await self._receive(reader)
+            except (ConnectionError, ValueError):
+                pass
+            finally:
+                sender.cancel()
+                writer.close()
+                if self.online:
+                    self.online = False
+                    self.events.put(("status", f"📴 与同步服务器断开，{len(self.outbox)} 条待发送，稍后自动重连"))
+
+    async def _sender(self, writer):
+        # 连接建立后先重发发件箱中的全部条目，之后每批合并发送新条目
+        sent = set()
+        try:
+            while True:
+                self._wake.clear()
+                pending = [item for uid, item in self.outbox.items.items() if uid not in sent]
+                if pending:
+                    sent.update(item["uid"] for item in pending)
+                    await _send(writer, {
+                        "type": "push",
+                        "uids": [item["uid"] for item in pending],
+                        "records": [item["record"] for item in pending if "record" in item],
+                        "vocab": [item["vocab"] for item in pending if "vocab" in item],
+                    })
+                await self._wake.wait()
+                await asyncio.sleep(SYNC_BATCH_MS / 1000)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def _receive(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            kind = message.get("type")
+            if kind == "welcome":
+                self.online = True
+                self.events.put(("status", f"📡 已连接同步服务器 {self.host}:{self.port}（{message.get('stations')} 台在线）"))
+            elif kind == "records":
+                rows = [(record.get("uid"), tuple(record_to_row(record))) for record in message["records"]]
+                self.events.put(("records", rows))
+            elif kind == "vocab":
+                self.events.put(("vocab", [tuple(item) for item in message["vocab"]]))
+            elif kind == "ack":
+                uids = message.get("uids", [])
+                self.outbox.remove(uids)
+                self.events.put(("acked", uids))
+
+
+def serve_main(host: str, port: int, data_path: str = SYNC_DATA_FILE):
+    """前台运行同步服务器，Ctrl+C 退出"""
+    server = SyncServer(data_path)
+    print(f"📡 同步服务器运行于 {host}:{port}，数据文件 {data_path}（已有 {len(server.records)} 条记录）")
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
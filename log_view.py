@@ -0,0 +1,154 @@
+from tkinter import ttk
+
+from perf_trace import PERF
+
+# 当前页上下各多缓存的行数，小幅滚动时不必重新读取行存储
+VIEW_BUFFER_ROWS = 50
+DEFAULT_ROW_HEIGHT = 20
+HEADER_HEIGHT = 24
+WHEEL_ROWS = 3
+# 尚未得到序号（等待同步服务器确认）的记录在序号列显示的文字
+PENDING_LABEL = "待同步"
+# 已保存、正在由后台线程分配序号的行
+SAVING_LABEL = "保存中"
+
+
+class VirtualLogView:
+    """虚拟化日志表格：Treeview 中只放当前可见的一页，滚动时按位置从行存储取数据。
+
+    历史记录再多，启动时也不需要逐行插入控件；新增记录时若停在末尾则自动跟随。
+    """
+
+    def __init__(self, parent, store, columns, height=8):
+        self.store = store
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", height=height)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.page_size = height
+        self.offset = 0
+        self._cache_start = 0
+        self._cache = []
+
+        try:
+            self.row_height = int(ttk.Style().lookup("Treeview", "rowheight")) or DEFAULT_ROW_HEIGHT
+        except (TypeError, ValueError):
+            self.row_height = DEFAULT_ROW_HEIGHT
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(WHEEL_ROWS))
+        self.tree.bind("<Prior>", lambda e: self._key_scroll(-self.page_size))
+        self.tree.bind("<Next>", lambda e: self._key_scroll(self.page_size))
+        self.tree.bind("<Home>", lambda e: self._key_scroll(-len(self.store)))
+        self.tree.bind("<End>", lambda e: self._key_scroll(len(self.store)))
+
+    # ===== 滚动 =====
+
+    def at_end(self) -> bool:
+        return self.offset + self.page_size >= len(self.store)
+
+    def scroll_to(self, offset: int):
+        last = max(0, len(self.store) - self.page_size)
+        self.offset = min(max(0, int(offset)), last)
+        self._render()
+
+    def scroll_by(self, rows: int):
+        self.scroll_to(self.offset + rows)
+
+    def scroll_to_end(self):
+        self.scroll_to(len(self.store))
+
+    def refresh(self, follow: bool = True, reload: bool = False):
+        """行存储有新增后调用；follow 且原本停在末尾时滚动到最新一行。
+        已显示的行有变化（如待同步的记录得到了序号）时 reload，丢弃缓存的行"""
+        if reload:
+            self._cache = []
+        was_at_end = self.offset + self.page_size >= len(self.store) - 1
+        if follow and was_at_end:
+            self.scroll_to_end()
+        else:
+            self._render()
+
+    def select_last(self):
+        """停在末尾时选中并显示最新一行（保存后的确认）"""
+        children = self.tree.get_children()
+        if children and self.at_end():
+            self.tree.selection_set(children[-1])
+            self.tree.see(children[-1])
+
+    def _key_scroll(self, rows):
+        self.scroll_by(rows)
+        return "break"
+
+    def _on_mousewheel(self, event):
+        self.scroll_by(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS)
+        return "break"
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * len(self.store))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.scroll_by(step * self.page_size if args[2] == "pages" else step)
+
+    def _on_configure(self, event):
+        rows = max(1, (event.height - HEADER_HEIGHT) // self.row_height)
+        if rows != self.page_size:
+            following = self.at_end()
+            self.page_size = rows
+            if following:
+                self.scroll_to_end()
+            else:
+                self.scroll_to(self.offset)
+
+    # ===== 取数与绘制 =====
+
+    def _rows(self, start: int, stop: int) -> list:
+        cache_stop = self._cache_start + len(self._cache)
+        if start < self._cache_start or stop > cache_stop:
+            self._cache_start = max(0, start - VIEW_BUFFER_ROWS)
+            self._cache = self.store.slice(self._cache_start, stop + VIEW_BUFFER_ROWS)
+        return self._cache[start - self._cache_start:stop - self._cache_start]
+
+    def _render(self):
+        with PERF.span("view_render"):
+            self._render_page()
+
+    def _render_page(self):
+        total = len(self.store)
+        stop = min(total, self.offset + self.page_size)
+        rows = self._rows(self.offset, stop)
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        for row in rows:
+            self.tree.insert("", "end", values=row)
+        if total:
+            self.scrollbar.set(self.offset / total, stop / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+class PendingRows:
+    """在行存储末尾附加尚未保存的行（离线时留在同步发件箱中的记录、等待分配序号的记录），供日志表格显示；
+    pending 为 {uid: 行}，按提交顺序排列，序号列显示为 label"""
+
+    def __init__(self, store, pending: dict, label: str = PENDING_LABEL):
+        self.store = store
+        self.pending = pending
+        self.label = label
+
+    def __len__(self):
+        return len(self.store) + len(self.pending)
+
+    def slice(self, start: int, stop: int) -> list:
+        saved = len(self.store)
+        rows = self.store.slice(start, min(stop, saved)) if start < saved else []
+        if stop > saved and self.pending:
+            extra = list(self.pending.values())[max(0, start - saved):stop - saved]
+            rows += [(self.label,) + tuple(row[1:]) for row in extra]
+        return rows
+
@@ -0,0 +1,256 @@
+import contextlib
+import os
+import queue
+import threading
+import time
+
+from log_integrity import SNAPSHOT_COUNT, save_workbook_atomic, take_snapshot, write_workbook_rows
+from log_journal import record_to_row, row_to_record
+from log_loader import append_missing_rows, last_seq, load_sheet_rows, open_writable_workbook, rows_cache_current, write_rows_cache
+from log_lock import file_signature, merge_rows
+from perf_trace import PERF
+
+# 默认落盘延迟：记录进入队列后最迟这么久写入 Excel
+WRITER_LATENCY_MS = 2000
+WRITER_QUEUE_SIZE = 256
+# 多个录入端共用日志时，空闲中每隔这么久读取一次其他录入端追加的记录（秒）
+SHARED_POLL_S = 2.0
+
+
+class PersistenceWorker:
+    """后台落盘线程：界面线程只负责投递记录，磁盘 I/O 全部在这里完成。
+
+    每批记录先写入日志（一次 fsync；以 SQLite 为准时 journal 为 None，不再写日志），再追加到 CSV；
+    多次保存合并成一次 wb.save，最迟在 latency_ms 之后执行，保存后记下日志检查点；保存先写临时文件再原子替换，
+    本次运行第一次保存前滚动保留 snapshots 份 Excel 快照。
+    可写的工作簿在第一次需要写 Excel 时才打开，启动时不必完整解析 Excel。
+    处理结果（包括 CSV 导出、快照、行缓存的失败提示）通过 events 队列回报，由界面线程轮询显示，
+    后台线程不直接打印。
+
+    指定 locks（LogLocks）时可与其他录入端共用同一份日志：日志和 CSV 在 journal 锁内写入，
+    并顺带读出其他录入端新追加的记录；保存 Excel 在 workbook 锁内进行，若 Excel 已被别人改写，
+    先读出合并再整体重写，任何一端的记录都不会被覆盖。并入的他人记录以 ("merged", 行列表) 回报。
+    经 allocate 投递、还没有序号的记录在这里向 locks.allocator 申请序号（界面线程不必等文件锁、fsync），
+    以 ("allocated", [(编号, 行)]) 回报分配结果。
+    """
+
+    def __init__(self, rows, journal, csv_sink, excel_file, latency_ms=WRITER_LATENCY_MS, saved=True,
+                 snapshots=SNAPSHOT_COUNT, locks=None, shared=False):
+        # 已写入日志的全部数据行，只由后台线程修改
+        self.rows = rows
+        self.journal = journal
+        self.csv_sink = csv_sink
+        csv_sink.report = self._report
+        self.excel_file = excel_file
+        self.latency = max(0, latency_ms) / 1000.0
+        self.snapshots = snapshots
+        self._snapshot_taken = False
+        self.locks = locks
+        self._seqs = {row[0] for row in rows if row and row[0] is not None}
+        self._signature = file_signature(excel_file)  # 本端最后一次读写时 Excel 的状态
+        self._journal_offset = journal.size() if journal is not None else 0
+        self._shared = shared  # 发现过其他录入端（或启动时补回的记录插在中间）后，每次保存都整体重写 Excel
+        self.wb = None
+        self.ws = None
+        self._unsaved = []  # 已打开的工作表中尚未追加的行
+        self._saved = saved  # Excel 是否已包含 rows 中的全部记录
+        self.events = queue.Queue()
+        self._queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="PersistenceWorker", daemon=True)
+        self._thread.start()
+
+    def _report(self, message: str):
+        self.events.put(("error", message))
+
+    def submit(self, row):
+        """投递一条待保存的记录（队列满时阻塞，形成背压）"""
+        self._queue.put(("row", row))
+
+    def allocate(self, token, row):
+        """投递一条待分配序号的记录（序号列为 None），token 为调用方的编号，分配后随行一起回报"""
+        self._queue.put(("new", (token, row)))
+
+    def flush(self):
+        """请求尽快写入 Excel"""
+        self._queue.put(("flush", None))
+
+    def close(self, timeout=None) -> bool:
+        """写完所有待处理记录后停止线程，返回是否在超时前完成"""
+        self._queue.put(("stop", None))
+        self._thread.join(timeout)
+        finished = not self._thread.is_alive()
+        if finished and self.journal is not None:
+            self.journal.close()
+        return finished
+
+    def _workbook_lock(self):
+        return contextlib.nullcontext() if self.locks is None else self.locks.workbook
+
+    @contextlib.contextmanager
+    def _journal_lock(self):
+        """日志锁；等不到锁时照样写入（宁可顺序乱，也不能丢记录），Excel 保存时会按序号整理"""
+        if self.locks is None:
+            yield
+            return
+        try:
+            self.locks.journal.acquire()
+        except TimeoutError as e:
+            self.events.put(("error", f"⚠️ {e}，本批记录不加锁写入"))
+            self._shared = True
+            yield
+            return
+        try:
+            yield
+        finally:
+            self.locks.journal.release()
+
+    def _run(self):
+        dirty = 0  # 已写入日志但尚未保存到 Excel 的条数
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self.locks is not None and self.journal is not None:
+                timeout = SHARED_POLL_S if timeout is None else min(timeout, SHARED_POLL_S)
+            try:
+                items = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+                if self.locks is not None:
+                    self._merge(self._read_foreign())
+            # 把已经排队的请求一并取出，合并处理
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [payload for kind, payload in items if kind == "row"]
+            new = [payload for kind, payload in items if kind == "new"]
+            if new:
+                rows += self._allocate(new, rows)
+            flush_now = any(kind in ("flush", "stop") for kind, _ in items)
+            stopping = any(kind == "stop" for kind, _ in items)
+
+            if rows:
+                self._write_rows(rows)
+                dirty += len(rows)
+                if deadline is None:
+                    deadline = time.monotonic() + self.latency
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if (flush_now and (dirty or not self._saved)) or due:
+                if self._save_workbook(dirty):
+                    dirty = 0
+                    deadline = None
+                elif dirty:
+                    # 文件被占用等情况，稍后重试
+                    deadline = time.monotonic() + max(self.latency, 1.0)
+
+        if (
+            not dirty and self._saved and os.path.exists(self.excel_file)
+            and file_signature(self.excel_file) == self._signature
+            and not rows_cache_current(self.excel_file)
+        ):
+            # Excel 与内存数据一致（且之后没有被其他录入端改写），写入行缓存供下次快速启动
+            with PERF.span("rows_cache"):
+                write_rows_cache(self.excel_file, self.rows, self._report)
+
+    def _allocate(self, new, rows) -> list:
+        """给 [(编号, 行)] 一次申请连续的序号，回报给界面线程；返回分配了序号的行"""
+        floor = max([last_seq(self.rows)] + [row[0] for row in rows])
+        try:
+            first = self.locks.allocator.allocate(floor, len(new)) if self.locks is not None else floor + 1
+        except OSError as e:
+            first = floor + 1
+            self.events.put(("error", f"⚠️ 序号分配失败（{e}），使用本机序号 No.{first}"))
+        allocated = [(token, (first + offset,) + tuple(row[1:])) for offset, (token, row) in enumerate(new)]
+        self.events.put(("allocated", allocated))
+        return [row for _, row in allocated]
+
+    def _write_rows(self, rows):
+        rows = [tuple(row) for row in rows]
+        with self._journal_lock():
+            if self.journal is not None:
+                try:
+                    with PERF.span("journal_append"):
+                        self.journal.append_many([row_to_record(row) for row in rows])
+                except Exception as e:
+                    self.events.put(("error", f"❌ 日志写入失败：{e}"))
+            new_rows, at_end = merge_rows(self.rows, rows, self._seqs)
+            self._saved = False
+            with PERF.span("csv_export"):
+                if at_end:
+                    self._unsaved.extend(new_rows)
+                    self.csv_sink.append_many(new_rows, self.rows)
+                else:
+                    self._shared = True
+                    self.csv_sink.sync(self.rows)
+            # 顺带并入其他录入端在这期间追加的记录（对方已写入 CSV，下次追加时 CSV 会按合并后的数据重建）
+            self._merge(self._read_foreign())
+
+    def _read_foreign(self) -> list:
+        """读出共用日志中新追加的记录（包括本端刚写入的，由 _merge 按序号去重）"""
+        if self.journal is None:
+            return []
+        records, self._journal_offset = self.journal.read_from(self._journal_offset)
+        return [tuple(record_to_row(record)) for record in records]
+
+    def _merge(self, rows) -> list:
+        """并入其他录入端的记录，回报给界面线程；返回新并入的行"""
+        new_rows, at_end = merge_rows(self.rows, rows, self._seqs)
+        if not new_rows:
+            return new_rows
+        self._shared = True
+        self._saved = False
+        if at_end:
+            self._unsaved.extend(new_rows)
+        self.events.put(("merged", new_rows))
+        return new_rows
+
+    def _save_workbook(self, count) -> bool:
+        try:
+            with self._workbook_lock():
+                # 先读完日志中已有的记录，保存后以此位置作为检查点
+                self._merge(self._read_foreign())
+                checkpoint = self._journal_offset
+                signature = file_signature(self.excel_file)
+                if signature != self._signature:
+                    # Excel 已被其他录入端（或导入）改写：先并入其中的记录，再整体重写
+                    if signature is not None and self._merge(load_sheet_rows(self.excel_file)):
+                        with self._journal_lock():
+                            self.csv_sink.sync(self.rows)
+                    self._shared = True
+                if not self._snapshot_taken:
+                    with PERF.span("snapshot"):
+                        take_snapshot(self.excel_file, self.snapshots, self._report)
+                    self._snapshot_taken = True
+                if self._shared:
+                    with PERF.span("excel_save"):
+                        write_workbook_rows(self.excel_file, self.rows)
+                    self.wb = self.ws = None
+                else:
+                    if self.ws is None:
+                        # 第一次写 Excel 时完整解析工作簿，单独计时
+                        with PERF.span("excel_open"):
+                            self.wb, self.ws = open_writable_workbook(self.excel_file)
+                        append_missing_rows(self.ws, self.rows)
+                    else:
+                        for row in self._unsaved:
+                            self.ws.append(list(row))
+                    with PERF.span("excel_save"):
+                        save_workbook_atomic(self.wb, self.excel_file)
+                self._unsaved = []
+                self._signature = file_signature(self.excel_file)
+                if self.journal is not None:
+                    try:
+                        self.journal.set_checkpoint(checkpoint, last_seq(self.rows))
+                    except OSError:
+                        pass
+        except Exception:
+            self.events.put(("error", "⚠️ Excel 保存失败（文件被占用？），记录已在日志中，稍后重试"))
+            return False
+        self._saved = True
+        if count:
+            self.events.put(("saved", f"💾 已写入 Excel（本次 {count} 条）"))
+        return True
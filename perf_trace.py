@@ -0,0 +1,183 @@
+import collections
+import contextlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+PERF_TRACE_FILE = "perf_trace.jsonl"
+PROFILE_FILE = "perf_profile.txt"
+# 直方图分桶：从 1 微秒起每桶放大约 19%，到约 17 分钟共 128 个桶，百分位误差不超过半个桶
+HIST_MIN_MS = 0.001
+HIST_GROWTH = 2 ** 0.25
+HIST_BUCKETS = 128
+# 采样分析器的默认采样间隔（秒）和时长（秒）
+PROFILE_INTERVAL_S = 0.005
+PROFILE_SECONDS = 10
+
+
+class SpanHistogram:
+    """一个阶段的耗时直方图：按对数分桶计数，内存固定，不随记录次数增长"""
+
+    def __init__(self):
+        self.counts = [0] * HIST_BUCKETS
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        if ms <= HIST_MIN_MS:
+            bucket = 0
+        else:
+            bucket = min(HIST_BUCKETS - 1, int(math.log(ms / HIST_MIN_MS, HIST_GROWTH)) + 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p: float) -> float:
+        """第 p 百分位的耗时（毫秒），取所在桶的几何中点"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                if bucket == 0:
+                    return min(HIST_MIN_MS, self.max_ms)
+                return min(HIST_MIN_MS * HIST_GROWTH ** (bucket - 0.5), self.max_ms)
+        return self.max_ms
+
+
+class PerfStats:
+    """各阶段（落盘、匹配、写配置、界面刷新等）的耗时统计，可在任意线程记录。
+
+    用法：with PERF.span("excel_save"): ...；每个阶段一个 SpanHistogram。
+    开启 trace 后每次计时同时追加一行 {"ts", "stage", "ms", "thread"} 到本地文件，供事后分析。
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._trace = None
+        self.trace_path = None
+
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = SpanHistogram()
+            hist.add(ms)
+            if self._trace is not None:
+                try:
+                    self._trace.write(json.dumps({
+                        "ts": round(time.time(), 6),
+                        "stage": stage,
+                        "ms": round(ms, 4),
+                        "thread": threading.current_thread().name,
+                    }) + "\n")
+                except (OSError, ValueError):
+                    self._trace = None
+
+    def stats(self) -> list:
+        """[(阶段, 次数, p50, p95, 最长, 累计)]，按累计耗时从多到少排列，单位毫秒"""
+        with self._lock:
+            rows = [
+                (stage, h.count, h.percentile(50), h.percentile(95), h.max_ms, h.total_ms)
+                for stage, h in self._stages.items()
+            ]
+        return sorted(rows, key=lambda row: row[5], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def start_trace(self, path: str = PERF_TRACE_FILE):
+        """开始把每次计时追加写入 path（行缓冲，崩溃前的记录都在文件中）"""
+        fh = open(path, "a", encoding="utf-8", buffering=1)
+        with self._lock:
+            old, self._trace = self._trace, fh
+            self.trace_path = path
+        if old is not None:
+            old.close()
+
+    def stop_trace(self):
+        with self._lock:
+            fh, self._trace = self._trace, None
+            self.trace_path = None
+        if fh is not None:
+            fh.close()
+
+
+# 整个程序共用的统计
+PERF = PerfStats()
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程每隔 interval 秒记录一次目标线程（默认主线程，即界面线程）的调用栈。
+
+    不需要预先插桩，对被测线程几乎没有影响；结果按函数统计，并可写成折叠栈格式
+    （每行 "外层;...;内层 次数"，可用 flamegraph.pl 或 speedscope 画成火焰图）。
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = PROFILE_INTERVAL_S):
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.done = threading.Event()
+        self._thread = None
+
+    def start(self, seconds: float = PROFILE_SECONDS):
+        self._thread = threading.Thread(target=self._run, args=(seconds,), name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def _run(self, seconds: float):
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(self.thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[tuple(reversed(stack))] += 1
+                    self.samples += 1
+                time.sleep(self.interval)
+        finally:
+            self.done.set()
+
+    def top(self, n: int = 10) -> list:
+        """[(函数, 自身占比, 含子调用占比)]，按自身占比排列"""
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for name in set(stack):
+                inclusive[name] += count
+        total = self.samples or 1
+        return [(name, count / total, inclusive[name] / total) for name, count in own.most_common(n)]
+
+    def write(self, path: str = PROFILE_FILE):
+        """写出折叠栈"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(stack) + f" {count}\n")
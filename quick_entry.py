@@ -0,0 +1,135 @@
+import re
+import shlex
+
+from vocab_index import SCORE_ABBR, SCORE_FUZZY
+
+# 一行录入：呼号之后按这个顺序填写，多出的部分都算作留言
+QUICK_FIELDS = ["qth", "rst", "rig", "power", "antenna", "message"]
+# 也可以用 字段=值 的写法，不受位置限制
+FIELD_ALIASES = {
+    "q": "qth", "qth": "qth", "所在地": "qth",
+    "r": "rst", "rst": "rst", "信号报告": "rst",
+    "d": "rig", "rig": "rig", "设备": "rig",
+    "p": "power", "pwr": "power", "power": "power", "功率": "power",
+    "a": "antenna", "ant": "antenna", "antenna": "antenna", "天馈": "antenna",
+    "m": "message", "msg": "message", "message": "message", "留言": "message",
+    "t": "time", "time": "time", "时间": "time",
+}
+# 有词汇表的字段
+FIELD_VOCAB = {"qth": "QTH", "rig": "Rig", "power": "Power", "antenna": "Antenna"}
+# 占位：跳过这一项（沿用上次或缺省值）
+SKIP_TOKEN = "-"
+# 以 = 开头表示照原样记录，不做序号和简拼匹配
+LITERAL_PREFIX = "="
+CALLSIGN_RE = re.compile(r"^([A-Z0-9]+/)?[A-Z0-9]*[0-9][A-Z0-9]*[A-Z](/[A-Z0-9]+)?$", re.IGNORECASE)
+RST_RE = re.compile(r"^[1-5][1-9][1-9]?$")
+TIME_RE = re.compile(r"^([01]?[0-9]|2[0-3]):[0-5][0-9]$")
+
+
+def looks_like_quick_entry(text: str) -> bool:
+    """是否为一行录入：呼号后面至少还有一项"""
+    parts = text.split(None, 1)
+    return len(parts) == 2 and bool(CALLSIGN_RE.match(parts[0]))
+
+
+def _category(score: float) -> int:
+    # rank() 的得分 = 匹配类别（SCORE_* 均为 10 的倍数）+ 不足 10 的使用频率加分
+    return int(score // 10) * 10
+
+
+def resolve_vocab(key: str, token: str, options: list, completion):
+    """把一项输入解析为词汇：序号、原文（不分大小写）、唯一的简拼/前缀匹配，都没有匹配时作为新词。
+
+    返回 (值, 是否为新词)；有多个可能的选项时抛出 ValueError，列出候选。
+    """
+    if token.startswith(LITERAL_PREFIX):
+        value = token[len(LITERAL_PREFIX):].strip()
+        return value, bool(value) and value not in options
+    if token.isdigit() and 0 < int(token) <= len(options):
+        return options[int(token) - 1], False
+    for option in options:
+        if option.lower() == token.lower():
+            return option, False
+    ranked = completion.rank(key, token)
+    if not ranked:
+        return token, True
+    best = _category(ranked[0][1])
+    ties = [option for option, score in ranked if _category(score) == best]
+    close = [option for option, score in ranked if score > SCORE_FUZZY]
+    if len(ties) == 1 and (best >= SCORE_ABBR or len(close) == 1):
+        return ranked[0][0], False
+    candidates = "、".join(f"{i}.{option}" for i, option in enumerate((o for o, _ in ranked), 1))
+    raise ValueError(f"{token} 可能是 {candidates}（原样记录请写 {LITERAL_PREFIX}{token}）")
+
+
+def parse_quick_entry(text: str, config: dict, completion, history=None):
+    """解析一行录入，如 BG7ABC gz 57 1 3 2 "new antenna"。
+
+    呼号之后依次是 QTH、RST、设备、功率、天馈、留言，也可写成 q=gz、p=5W 等；
+    词汇项可用序号或简拼，- 表示跳过。省略的项沿用该台上次的记录，RST、功率、留言
+    再缺省为 59、5W、73（由 normalize_record 补上）。
+
+    返回 (记录字典, 新词汇 [(分类, 值)])；有歧义或不合法的项一并抛出 ValueError。
+    """
+    try:
+        tokens = shlex.split(text)
+    except ValueError:
+        raise ValueError("引号不成对") from None
+    if not tokens:
+        raise ValueError("呼号不能为空")
+    callsign = tokens[0].upper()
+    given = {}
+    positional = []
+    errors = []
+    for token in tokens[1:]:
+        key, sep, value = token.partition("=")
+        field = FIELD_ALIASES.get(key.lower()) if sep else None
+        if field:
+            given[field] = value.strip()
+        else:
+            positional.append(token)
+
+    slots = iter(field for field in QUICK_FIELDS if field not in given)
+    message = []
+    for token in positional:
+        field = next(slots, "message")
+        if field == "message" and "message" not in given:
+            if token != SKIP_TOKEN or message:
+                message.append(token)
+        elif field == "message":
+            errors.append(f"多余的一项 {token}")
+        elif token != SKIP_TOKEN:
+            given[field] = token
+    if message:
+        given["message"] = " ".join(message)
+
+    last = history.lookup(callsign)[0] if history is not None else None
+    record = {"callsign": callsign}
+    new_values = []
+    for field, key in FIELD_VOCAB.items():
+        if field not in given:
+            record[field] = (last or {}).get(field) or ""
+            continue
+        if not given[field]:
+            record[field] = ""
+            continue
+        try:
+            value, new = resolve_vocab(key, given[field], config.get(key, []), completion)
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        record[field] = value
+        if new:
+            new_values.append((key, value))
+    rst = given.get("rst", "")
+    if rst and not RST_RE.match(rst):
+        errors.append(f"RST {rst} 应为两三位数字，如 59、599")
+    record["rst"] = rst
+    record["message"] = given.get("message", "")
+    if given.get("time"):
+        if not TIME_RE.match(given["time"]):
+            errors.append(f"时间 {given['time']} 应为 HH:MM")
+        record["time"] = given["time"]
+    if errors:
+        raise ValueError("；".join(errors))
+    return record, new_values
@@ -0,0 +1,94 @@
+import logging
+import logging.handlers
+import tkinter as tk
+
+from perf_trace import PERF
+
+# 终端默认保留的行数；超出 1/10 后一次性删掉最旧的部分，而不是每行都删
+DEFAULT_SCROLLBACK = 5000
+TRANSCRIPT_MAX_BYTES = 1024 * 1024
+TRANSCRIPT_BACKUPS = 3
+
+
+class TerminalBuffer:
+    """嵌入式终端的输出层：同一轮事件循环内的多次输出合并成一次控件更新，
+    并限制 Text 控件中的行数，长时间录入也不会越来越慢。
+
+    指定 transcript_path 时，被裁掉（以及清屏、退出时仍在屏幕上）的输出
+    写入按大小轮转的会话记录文件。
+    """
+
+    def __init__(self, text: tk.Text, scrollback: int = DEFAULT_SCROLLBACK, transcript_path: str = None):
+        self.text = text
+        self.scrollback = max(1, int(scrollback))
+        self._trim_slack = max(1, self.scrollback // 10)
+        self._pending = []
+        self._lines = 0
+        self._job = None
+        self._transcript = None
+        if transcript_path:
+            handler = logging.handlers.RotatingFileHandler(
+                transcript_path, maxBytes=TRANSCRIPT_MAX_BYTES, backupCount=TRANSCRIPT_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._transcript = logging.getLogger(f"VibeLogger.transcript.{id(self)}")
+            self._transcript.propagate = False
+            self._transcript.setLevel(logging.INFO)
+            self._transcript.addHandler(handler)
+
+    def write(self, message):
+        """输出一行（可含换行），在本轮事件处理结束后统一写入控件"""
+        self._pending.append(str(message))
+        if self._job is None:
+            self._job = self.text.after_idle(self._flush)
+
+    def flush(self):
+        """立即写入待输出的内容"""
+        if self._job is not None:
+            self.text.after_cancel(self._job)
+        self._flush()
+
+    def _flush(self):
+        self._job = None
+        if not self._pending:
+            return
+        chunk = "\n".join(self._pending) + "\n"
+        self._lines += chunk.count("\n")
+        self._pending = []
+        with PERF.span("terminal_flush"):
+            self._insert(chunk)
+
+    def _insert(self, chunk):
+        self.text.config(state="normal")
+        self.text.insert(tk.END, chunk)
+        excess = self._lines - self.scrollback
+        if excess >= self._trim_slack:
+            self._spill("1.0", f"{excess + 1}.0")
+            self.text.delete("1.0", f"{excess + 1}.0")
+            self._lines -= excess
+        self.text.config(state="disabled")
+        self.text.see(tk.END)
+
+    def _spill(self, start, stop):
+        if self._transcript is not None:
+            content = self.text.get(start, stop)
+            if content:
+                self._transcript.info(content.rstrip("\n"))
+
+    def clear(self):
+        """清空终端（已显示的内容写入会话记录）"""
+        self.flush()
+        self._spill("1.0", tk.END)
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.config(state="disabled")
+        self._lines = 0
+
+    def close(self):
+        """退出时把仍在屏幕上的输出写入会话记录"""
+        self.flush()
+        self._spill("1.0", tk.END)
+        if self._transcript is not None:
+            for handler in list(self._transcript.handlers):
+                handler.close()
+                self._transcript.removeHandler(handler)
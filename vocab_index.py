@@ -0,0 +1,331 @@
+import bisect
+import heapq
+import json
+import math
+import os
+
+from log_journal import LOG_FIELDS
+from log_lock import temp_path
+from perf_trace import PERF
+
+# 与 log_config.json 中的词汇分类一致，值为记录中对应的字段
+VOCAB_FIELDS = {"QTH": "qth", "Rig": "rig", "Power": "power", "Antenna": "antenna"}
+VOCAB_KEYS = tuple(VOCAB_FIELDS)
+VOCAB_COLUMNS = {key: LOG_FIELDS.index(field) for key, field in VOCAB_FIELDS.items()}
+# 词汇 -> 拼音（首字母缩写、全拼）的持久化缓存，与配置文件放在一起
+ABBR_CACHE_FILE = "log_config.abbr.json"
+
+# 补全结果默认条数
+DEFAULT_TOP_K = 9
+# 模糊（编辑距离）匹配最多检查的候选数，保证补全耗时有上界
+MAX_FUZZY_SCAN = 2000
+# 最近使用加分的衰减尺度：约隔这么多条记录后加分减半
+RECENCY_HALF_LIFE = 50
+
+# 匹配类别得分，间隔 10 分，使用频率/最近使用加分不超过 10 分
+SCORE_EXACT = 100
+SCORE_ABBR = 90
+SCORE_PREFIX = 80
+SCORE_ABBR_PREFIX = 70
+SCORE_FULL_PREFIX = 60
+SCORE_SUBSTRING = 50
+SCORE_FULL_SUBSTRING = 40
+SCORE_FUZZY = 20
+
+
+class AbbrCache:
+    """拼音缓存：已知词汇的首字母缩写和全拼只计算一次，并保存到磁盘"""
+
+    def __init__(self, abbr_func, path: str = None, full_func=None):
+        self.abbr_func = abbr_func
+        self.full_func = full_func
+        self.path = path
+        self._abbr = {}
+        self._full = {}
+        self._dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._abbr = data.get("abbr", {})
+                self._full = data.get("full", {})
+            except Exception:
+                self._abbr, self._full = {}, {}
+
+    def get(self, word: str) -> str:
+        """首字母缩写"""
+        abbr = self._abbr.get(word)
+        if abbr is None:
+            with PERF.span("pinyin"):
+                abbr = self.abbr_func(word)
+            self._abbr[word] = abbr
+            self._dirty = True
+        return abbr
+
+    def full(self, word: str) -> str:
+        """全拼（无分隔符，小写）；未提供全拼函数时退化为小写原文"""
+        full = self._full.get(word)
+        if full is None:
+            with PERF.span("pinyin"):
+                full = self.full_func(word) if self.full_func else word.lower()
+            self._full[word] = full
+            self._dirty = True
+        return full
+
+    def save(self):
+        """有新词汇时写回缓存文件（先写临时文件再替换）"""
+        if not self._dirty or not self.path:
+            return
+        tmp = temp_path(self.path)
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"abbr": self._abbr, "full": self._full}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            print("保存缩写缓存失败:", e)
+
+
+class MatchIndex:
+    """单个词汇分类的匹配索引。
+
+    - 缩写表：选项 -> 拼音首字母缩写
+    - 缩写前缀树：按缩写前缀查找选项
+    - 全拼有序表：按全拼前缀二分查找选项
+    - 字符倒排表：小写字符 -> 含该字符的选项，用于快速缩小子串匹配的候选范围
+
+    新词汇通过 add() 增量加入；match() 结果按选项加入的先后顺序返回。
+    *_ids 方法返回选项编号（options 中的下标），供 CompletionEngine 按匹配类别打分。
+    """
+
+    def __init__(self, options=(), abbr_cache: AbbrCache = None):
+        self.abbr_cache = abbr_cache
+        self.options = []
+        self._abbr = {}
+        self._lower = []
+        self._full = []
+        self._full_sorted = []
+        self._by_abbr = {}
+        self._trie = {}
+        self._chars = {}
+        for opt in options:
+            self.add(opt)
+
+    def __len__(self):
+        return len(self.options)
+
+    def add(self, option: str):
+        if not option or option in self._abbr:
+            return
+        idx = len(self.options)
+        lower = option.lower()
+        if self.abbr_cache:
+            abbr = self.abbr_cache.get(option)
+            full = self.abbr_cache.full(option)
+        else:
+            abbr = full = lower
+        self.options.append(option)
+        self._abbr[option] = abbr
+        self._lower.append(lower)
+        self._full.append(full)
+        bisect.insort(self._full_sorted, (full, idx))
+        self._by_abbr.setdefault(abbr, []).append(idx)
+        node = self._trie
+        for ch in abbr:
+            node = node.setdefault(ch, {})
+            node.setdefault("", []).append(idx)
+        for ch in set(lower):
+            self._chars.setdefault(ch, set()).add(idx)
+
+    def abbr(self, option: str) -> str:
+        abbr = self._abbr.get(option)
+        if abbr is None:
+            abbr = self.abbr_cache.get(option) if self.abbr_cache else option.lower()
+        return abbr
+
+    def forms(self, i: int) -> tuple:
+        """第 i 个选项的 (小写原文, 拼音首字母缩写, 全拼)"""
+        return self._lower[i], self._abbr[self.options[i]], self._full[i]
+
+    def abbr_ids(self, abbr: str) -> list:
+        """缩写恰为 abbr 的选项编号"""
+        return self._by_abbr.get(abbr, [])
+
+    def abbr_prefix_ids(self, prefix: str) -> list:
+        """缩写以 prefix 开头的选项编号"""
+        node = self._trie
+        for ch in prefix:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node.get("", [])
+
+    def abbr_prefix(self, prefix: str) -> list:
+        """缩写以 prefix 开头的选项"""
+        return [self.options[i] for i in self.abbr_prefix_ids(prefix.lower())]
+
+    def full_prefix_ids(self, prefix: str) -> list:
+        """全拼以 prefix 开头的选项编号"""
+        start = bisect.bisect_left(self._full_sorted, (prefix, -1))
+        ids = []
+        for full, idx in self._full_sorted[start:]:
+            if not full.startswith(prefix):
+                break
+            ids.append(idx)
+        return ids
+
+    def full_substring_ids(self, lower: str, limit: int = MAX_FUZZY_SCAN):
+        """前 limit 个选项中全拼包含 lower 的选项编号"""
+        return (i for i, full in enumerate(self._full[:limit]) if lower in full)
+
+    def substring_ids(self, lower: str) -> set:
+        """小写原文包含 lower 的选项编号"""
+        candidates = None
+        for ch in set(lower):
+            ids = self._chars.get(ch)
+            if not ids:
+                return set()
+            candidates = ids if candidates is None else candidates & ids
+        return {i for i in candidates if lower in self._lower[i]}
+
+    def match(self, text: str, use_abbr: bool = True) -> list:
+        """缩写精确匹配（use_abbr 时）或字符串包含匹配"""
+        lower = text.strip().lower()
+        if not lower:
+            return []
+        ids = self.substring_ids(lower)
+        if use_abbr:
+            ids.update(self.abbr_ids(lower))
+        return [self.options[i] for i in sorted(ids)]
+
+
+def _within_distance(a: str, b: str, max_dist: int) -> bool:
+    """编辑距离是否不超过 max_dist（超出后提前结束）"""
+    if abs(len(a) - len(b)) > max_dist:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > max_dist:
+            return False
+        prev = cur
+    return prev[-1] <= max_dist
+
+
+class UsageStats:
+    """各词汇在日志中的使用次数和最近一次使用位置"""
+
+    def __init__(self):
+        self.tick = 0
+        self.count = {}
+        self.last = {}
+
+    def record(self, key: str, value):
+        if not value:
+            return
+        item = (key, value)
+        self.count[item] = self.count.get(item, 0) + 1
+        self.last[item] = self.tick
+
+    def record_row(self, row):
+        """按一条日志记录（9 列）更新统计"""
+        self.tick += 1
+        for key, col in VOCAB_COLUMNS.items():
+            self.record(key, row[col])
+
+    def load_rows(self, rows):
+        for row in rows:
+            if row and row[0] is not None:
+                self.record_row(row)
+
+    def bonus(self, key: str, value: str) -> float:
+        """使用频率 + 最近使用加分，取值 [0, 10)"""
+        item = (key, value)
+        count = self.count.get(item, 0)
+        if not count:
+            return 0.0
+        freq = min(5.0, math.log2(1 + count))
+        recency = 4.99 * 0.5 ** ((self.tick - self.last[item]) / RECENCY_HALF_LIFE)
+        return freq + recency
+
+
+class CompletionEngine:
+    """排序补全：命令行版与 GUI 共用。
+
+    支持序号以外的各种输入：原文前缀/包含、拼音首字母（精确或前缀）、全拼前缀/包含，
+    都不匹配时再做编辑距离容错；同一匹配类别内按使用频率和最近使用排序，取前 k 个。
+    """
+
+    def __init__(self, indexes: dict, usage: UsageStats = None):
+        self.indexes = indexes
+        self.usage = usage or UsageStats()
+
+    def complete(self, key: str, text: str, k: int = DEFAULT_TOP_K, use_pinyin: bool = True) -> list:
+        """前 k 个补全结果，最优在前"""
+        return [opt for opt, _ in self.rank(key, text, k, use_pinyin)]
+
+    def rank(self, key: str, text: str, k: int = DEFAULT_TOP_K, use_pinyin: bool = True) -> list:
+        """前 k 个 (选项, 匹配类别得分)，匹配类别得分为 SCORE_* 之一"""
+        index = self.indexes[key]
+        lower = text.strip().lower()
+        if not lower:
+            return []
+
+        scores = {}
+
+        def hit(ids, score):
+            for i in ids:
+                if scores.get(i, 0) < score:
+                    scores[i] = score
+
+        substring = index.substring_ids(lower)
+        hit((i for i in substring if index.forms(i)[0].startswith(lower)), SCORE_PREFIX)
+        hit(substring, SCORE_SUBSTRING)
+        hit((i for i in substring if index.forms(i)[0] == lower), SCORE_EXACT)
+        if use_pinyin:
+            hit(index.abbr_ids(lower), SCORE_ABBR)
+            hit(index.abbr_prefix_ids(lower), SCORE_ABBR_PREFIX)
+            hit(index.full_prefix_ids(lower), SCORE_FULL_PREFIX)
+            if len(lower) >= 3 and len(scores) < k:
+                hit(index.full_substring_ids(lower), SCORE_FULL_SUBSTRING)
+
+        if not scores:
+            hit(self._fuzzy_ids(index, lower, use_pinyin), SCORE_FUZZY)
+
+        ranked = heapq.nlargest(
+            k,
+            scores,
+            key=lambda i: (scores[i] + self.usage.bonus(key, index.options[i]), -i),
+        )
+        return [(index.options[i], scores[i]) for i in ranked]
+
+    def _fuzzy_ids(self, index: MatchIndex, lower: str, use_pinyin: bool):
+        max_dist = 1 if len(lower) <= 4 else 2
+        if use_pinyin:
+            # 只在首字母相同的缩写中查找，候选数量有上界
+            candidates = index.abbr_prefix_ids(lower[0])[:MAX_FUZZY_SCAN]
+        else:
+            candidates = range(min(len(index), MAX_FUZZY_SCAN))
+        for i in candidates:
+            text, abbr, full = index.forms(i)
+            if _within_distance(lower, text, max_dist) or (
+                use_pinyin
+                and (_within_distance(lower, abbr, max_dist) or _within_distance(lower, full, max_dist))
+            ):
+                yield i
+
+    def learn(self, key: str, value: str):
+        self.indexes[key].add(value)
+
+    def record_row(self, row):
+        self.usage.record_row(row)
+
+
+def build_match_indexes(config, abbr_func, cache_file: str = ABBR_CACHE_FILE, full_func=None):
+    """按配置中的词汇一次性建立各分类的匹配索引"""
+    cache = AbbrCache(abbr_func, cache_file, full_func)
+    indexes = {key: MatchIndex(config.get(key, []), cache) for key in VOCAB_KEYS}
+    cache.save()
+    return indexes
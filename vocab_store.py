@@ -0,0 +1,127 @@
+import json
+import os
+
+from log_lock import FileLock, temp_path
+from perf_trace import PERF
+
+# 累积这么多条新词汇后，把增量文件合并回配置文件
+COMPACT_THRESHOLD = 50
+
+
+def delta_path(config_file: str) -> str:
+    """与配置文件放在一起的新词汇增量文件，每行一条 {"key":..., "value":...}"""
+    return os.path.splitext(config_file)[0] + ".delta.jsonl"
+
+
+def write_json_atomic(path: str, data):
+    """先写临时文件并落盘，再替换原文件：写到一半断电也不会丢掉原有内容"""
+    tmp = temp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class VocabStore:
+    """自学习词汇的持久化：新词先进入内存批次，flush 时一次追加到增量文件并 fsync，
+    退出或增量过多时才把完整配置原子地重写一次。
+
+    启动时把增量文件中的词汇合并进 config，因此上次未合并的新词不会丢失。
+    多个录入端共用配置文件和增量文件：追加和合并都持有配置文件锁，合并时先并入
+    其他录入端已写入的词汇，不会覆盖别人新学的词。
+    """
+
+    def __init__(self, config: dict, config_file: str, save_func=None):
+        self.config = config
+        self.config_file = config_file
+        self.path = delta_path(config_file)
+        self._save = save_func or (lambda data: write_json_atomic(config_file, data))
+        self.lock = FileLock(config_file + ".lock")
+        self._pending = []
+        self._torn = False
+        self._logged = self._replay()
+
+    def _replay(self) -> int:
+        """把增量文件中的词汇合并进 config，返回增量条数"""
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            text = f.read()
+        # 上次写了一半的行之后补一个换行，新追加的词汇才能单独成行
+        self._torn = bool(text) and not text.endswith("\n")
+        for line in text.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 断电时写了一半的行
+            items = self.config.setdefault(entry["key"], [])
+            if entry["value"] not in items:
+                items.append(entry["value"])
+            count += 1
+        return count
+
+    def add(self, key: str, value: str):
+        """登记一个已加入 config[key] 的新词，等待下次 flush"""
+        self._pending.append({"key": key, "value": value})
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def flush(self):
+        """把本批新词一次追加到增量文件（一次 fsync），必要时合并"""
+        if not self._pending:
+            return
+        try:
+            with self.lock, PERF.span("vocab_flush"), open(self.path, "a", encoding="utf-8") as f:
+                if self._torn:
+                    f.write("\n")
+                    self._torn = False
+                for entry in self._pending:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print("保存新词汇失败:", e)
+            return
+        self._logged += len(self._pending)
+        self._pending = []
+        if self._logged >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def _merge_saved(self):
+        """并入配置文件中已有、本机内存中还没有的词汇（其他录入端合并进去的）"""
+        try:
+            with open(self.config_file, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, values in saved.items():
+            items = self.config.setdefault(key, []) if isinstance(values, list) else None
+            if not isinstance(items, list):
+                continue
+            for value in values:
+                if value not in items:
+                    items.append(value)
+
+    def compact(self):
+        """加锁后重新读取配置文件和增量文件，合并后原子地写回配置文件，再清空增量文件"""
+        try:
+            with self.lock, PERF.span("config_write"):
+                self._merge_saved()
+                self._replay()
+                self._save(self.config)
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            self._logged = 0
+            self._torn = False
+        except Exception as e:
+            print("保存配置文件失败:", e)
+
+    def close(self):
+        """退出时写入待保存的新词，并合并增量文件"""
+        self.flush()
+        if self._logged:
+            self.compact()